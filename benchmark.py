@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+from ast import literal_eval
+from urllib.parse import quote, unquote
+import numpy as np
+import pandas as pd
+
+# BENCHMARK DE CARGA, CONSTRUCCION DEL INDICE Y LATENCIA DE LOS ENDPOINTS
+# Uso: python benchmark.py --filas 1000 10000 100000 --salida benchmark_resultados.json
+#      python benchmark.py --comparar antes.json despues.json
+# Para cada tamaño se generan datos sinteticos con el esquema de cleanMovies.csv / cleanCredits.csv y se mide, en un
+# proceso nuevo (para que el pico de memoria sea el de ese tamaño): la carga de datos, la construccion del indice de
+# vecinos, el inicio completo de la API con y sin modelo preconstruido, la matriz densa de matriz_similitud (solo para
+# tamaños chicos) y la latencia p50/p99 de cada endpoint a traves de un cliente ASGI en el mismo proceso.
+
+DIR_REPO = os.path.dirname(os.path.abspath(__file__))
+
+GENEROS = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Family', 'Fantasy', 'Foreign',
+           'History', 'Horror', 'Music', 'Mystery', 'Romance', 'Science Fiction', 'Thriller', 'TV Movie', 'War', 'Western']
+
+def generar_datos(filas, directorio, semilla = 0):
+    """
+    Generacion de datos sinteticos con el esquema de salida del ETL (cleanMovies.csv y cleanCredits.csv).
+    Los terminos del overview, los actores y los directores siguen distribuciones tipo Zipf, de modo que existan
+    personas con muchas peliculas como en el dataset real.
+
+    Parametros
+    ----------
+    filas : int
+
+        Cantidad de peliculas.
+
+    directorio : str
+
+        Directorio de salida, se crea si no existe.
+
+    semilla : int
+
+        Semilla del generador, mismos datos para la misma semilla.
+    """
+    rng = np.random.default_rng(semilla)
+    os.makedirs(directorio, exist_ok=True)
+
+    silabas = np.array(['ka', 'lo', 'mi', 'ren', 'tas', 'vo', 'bel', 'dri', 'gan', 'hol', 'jun', 'per', 'sol', 'tor', 'zen'])
+    palabras = np.array([''.join(rng.choice(silabas, rng.integers(2, 4))) for _ in range(max(2000, filas // 5))])
+    nombres = np.array([f'{a.title()} {b.title()}' for a, b in zip(rng.choice(palabras, filas * 2), rng.choice(palabras, filas * 2))])
+    actores, directores = nombres[:filas * 3 // 2], nombres[filas * 3 // 2:]
+
+    def zipf(tamano, cantidad):
+        return np.minimum(rng.zipf(1.3, cantidad), tamano) - 1
+
+    largos = rng.integers(10, 60, filas)
+    terminos = palabras[zipf(len(palabras), int(largos.sum()))]
+    cortes = np.cumsum(largos)[:-1]
+    overview = [' '.join(grupo) for grupo in np.split(terminos, cortes)]
+    titulos = [' '.join(grupo).title() for grupo in np.split(palabras[rng.integers(0, len(palabras), filas * 2)], np.arange(2, filas * 2, 2))]
+    fechas = pd.Timestamp('1900-01-01') + pd.to_timedelta(rng.integers(0, 43000, filas), unit='D')
+    budget = np.where(rng.random(filas) < 0.6, 0, rng.integers(1, 200, filas) * 1e6)
+    revenue = np.where(budget > 0, budget * rng.gamma(2, 1, filas), 0)
+
+    peliculas = pd.DataFrame({
+        'belongs_to_collection': '', 'budget': budget,
+        'genres': [str(list(rng.choice(GENEROS, rng.integers(0, 4), replace=False))) for _ in range(filas)],
+        'id': rng.permutation(filas * 3)[:filas] + 1, 'original_language': 'en', 'overview': overview,
+        'popularity': rng.gamma(1, 3, filas), 'production_companies': '[]', 'production_countries': '[]',
+        'release_date': fechas.strftime('%Y-%m-%d'), 'revenue': revenue, 'runtime': rng.integers(60, 180, filas).astype(float),
+        'spoken_languages': "['en']", 'status': 'Released', 'tagline': '', 'title': titulos,
+        'vote_average': np.round(rng.random(filas) * 10, 1), 'vote_count': rng.integers(0, 5000, filas).astype(float),
+        'release_year': fechas.year, 'return': np.where(budget > 0, revenue / np.where(budget > 0, budget, 1), 0)})
+    peliculas.loc[rng.random(filas) < 0.02, 'overview'] = np.nan
+
+    creditos = pd.DataFrame({
+        'cast': [str(list(actores[zipf(len(actores), n)])) for n in rng.integers(0, 15, filas)],
+        'id': peliculas['id'],
+        'director': [str(list(directores[zipf(len(directores), n)])) for n in rng.integers(1, 3, filas)]})
+
+    peliculas.to_csv(os.path.join(directorio, 'cleanMovies.csv'), index=False)
+    creditos.to_csv(os.path.join(directorio, 'cleanCredits.csv'), index=False)
+
+async def pedir(app, metodo, ruta, cuerpo = None):
+    """
+    Consulta HTTP a la aplicacion ASGI en el mismo proceso, sin servidor ni cliente externo.
+
+    Retorno
+    -------
+    tuple(int, bytes)
+
+        Codigo de estado y cuerpo de la respuesta.
+    """
+    camino, _, consulta = ruta.partition('?')
+    datos = json.dumps(cuerpo).encode() if cuerpo is not None else b''
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': metodo, 'scheme': 'http',
+             'path': unquote(camino), 'raw_path': camino.encode(), 'query_string': consulta.encode(), 'root_path': '',
+             'headers': [(b'host', b'benchmark'), (b'content-type', b'application/json'), (b'content-length', str(len(datos)).encode())],
+             'client': ('127.0.0.1', 0), 'server': ('benchmark', 80)}
+    mensajes = [{'type': 'http.request', 'body': datos, 'more_body': False}]
+    respuesta = {'status': None, 'cuerpo': b''}
+
+    async def recibir():
+        # Como en un servidor real, la desconexion no llega mientras se transmite la respuesta (respuestas NDJSON)
+        if mensajes:
+            return mensajes.pop(0)
+        await asyncio.Event().wait()
+
+    async def enviar(mensaje):
+        if mensaje['type'] == 'http.response.start':
+            respuesta['status'] = mensaje['status']
+        elif mensaje['type'] == 'http.response.body':
+            respuesta['cuerpo'] += mensaje.get('body', b'')
+
+    await app(scope, recibir, enviar)
+    return respuesta['status'], respuesta['cuerpo']
+
+def _pico_memoria_mb():
+    # Pico de memoria residente (RSS) del proceso
+    try:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / 1024 / 1024 if sys.platform == 'darwin' else pico / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+
+def _cronometrar(funcion, *args, **kwargs):
+    inicio = time.perf_counter()
+    resultado = funcion(*args, **kwargs)
+    return resultado, time.perf_counter() - inicio
+
+async def _medir_endpoints(app, consultas, repeticiones, rng):
+    # Latencia de cada endpoint en milisegundos, con parametros tomados al azar de los datos
+    resultados = {}
+    for nombre, (metodo, rutas, cuerpo) in consultas.items():
+        latencias, errores = [], 0
+        for ruta in rng.choice(rutas, repeticiones):
+            inicio = time.perf_counter()
+            estado, _ = await pedir(app, metodo, ruta, cuerpo)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            errores += estado != 200
+        resultados[nombre] = {'p50_ms': float(np.percentile(latencias, 50)), 'p99_ms': float(np.percentile(latencias, 99)),
+                              'media_ms': float(np.mean(latencias)), 'consultas': repeticiones, 'errores': int(errores)}
+    return resultados
+
+def medir(filas, directorio, repeticiones = 200, max_denso = 10000, semilla = 0):
+    """
+    Medicion completa para un tamaño de catalogo, se ejecuta en un proceso propio (ver main).
+
+    Retorno
+    -------
+    dict
+
+        Tiempos en segundos, latencias por endpoint y pico de memoria en MB.
+    """
+    resultado = {'filas': filas}
+    _, resultado['generacion_s'] = _cronometrar(generar_datos, filas, os.path.join(directorio, 'data'), semilla)
+
+    # La API usa rutas relativas (data/, static/, templates/): se ejecuta dentro del directorio de trabajo
+    for carpeta in ['static', 'templates']:
+        if not os.path.exists(os.path.join(directorio, carpeta)):
+            os.symlink(os.path.join(DIR_REPO, carpeta), os.path.join(directorio, carpeta))
+    os.chdir(directorio)
+    sys.path.insert(0, DIR_REPO)
+    # Sin cache de respuestas, se mide el calculo de cada consulta
+    os.environ['CACHE_TAMANO'] = '0'
+
+    from datos import cargar_peliculas, cargar_creditos
+    from ml_models import construir_modelo, guardar_modelo, matriz_similitud, obtener_recomendaciones
+    import main
+
+    (df, (df2, _)), resultado['carga_s'] = _cronometrar(lambda: (cargar_peliculas(), cargar_creditos()))
+    modelo, resultado['indice_s'] = _cronometrar(construir_modelo, df[['title', 'genres', 'overview']], main.K_VECINOS)
+    if filas <= max_denso:
+        denso, resultado['matriz_similitud_s'] = _cronometrar(matriz_similitud, df[['title', 'genres', 'overview']].copy())
+        indices = np.random.default_rng(semilla).integers(0, filas, repeticiones)
+        _, segundos = _cronometrar(lambda: [obtener_recomendaciones(i, denso, df) for i in indices])
+        resultado['obtener_recomendaciones_denso_ms'] = segundos * 1000 / repeticiones
+        del denso
+    indices = np.random.default_rng(semilla).integers(0, filas, repeticiones)
+    _, segundos = _cronometrar(lambda: [obtener_recomendaciones(i, modelo['vecinos'], df) for i in indices])
+    resultado['obtener_recomendaciones_ms'] = segundos * 1000 / repeticiones
+
+    async def api():
+        # startup_s: hasta que la API acepta consultas; recomendador_listo_s: hasta que el modelo termina de construirse
+        inicio = time.perf_counter()
+        await main.startup_event()
+        resultado['startup_s'] = time.perf_counter() - inicio
+        await asyncio.get_running_loop().run_in_executor(None, main.recomendador_terminado.wait)
+        resultado['recomendador_listo_s'] = time.perf_counter() - inicio
+
+        rng = np.random.default_rng(semilla)
+        titulos = [quote(t, safe='') for t in main.df['title'].dropna().unique()[:5000]]
+        creditos = pd.read_csv(os.path.join('data', 'cleanCredits.csv'), nrows=5000)
+        actores = [quote(a, safe='') for lista in creditos['cast'].apply(literal_eval) for a in lista][:5000] or ['nadie']
+        directores = [quote(d, safe='') for lista in creditos['director'].apply(literal_eval) for d in lista][:5000] or ['nadie']
+        consultas = {
+            'cantidad_filmaciones_mes': ('GET', [f'/peliculas/get_month/{m}' for m in main.meses], None),
+            'cantidad_filmaciones_dia': ('GET', [f'/peliculas/get_day/{quote(d)}' for d in main.dias], None),
+            'score_titulo': ('GET', [f'/pelicula/get_popularidad/{t}' for t in titulos], None),
+            'votos_titulo': ('GET', [f'/pelicula/get_votos/{t}' for t in titulos], None),
+            'get_actor': ('GET', [f'/actor/get_actor/{a}' for a in actores], None),
+            'get_director': ('GET', [f'/director/get_director/{d}' for d in directores], None),
+            'get_director_pagina': ('GET', [f'/director/get_director/{d}?limite=20' for d in directores], None),
+            'get_director_ndjson': ('GET', [f'/director/get_director/{d}?formato=ndjson' for d in directores], None),
+            'ranking_actores': ('GET', [f'/actor/ranking?metrica={m}&limite=100' for m in main.METRICAS_PERSONAS], None),
+            'ranking_actores_ndjson': ('GET', [f'/actor/ranking?metrica={m}&formato=ndjson' for m in main.METRICAS_PERSONAS], None),
+            'get_recomendacion': ('GET', [f'/recomendacion/get_recomendacion/{t}' for t in titulos], None),
+            'get_recomendacion_hibrido': ('GET', [f'/recomendacion/get_recomendacion/{t}?modo=hibrido' for t in titulos], None),
+        }
+        resultado['endpoints'] = await _medir_endpoints(main.app, consultas, repeticiones, rng)
+        await main.shutdown_event()
+
+        # Inicio con el modelo preconstruido y mapeado en memoria
+        guardar_modelo(modelo, main.MODELO_DIR)
+        inicio = time.perf_counter()
+        await main.startup_event()
+        resultado['startup_con_modelo_s'] = time.perf_counter() - inicio
+        await asyncio.get_running_loop().run_in_executor(None, main.recomendador_terminado.wait)
+        resultado['recomendador_listo_con_modelo_s'] = time.perf_counter() - inicio
+        await main.shutdown_event()
+
+    asyncio.run(api())
+    resultado['pico_memoria_mb'] = _pico_memoria_mb()
+    return resultado
+
+def comparar(ruta_antes, ruta_despues):
+    """
+    Comparacion de dos archivos de resultados: cociente despues / antes de cada metrica por tamaño de catalogo.
+    """
+    def metricas(ruta):
+        with open(ruta, encoding='utf-8') as archivo:
+            corrida = json.load(archivo)
+        salida = {}
+        for r in corrida['resultados']:
+            for clave, valor in r.items():
+                if clave == 'endpoints':
+                    for endpoint, valores in valor.items():
+                        for nombre in ['p50_ms', 'p99_ms']:
+                            salida[(r['filas'], f'{endpoint}.{nombre}')] = valores[nombre]
+                elif clave != 'filas':
+                    salida[(r['filas'], clave)] = valor
+        return salida
+
+    antes, despues = metricas(ruta_antes), metricas(ruta_despues)
+    filas = [{'filas': f, 'metrica': m, 'antes': antes[(f, m)], 'despues': despues[(f, m)],
+              'cociente': despues[(f, m)] / antes[(f, m)] if antes[(f, m)] else np.nan}
+             for (f, m) in sorted(set(antes) & set(despues))]
+    return pd.DataFrame(filas)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de carga, indice y endpoints de la API')
+    parser.add_argument('--filas', type=int, nargs='+', default=[1000, 10000], help='Tamaños de catalogo a medir')
+    parser.add_argument('--repeticiones', type=int, default=200, help='Consultas por endpoint')
+    parser.add_argument('--max-denso', type=int, default=10000, help='Tamaño maximo para medir la matriz densa de matriz_similitud')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--salida', default='benchmark_resultados.json', help='Archivo JSON de resultados')
+    parser.add_argument('--comparar', nargs=2, metavar=('ANTES', 'DESPUES'), help='Comparar dos archivos de resultados')
+    parser.add_argument('--interno', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.comparar:
+        with pd.option_context('display.max_rows', None, 'display.width', 200):
+            print(comparar(*args.comparar))
+        return
+
+    if args.interno:
+        # Proceso hijo: un unico tamaño, resultado en la salida estandar
+        print(json.dumps(medir(args.filas[0], args.interno, args.repeticiones, args.max_denso, args.semilla)))
+        return
+
+    resultados = []
+    for filas in args.filas:
+        with tempfile.TemporaryDirectory(prefix='benchmark_') as directorio:
+            proceso = subprocess.run([sys.executable, os.path.abspath(__file__), '--interno', directorio, '--filas', str(filas),
+                                      '--repeticiones', str(args.repeticiones), '--max-denso', str(args.max_denso),
+                                      '--semilla', str(args.semilla)], capture_output=True, text=True)
+        if proceso.returncode != 0:
+            print(proceso.stderr, file=sys.stderr)
+            raise SystemExit(f'Fallo la medicion con {filas} filas')
+        resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+        print(f"{filas} filas: startup {resultado['startup_s']:.2f}s, indice {resultado['indice_s']:.2f}s, pico {resultado['pico_memoria_mb']:.0f}MB")
+        resultados.append(resultado)
+
+    corrida = {'fecha': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+               'plataforma': platform.platform(), 'cpus': os.cpu_count(), 'resultados': resultados}
+    with open(args.salida, 'w', encoding='utf-8') as archivo:
+        json.dump(corrida, archivo, indent=2)
+    print(f'Resultados guardados en {args.salida}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import os
+import time
+import enum
+import asyncio
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+
+# CACHE EN MEMORIA DE LAS RESPUESTAS DE LOS ENDPOINTS DE CONSULTA
+# Clave: nombre del endpoint + parametros en la misma forma en que los usa el endpoint, declarada al decorarlo (por
+# ejemplo str.title para los nombres y titulos, de modo que 'Tom Hanks' y 'tom hanks' comparten la entrada y la
+# respuesta, que repite el parametro ya transformado, es la misma); el resto de los parametros tal como se recibieron.
+# Tamaño maximo CACHE_TAMANO con desalojo LRU y vencimiento opcional CACHE_TTL (segundos, 0 = sin vencimiento). Las
+# consultas identicas concurrentes que no estan en cache esperan un unico calculo (single-flight). La cache se vacia al
+# cambiar la version de los datos o del modelo (invalidar).
+
+CACHE_TAMANO = int(os.environ.get('CACHE_TAMANO', 4096))
+CACHE_TTL = float(os.environ.get('CACHE_TTL', 0))
+
+_entradas = OrderedDict()
+_en_curso = {}
+_bloqueo = threading.Lock()
+_version = None
+_contadores = {'aciertos': 0, 'fallos': 0, 'compartidas': 0, 'desalojos': 0, 'vencidas': 0, 'invalidaciones': 0}
+
+def invalidar(version = None):
+    """
+    Vaciado de la cache, se llama cada vez que se cargan o reemplazan los datos o el modelo.
+
+    Parametros
+    ----------
+    version : str
+
+        Identificador de la version de datos/modelo vigente, se informa en metricas.
+    """
+    global _version
+    with _bloqueo:
+        _entradas.clear()
+        _version = version
+        _contadores['invalidaciones'] += 1
+
+def _valor_clave(valor):
+    return valor.value if isinstance(valor, enum.Enum) else valor
+
+def _leer(clave):
+    with _bloqueo:
+        entrada = _entradas.get(clave)
+        if entrada is None:
+            return None
+        if CACHE_TTL > 0 and time.monotonic() - entrada[0] > CACHE_TTL:
+            del _entradas[clave]
+            _contadores['vencidas'] += 1
+            return None
+        _entradas.move_to_end(clave)
+        _contadores['aciertos'] += 1
+        return entrada
+
+def _guardar(clave, valor, version):
+    with _bloqueo:
+        # Si los datos cambiaron durante el calculo el resultado ya no es valido
+        if version != _version or CACHE_TAMANO <= 0:
+            return
+        _entradas[clave] = (time.monotonic(), valor)
+        _entradas.move_to_end(clave)
+        while len(_entradas) > CACHE_TAMANO:
+            _entradas.popitem(last=False)
+            _contadores['desalojos'] += 1
+
+def cacheado(funcion = None, **formas):
+    """
+    Decorador para endpoints asincronicos: las respuestas se guardan en la cache con clave endpoint + parametros. Se
+    conserva la firma original para FastAPI.
+
+    Parametros
+    ----------
+    formas : funciones
+
+        {parametro: funcion} forma de cada parametro en la clave, la misma que le aplica el endpoint antes de usarlo (por
+        ejemplo str.title). Los parametros no indicados forman la clave tal como se reciben (los enums por su valor).
+
+    Ejemplo
+    --------
+    >>> @app.get("/ruta/{parametro}")
+    >>> @cacheado(parametro=str.title)
+    >>> @en_pool
+    >>> def endpoint(parametro: str): ...
+    """
+    if funcion is None:
+        return lambda funcion: cacheado(funcion, **formas)
+    firma = inspect.signature(funcion)
+
+    @functools.wraps(funcion)
+    async def envoltura(*args, **kwargs):
+        parametros = firma.bind(*args, **kwargs)
+        parametros.apply_defaults()
+        clave = (funcion.__name__, tuple((nombre, formas[nombre](valor) if nombre in formas else _valor_clave(valor))
+                                         for nombre, valor in parametros.arguments.items()))
+
+        while True:
+            entrada = _leer(clave)
+            if entrada is not None:
+                return entrada[1]
+
+            #Si la misma consulta ya se esta calculando se espera ese resultado
+            en_curso = _en_curso.get(clave)
+            if en_curso is None:
+                break
+            with _bloqueo:
+                _contadores['compartidas'] += 1
+            try:
+                return await asyncio.shield(en_curso)
+            except asyncio.CancelledError:
+                #Si se cancelo la consulta que calculaba (desconexion de su cliente) se vuelve a intentar; si se cancelo
+                #esta consulta, se propaga
+                if not en_curso.cancelled():
+                    raise
+
+        with _bloqueo:
+            _contadores['fallos'] += 1
+            version = _version
+        futuro = asyncio.get_running_loop().create_future()
+        _en_curso[clave] = futuro
+        try:
+            valor = await funcion(*args, **kwargs)
+        except asyncio.CancelledError:
+            futuro.cancel()
+            raise
+        except Exception as e:
+            futuro.set_exception(e)
+            # Evita el aviso de excepcion no leida cuando no hay consultas esperando
+            futuro.exception()
+            raise
+        finally:
+            del _en_curso[clave]
+        futuro.set_result(valor)
+        _guardar(clave, valor, version)
+        return valor
+    return envoltura
+
+def metricas():
+    """
+    Estado de la cache: tamaño, configuracion, version de datos vigente y contadores acumulados.
+
+    Retorno
+    -------
+    dict
+    """
+    with _bloqueo:
+        contadores = dict(_contadores)
+        tamano = len(_entradas)
+    consultas = contadores['aciertos'] + contadores['fallos'] + contadores['compartidas']
+    return {'tamano': tamano, 'tamano_maximo': CACHE_TAMANO, 'ttl_segundos': CACHE_TTL, 'version': _version,
+            'tasa_aciertos': round((contadores['aciertos'] + contadores['compartidas']) / consultas, 4) if consultas else 0.0,
+            **contadores}
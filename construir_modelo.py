@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import argparse
+from datos import cargar_peliculas, DIR_COLUMNAR, RUTA_PELICULAS
+#Script propio de ML
+from ml_models import construir_modelo, guardar_modelo, cargar_modelo, actualizar_modelo
+
+# CONSTRUCCION DEL SISTEMA DE RECOMENDACION FUERA DE LA API
+# Uso: python construir_modelo.py --salida data/modelo --k 50
+# La API carga (mapea en memoria) el directorio generado al iniciar, evitando reajustar el modelo en cada worker.
+# Actualizacion diaria del catalogo: python construir_modelo.py --salida data/modelo --incremental
+#   Las peliculas agregadas al final del dataset se incorporan al modelo existente sin recalcular todo el indice,
+#   con reajuste completo si el catalogo cambio de otra forma o si la deriva del vocabulario supera --umbral-deriva.
+
+def main():
+    parser = argparse.ArgumentParser(description='Construccion y guardado del sistema de recomendacion')
+    parser.add_argument('--datos', default=DIR_COLUMNAR, help='Directorio del formato columnar generado con datos.py')
+    parser.add_argument('--csv', default=RUTA_PELICULAS, help='CSV de peliculas generado por el ETL, si no existe el formato columnar')
+    parser.add_argument('--salida', default='data/modelo', help='Directorio de salida del modelo')
+    parser.add_argument('--k', type=int, default=50, help='Cantidad de vecinos por pelicula')
+    parser.add_argument('--tamano-bloque', type=int, default=256, help='Filas por bloque en el calculo de similitudes')
+    parser.add_argument('--incremental', action='store_true', help='Agregar las peliculas nuevas al modelo existente en --salida')
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1, help='Procesos para el calculo de similitudes por bloques')
+    parser.add_argument('--umbral-deriva', type=float, default=0.05, help='Proporcion de terminos fuera del vocabulario que dispara un reajuste completo')
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+
+    def progreso(procesadas, total):
+        # Avance del calculo de similitudes en una unica linea de la salida de errores
+        transcurrido = time.perf_counter() - inicio
+        print(f"\rSimilitudes: {procesadas}/{total} peliculas ({100 * procesadas / total:.0f}%), {transcurrido:.0f}s", end='\n' if procesadas == total else '', file=sys.stderr, flush=True)
+
+    df = cargar_peliculas(args.datos, args.csv)[['title', 'genres', 'overview']]
+    if args.incremental and os.path.exists(os.path.join(args.salida, 'metadata.json')):
+        modelo, accion = actualizar_modelo(cargar_modelo(args.salida, textos = True), df, umbral_deriva = args.umbral_deriva, tamano_bloque = args.tamano_bloque,
+                                           procesos = args.procesos, progreso = progreso)
+    else:
+        modelo, accion = construir_modelo(df, k = args.k, tamano_bloque = args.tamano_bloque, procesos = args.procesos, progreso = progreso), 'reajuste'
+    if accion != 'sin_cambios':
+        guardar_modelo(modelo, args.salida)
+    print(f"Modelo en {args.salida} ({accion}): {modelo['metadata']}")
+
+if __name__ == '__main__':
+    main()
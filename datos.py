@@ -0,0 +1,300 @@
+import os
+import json
+import argparse
+from ast import literal_eval
+import pandas as pd
+import numpy as np
+from instrumentacion import tramo
+
+# CARGA DE LOS DATASETS LIMPIOS (cleanMovies.csv, cleanCredits.csv) PARA LA API
+# El formato columnar se genera una unica vez a partir de los CSV del ETL:
+#   python datos.py --peliculas data/cleanMovies.csv --creditos data/cleanCredits.csv --salida data/columnar
+# Cada columna se guarda por separado: numericas y fechas como arreglos de NumPy (.npy), textos como lista JSON y las
+# columnas de listas (genres, cast, director, ...) de forma plana: offsets por fila + codigos de valores + valores unicos.
+# De esta manera la carga no parsea texto ni evalua cada celda, y las listas no se materializan como listas de Python.
+
+DIR_COLUMNAR = 'data/columnar'
+RUTA_PELICULAS = 'data/cleanMovies.csv'
+RUTA_CREDITOS = 'data/cleanCredits.csv'
+
+#Version del formato en disco, se incrementa ante cualquier cambio incompatible en los archivos guardados
+VERSION_COLUMNAR = 1
+
+COLUMNAS_LISTA = {'peliculas': ['genres', 'production_companies', 'production_countries', 'spoken_languages'],
+                  'creditos': ['cast', 'director']}
+COLUMNAS_FECHA = {'peliculas': ['release_date'], 'creditos': []}
+
+def aplanar(listas):
+    """
+    Representacion plana (tipo CSR) de una columna de listas de str.
+
+    Parametros
+    ----------
+    listas : pd.Series
+
+        Serie de listas, una por fila.
+
+    Retorno
+    -------
+    dict
+
+        {'offsets': numpy.ndarray int64 (filas + 1), 'codigos': numpy.ndarray int32, 'valores': numpy.ndarray object}
+        Los elementos de la fila i son valores[codigos[offsets[i]:offsets[i+1]]].
+
+    Ejemplo
+    --------
+    >>> aplanar(pd.Series([['Tom Hanks', 'Tim Allen'], [], ['Tom Hanks']])) \t
+    >>> {'offsets': array([0, 2, 2, 3]), 'codigos': array([0, 1, 0]), 'valores': array(['Tom Hanks', 'Tim Allen'])}
+    """
+    largos = np.fromiter((len(lista) for lista in listas), dtype=np.int64, count=len(listas))
+    offsets = np.zeros(len(listas) + 1, dtype=np.int64)
+    np.cumsum(largos, out=offsets[1:])
+    planos = pd.Series([valor for lista in listas for valor in lista], dtype=object)
+    codigos, valores = pd.factorize(planos)
+    return {'offsets': offsets, 'codigos': codigos.astype(np.int32), 'valores': np.asarray(valores, dtype=object)}
+
+def seleccionar_filas(plana, filas):
+    """
+    Seleccion (y reordenamiento) de filas de una columna plana, sin materializar las listas.
+
+    Parametros
+    ----------
+    plana : dict
+
+        Columna plana generada con aplanar.
+
+    filas : numpy.ndarray
+
+        Posiciones de las filas a conservar, en el orden deseado. Las posiciones negativas generan filas vacias.
+
+    Retorno
+    -------
+    dict
+
+        Columna plana con las filas indicadas y los mismos valores unicos.
+    """
+    filas = np.asarray(filas, dtype=np.int64)
+    validas = filas >= 0
+    filas = np.where(validas, filas, 0)
+    inicios = plana['offsets'][filas]
+    largos = np.where(validas, plana['offsets'][filas + 1] - inicios, 0)
+    offsets = np.zeros(len(filas) + 1, dtype=np.int64)
+    np.cumsum(largos, out=offsets[1:])
+    #Posicion de origen de cada elemento: inicio de su fila + desplazamiento dentro de la fila
+    origen = np.repeat(inicios - offsets[:-1], largos) + np.arange(offsets[-1])
+    return {'offsets': offsets, 'codigos': plana['codigos'][origen], 'valores': plana['valores']}
+
+def a_listas(plana):
+    """
+    Materializacion de una columna plana como listas de Python, una por fila.
+    """
+    valores = plana['valores'][plana['codigos']].tolist()
+    offsets = plana['offsets'].tolist()
+    return [valores[inicio:fin] for inicio, fin in zip(offsets[:-1], offsets[1:])]
+
+def compactar(df, umbral_categorias = 0.5):
+    """
+    Representacion compacta en memoria de un DataFrame, sin perdida de informacion: columnas de texto con pocos valores
+    distintos como categoricas (codigos enteros + valores unicos) y columnas numericas en el tipo mas chico que
+    conserva exactamente sus valores (enteros de menor tamaño, float32 si ningun valor cambia).
+
+    Parametros
+    ----------
+    df : pd.DataFrame
+
+        DataFrame a compactar, no se modifica.
+
+    umbral_categorias : float
+
+        Proporcion maxima de valores distintos sobre filas para convertir una columna de texto en categorica.
+
+    Retorno
+    -------
+    pd.DataFrame
+
+    Ejemplo
+    --------
+    >>> compactar(cargar_peliculas()).memory_usage(deep=True).sum()
+    """
+    columnas = {}
+    for columna in df.columns:
+        serie = df[columna]
+        if pd.api.types.is_integer_dtype(serie):
+            serie = pd.to_numeric(serie, downcast='integer')
+        elif pd.api.types.is_float_dtype(serie) and serie.dtype != np.float32:
+            reducida = serie.astype(np.float32)
+            if np.array_equal(reducida.to_numpy(dtype=np.float64), serie.to_numpy(dtype=np.float64), equal_nan=True):
+                serie = reducida
+        elif serie.dtype == object and len(serie) > 0:
+            #Solo columnas de texto (las de listas no son categorizables)
+            es_texto = serie.map(lambda x: isinstance(x, str) or x is None or x != x).all()
+            if es_texto and serie.nunique(dropna=True) <= umbral_categorias * len(serie):
+                serie = serie.astype('category')
+        columnas[columna] = serie
+    return pd.DataFrame(columnas, index=df.index)
+
+def _leer_lista(valor):
+    # Las celdas de listas en los CSV del ETL son la representacion en texto de listas de Python
+    return literal_eval(valor) if pd.notnull(valor) else list([])
+
+def convertir_a_columnar(ruta_peliculas = RUTA_PELICULAS, ruta_creditos = RUTA_CREDITOS, directorio = DIR_COLUMNAR):
+    """
+    Conversion de los CSV generados por el ETL al formato columnar que carga la API.
+
+    Parametros
+    ----------
+    ruta_peliculas, ruta_creditos : str
+
+        Rutas de cleanMovies.csv y cleanCredits.csv.
+
+    directorio : str
+
+        Directorio de salida, se crea si no existe. La metadata se escribe al final, su presencia indica que la
+        conversion se completo.
+
+    Ejemplo
+    --------
+    >>> convertir_a_columnar('data/cleanMovies.csv', 'data/cleanCredits.csv', 'data/columnar')
+    """
+    os.makedirs(directorio, exist_ok=True)
+    ruta_metadata = os.path.join(directorio, 'metadata.json')
+    if os.path.exists(ruta_metadata):
+        os.remove(ruta_metadata)
+
+    metadata = {'version': VERSION_COLUMNAR, 'tablas': {}}
+    for tabla, ruta in [('peliculas', ruta_peliculas), ('creditos', ruta_creditos)]:
+        df = pd.read_csv(ruta, parse_dates = COLUMNAS_FECHA[tabla])
+        columnas = {}
+        for columna in df.columns:
+            base = os.path.join(directorio, f'{tabla}_{columna}')
+            if columna in COLUMNAS_LISTA[tabla]:
+                plana = aplanar(df[columna].apply(_leer_lista))
+                np.save(base + '_offsets.npy', plana['offsets'])
+                np.save(base + '_codigos.npy', plana['codigos'])
+                with open(base + '_valores.json', 'w', encoding='utf-8') as archivo:
+                    json.dump(plana['valores'].tolist(), archivo, ensure_ascii=False)
+                columnas[columna] = 'lista'
+            elif columna in COLUMNAS_FECHA[tabla] or pd.api.types.is_numeric_dtype(df[columna]):
+                np.save(base + '.npy', df[columna].to_numpy())
+                columnas[columna] = 'fecha' if columna in COLUMNAS_FECHA[tabla] else 'numerica'
+            else:
+                with open(base + '.json', 'w', encoding='utf-8') as archivo:
+                    json.dump([valor if pd.notnull(valor) else None for valor in df[columna]], archivo, ensure_ascii=False)
+                columnas[columna] = 'texto'
+        metadata['tablas'][tabla] = {'filas': len(df), 'columnas': columnas}
+
+    with open(ruta_metadata, 'w', encoding='utf-8') as archivo:
+        json.dump(metadata, archivo)
+
+def _metadata_columnar(directorio):
+    ruta = os.path.join(directorio, 'metadata.json')
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding='utf-8') as archivo:
+        metadata = json.load(archivo)
+    if metadata.get('version') != VERSION_COLUMNAR:
+        raise ValueError(f"Version de formato columnar {metadata.get('version')} incompatible, se esperaba {VERSION_COLUMNAR}. Regenerar con datos.py")
+    return metadata
+
+def _leer_columnar(directorio, tabla, metadata, listas, seleccion = None):
+    # Columnas escalares en un DataFrame y columnas de listas pedidas en forma plana
+    columnas, planas = {}, {}
+    for columna, tipo in metadata['tablas'][tabla]['columnas'].items():
+        if seleccion is not None and columna not in seleccion:
+            continue
+        base = os.path.join(directorio, f'{tabla}_{columna}')
+        if tipo == 'lista':
+            if columna in listas:
+                with open(base + '_valores.json', encoding='utf-8') as archivo:
+                    valores = np.array(json.load(archivo), dtype=object)
+                planas[columna] = {'offsets': np.load(base + '_offsets.npy'), 'codigos': np.load(base + '_codigos.npy'), 'valores': valores}
+        elif tipo == 'texto':
+            with open(base + '.json', encoding='utf-8') as archivo:
+                valores = np.array(json.load(archivo), dtype=object)
+            valores[pd.isnull(valores)] = np.nan
+            columnas[columna] = valores
+        else:
+            columnas[columna] = np.load(base + '.npy')
+    return pd.DataFrame(columnas), planas
+
+def cargar_peliculas(directorio = DIR_COLUMNAR, ruta_csv = RUTA_PELICULAS, columnas = None):
+    """
+    Carga del dataset de peliculas desde el formato columnar, o desde cleanMovies.csv si este no fue generado.
+
+    Parametros
+    ----------
+    directorio : str
+
+        Directorio generado con convertir_a_columnar.
+
+    ruta_csv : str
+
+        CSV empleado si no existe el formato columnar.
+
+    columnas : list
+
+        Columnas a cargar, por defecto todas. Con el formato columnar las demas no se leen.
+
+    Retorno
+    -------
+    pd.DataFrame
+
+        Peliculas con las columnas escalares y 'genres' como lista de str por fila. El resto de las columnas de listas
+        (production_companies, production_countries, spoken_languages) no se cargan, la API no las emplea.
+    """
+    metadata = _metadata_columnar(directorio)
+    with tramo('carga_peliculas'):
+        if metadata is not None:
+            df, planas = _leer_columnar(directorio, 'peliculas', metadata, ['genres'], columnas)
+            if 'genres' in planas:
+                with tramo('parseo_listas'):
+                    df['genres'] = a_listas(planas['genres'])
+        else:
+            df = pd.read_csv(ruta_csv, parse_dates = [columna for columna in COLUMNAS_FECHA['peliculas'] if columnas is None or columna in columnas],
+                             usecols = (lambda columna: columna in columnas) if columnas is not None else None)
+            df = df.drop(columns = [columna for columna in COLUMNAS_LISTA['peliculas'] if columna != 'genres' and columna in df.columns])
+            if 'genres' in df.columns:
+                with tramo('parseo_listas'):
+                    df['genres'] = df['genres'].apply(_leer_lista)
+        if columnas is not None:
+            df = df[[columna for columna in columnas if columna in df.columns]]
+    return df
+
+def cargar_creditos(directorio = DIR_COLUMNAR, ruta_csv = RUTA_CREDITOS):
+    """
+    Carga del dataset de creditos desde el formato columnar, o desde cleanCredits.csv si este no fue generado.
+
+    Parametros
+    ----------
+    directorio : str
+
+        Directorio generado con convertir_a_columnar.
+
+    ruta_csv : str
+
+        CSV empleado si no existe el formato columnar.
+
+    Retorno
+    -------
+    tuple(pd.DataFrame, dict)
+
+        Creditos con la columna 'id', y las columnas 'cast' y 'director' en forma plana (ver aplanar) alineadas a sus filas.
+    """
+    metadata = _metadata_columnar(directorio)
+    with tramo('carga_creditos'):
+        if metadata is not None:
+            df2, planas = _leer_columnar(directorio, 'creditos', metadata, COLUMNAS_LISTA['creditos'])
+        else:
+            df2 = pd.read_csv(ruta_csv)
+            with tramo('parseo_listas'):
+                planas = {columna: aplanar(df2.pop(columna).apply(_leer_lista)) for columna in COLUMNAS_LISTA['creditos']}
+    return df2, planas
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Conversion de los CSV del ETL al formato columnar de la API')
+    parser.add_argument('--peliculas', default=RUTA_PELICULAS, help='CSV de peliculas generado por el ETL')
+    parser.add_argument('--creditos', default=RUTA_CREDITOS, help='CSV de creditos generado por el ETL')
+    parser.add_argument('--salida', default=DIR_COLUMNAR, help='Directorio de salida')
+    args = parser.parse_args()
+    convertir_a_columnar(args.peliculas, args.creditos, args.salida)
+    print(f"Formato columnar generado en {args.salida}")
@@ -0,0 +1,135 @@
+import os
+import time
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from instrumentacion import observar
+
+# POOL DE EJECUCION PARA EL CALCULO DE LOS ENDPOINTS
+# El trabajo de pandas/NumPy de cada consulta es bloqueante: se ejecuta en un pool de hilos acotado para que el event
+# loop siga atendiendo otras consultas. Las consultas admitidas (en ejecucion + en espera) se limitan a
+# POOL_HILOS + POOL_COLA, por encima de ese valor se responde 503 de inmediato, y cada consulta tiene un tiempo
+# maximo de respuesta POOL_TIMEOUT (segundos) tras el cual se responde 504.
+# Se emplean hilos y no procesos: los datos e indices viven en memoria del proceso de la API; para paralelismo entre
+# procesos se levantan varios workers de uvicorn, que comparten el modelo mapeado en memoria.
+
+POOL_HILOS = int(os.environ.get('POOL_HILOS', min(32, (os.cpu_count() or 1) + 4)))
+POOL_COLA = int(os.environ.get('POOL_COLA', 64))
+POOL_TIMEOUT = float(os.environ.get('POOL_TIMEOUT', 10))
+
+_pool = None
+_bloqueo = threading.Lock()
+_contadores = {'admitidas': 0, 'en_ejecucion': 0, 'completadas': 0, 'rechazadas': 0, 'timeouts': 0, 'errores': 0, 'segundos_ejecucion': 0.0}
+
+def iniciar(hilos = None, cola = None, timeout = None):
+    """
+    Creacion del pool de hilos, se llama al iniciar la API. Los parametros no indicados toman los valores de las
+    variables de entorno POOL_HILOS, POOL_COLA y POOL_TIMEOUT.
+    """
+    global _pool, POOL_HILOS, POOL_COLA, POOL_TIMEOUT
+    POOL_HILOS = hilos if hilos is not None else POOL_HILOS
+    POOL_COLA = cola if cola is not None else POOL_COLA
+    POOL_TIMEOUT = timeout if timeout is not None else POOL_TIMEOUT
+    detener()
+    _pool = ThreadPoolExecutor(max_workers=POOL_HILOS, thread_name_prefix='endpoint')
+
+def detener():
+    """
+    Cierre del pool, se llama al detener la API.
+    """
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False)
+        _pool = None
+
+def _medir(funcion, args, kwargs):
+    # Ejecucion en el hilo del pool, registra el tiempo de ejecucion efectivo (sin la espera en cola)
+    with _bloqueo:
+        _contadores['en_ejecucion'] += 1
+    inicio = time.perf_counter()
+    try:
+        return funcion(*args, **kwargs)
+    finally:
+        duracion = time.perf_counter() - inicio
+        with _bloqueo:
+            _contadores['en_ejecucion'] -= 1
+            _contadores['segundos_ejecucion'] += duracion
+        observar('calculo', funcion.__name__, duracion)
+
+def _liberar(futuro):
+    # La consulta deja de ocupar lugar cuando termina su calculo, aunque ya se haya respondido por timeout. Las
+    # respuestas de error a entradas invalidas del cliente (HTTPException 4xx) son consultas completadas
+    error = futuro.cancelled() or futuro.exception() is not None
+    if error and not futuro.cancelled() and isinstance(futuro.exception(), HTTPException):
+        error = futuro.exception().status_code >= 500
+    with _bloqueo:
+        _contadores['admitidas'] -= 1
+        if error:
+            _contadores['errores'] += 1
+        else:
+            _contadores['completadas'] += 1
+
+async def ejecutar(funcion, *args, **kwargs):
+    """
+    Ejecucion de la funcion en el pool sin bloquear el event loop.
+
+    Retorno
+    -------
+    Resultado de funcion(*args, **kwargs)
+
+    Errores
+    -------
+    HTTPException 503 si el pool esta saturado, 504 si se supera POOL_TIMEOUT.
+    """
+    if _pool is None:
+        iniciar()
+    with _bloqueo:
+        if _contadores['admitidas'] >= POOL_HILOS + POOL_COLA:
+            _contadores['rechazadas'] += 1
+            raise HTTPException(status_code=503, detail='Servidor saturado, reintente en unos segundos', headers={'Retry-After': '1'})
+        _contadores['admitidas'] += 1
+
+    futuro = _pool.submit(_medir, funcion, args, kwargs)
+    futuro.add_done_callback(_liberar)
+    try:
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(futuro)), timeout=POOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        with _bloqueo:
+            _contadores['timeouts'] += 1
+        raise HTTPException(status_code=504, detail=f'La consulta supero el tiempo maximo de {POOL_TIMEOUT} segundos')
+
+def en_pool(funcion):
+    """
+    Decorador para endpoints: la funcion (sincronica) se ejecuta en el pool mediante ejecutar. Se conserva la firma
+    original para que FastAPI genere los parametros y la documentacion.
+
+    Ejemplo
+    --------
+    >>> @app.get("/ruta/{parametro}")
+    >>> @en_pool
+    >>> def endpoint(parametro: str): ...
+    """
+    @functools.wraps(funcion)
+    async def envoltura(*args, **kwargs):
+        return await ejecutar(funcion, *args, **kwargs)
+    return envoltura
+
+def metricas():
+    """
+    Estado del pool: capacidad configurada, utilizacion actual y contadores acumulados.
+
+    Retorno
+    -------
+    dict
+    """
+    with _bloqueo:
+        contadores = dict(_contadores)
+    en_espera = max(contadores['admitidas'] - contadores['en_ejecucion'], 0)
+    return {'hilos': POOL_HILOS, 'cola_maxima': POOL_COLA, 'timeout_segundos': POOL_TIMEOUT,
+            'en_ejecucion': contadores['en_ejecucion'], 'en_espera': en_espera,
+            'utilizacion': round(contadores['en_ejecucion'] / POOL_HILOS, 4),
+            'completadas': contadores['completadas'], 'rechazadas': contadores['rechazadas'],
+            'timeouts': contadores['timeouts'], 'errores': contadores['errores'],
+            'segundos_ejecucion': round(contadores['segundos_ejecucion'], 4)}
@@ -0,0 +1,262 @@
+import os
+import re
+import argparse
+from ast import literal_eval
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+from instrumentacion import tramo
+
+# ETL DE LOS DATASETS CRUDOS (movies_dataset.csv, credits.csv) A LOS DATASETS LIMPIOS DE LA API
+# Uso: python etl.py --peliculas data/movies_dataset.csv --creditos data/credits.csv --salida data
+#      python etl.py --procesos 4 --tamano-bloque 5000 --combinado --columnar
+# Misma limpieza que ETL_Inicial.ipynb, pero los CSV crudos se procesan por bloques de filas: cada bloque se lee,
+# se limpia (opcionalmente en un pool de procesos) y se agrega al CSV de salida, de modo que la memoria depende del
+# tamaño de bloque y no del dataset. Los bloques se escriben en el orden de lectura y los duplicados por id se
+# descartan conservando la primera aparicion en todo el archivo, por lo que la salida no depende de la cantidad de
+# procesos ni del tamaño de bloque.
+
+RUTA_PELICULAS_CRUDO = 'data/movies_dataset.csv'
+RUTA_CREDITOS_CRUDO = 'data/credits.csv'
+
+#Columnas numericas del dataset crudo, el resto se lee como texto para que el tipo no dependa del contenido de cada bloque
+COLUMNAS_FLOAT = ['revenue', 'runtime', 'vote_average', 'vote_count']
+COLUMNAS_DESCARTADAS = ['video', 'imdb_id', 'adult', 'original_title', 'poster_path', 'homepage']
+#Columna anidada --> clave conservada de cada elemento
+COLUMNAS_ANIDADAS = {'genres': 'name', 'production_companies': 'name', 'production_countries': 'name', 'spoken_languages': 'iso_639_1'}
+
+_FECHA_ISO = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+def leer_bloques(ruta, tamano_bloque = 5000, columnas_float = ()):
+    """
+    Lectura de un CSV por bloques de filas.
+
+    Parametros
+    ----------
+    ruta : str
+
+        CSV a leer.
+
+    tamano_bloque : int
+
+        Cantidad de filas por bloque.
+
+    columnas_float : list
+
+        Columnas leidas como float, el resto se lee como texto.
+
+    Retorno
+    -------
+    generador de pd.DataFrame
+    """
+    columnas = pd.read_csv(ruta, nrows=0).columns
+    tipos = {columna: (float if columna in columnas_float else str) for columna in columnas}
+    yield from pd.read_csv(ruta, dtype=tipos, chunksize=tamano_bloque)
+
+def _fecha(valor):
+    # Mismo criterio que el notebook: fecha sin hora, NaT si no puede interpretarse
+    return pd.to_datetime(valor, errors='coerce').date()
+
+def _fechas(valores):
+    # Las fechas ISO (practicamente todas) se convierten de forma vectorizada, el resto una por una como en el notebook
+    iso = valores.str.match(_FECHA_ISO).fillna(False).to_numpy(dtype=bool)
+    fechas = pd.Series(pd.NaT, index=valores.index, dtype='datetime64[ns]')
+    fechas[iso] = pd.to_datetime(valores[iso], format='%Y-%m-%d', errors='coerce')
+    otras = ~iso & valores.notna().to_numpy()
+    if otras.any():
+        fechas[otras] = pd.to_datetime(valores[otras].apply(_fecha), errors='coerce')
+    return fechas.dt.normalize()
+
+def _desanidar(valor, clave):
+    # Lista de diccionarios en texto --> lista con el valor de la clave de cada diccionario
+    if pd.isnull(valor):
+        return list([])
+    elementos = literal_eval(valor)
+    return [elemento[clave] for elemento in elementos if isinstance(elemento, dict)] if isinstance(elementos, list) else list([])
+
+def _coleccion(valor):
+    if pd.isnull(valor):
+        return ''
+    coleccion = literal_eval(valor)
+    return coleccion['name'] if isinstance(coleccion, dict) else ''
+
+def limpiar_peliculas(df):
+    """
+    Limpieza de un bloque del dataset crudo de peliculas, mismos pasos que ETL_Inicial.ipynb salvo la eliminacion
+    de duplicados, que requiere ver todo el archivo (ver etl).
+
+    Parametros
+    ----------
+    df : pd.DataFrame
+
+        Bloque leido con leer_bloques (columnas de COLUMNAS_FLOAT como float, el resto como texto).
+
+    Retorno
+    -------
+    pd.DataFrame
+
+        Bloque con las columnas de cleanMovies.csv.
+    """
+    #Descarte de filas sin release_date valida
+    df = df.assign(release_date = _fechas(df['release_date']))
+    df = df[df['release_date'].notna()].copy()
+    df['release_year'] = df['release_date'].dt.year
+    df.drop(columns=COLUMNAS_DESCARTADAS, inplace=True)
+
+    #Retorno, con budget y revenue faltantes (o no numericos) en 0 y divisiones por 0 en 0
+    df['budget'] = pd.to_numeric(df['budget'], errors='coerce')
+    df[['revenue', 'budget']] = df[['revenue', 'budget']].fillna(value=0).astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['return'] = df['revenue'] / df['budget']
+    df['return'] = df['return'].fillna(value=0).replace([np.inf, -np.inf], 0)
+
+    #Desanidamiento de campos
+    df['belongs_to_collection'] = df['belongs_to_collection'].apply(_coleccion)
+    for columna, clave in COLUMNAS_ANIDADAS.items():
+        df[columna] = df[columna].apply(_desanidar, clave=clave)
+
+    df['title'] = df['title'].apply(lambda x: x.title() if pd.notnull(x) else x)
+    df['popularity'] = df['popularity'].astype(float)
+    df['id'] = df['id'].astype(int)
+    return df
+
+def limpiar_creditos(df2):
+    """
+    Limpieza de un bloque del dataset crudo de creditos: nombres de actores y directores (formato title) por pelicula.
+
+    Parametros
+    ----------
+    df2 : pd.DataFrame
+
+        Bloque leido con leer_bloques.
+
+    Retorno
+    -------
+    pd.DataFrame
+
+        Bloque con las columnas de cleanCredits.csv (cast, id, director).
+    """
+    df2 = df2.copy()
+    df2['cast'] = df2['cast'].apply(lambda x: [actor['name'].title() for actor in literal_eval(x)] if pd.notnull(x) else list([]))
+    # Existen casos con más de un director, por eso lista
+    df2['director'] = df2['crew'].apply(lambda x: [data['name'].title() for data in literal_eval(x) if data['job'] == 'Director'] if pd.notnull(x) else list([]))
+    df2.drop(columns=['crew'], inplace=True)
+    df2['id'] = df2['id'].astype(int)
+    return df2
+
+def _procesar(funcion, bloques, procesos):
+    # Aplicacion de funcion a cada bloque, en orden. Con varios procesos se mantienen a lo sumo 2 bloques por proceso
+    # en curso, de modo que la lectura no se adelanta al procesamiento y la memoria se mantiene acotada.
+    if procesos <= 1:
+        yield from map(funcion, bloques)
+        return
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        en_curso = deque()
+        for bloque in bloques:
+            en_curso.append(pool.submit(funcion, bloque))
+            if len(en_curso) >= 2 * procesos:
+                yield en_curso.popleft().result()
+        while en_curso:
+            yield en_curso.popleft().result()
+
+def _sin_duplicados(bloques):
+    # Descarte de ids ya vistos en bloques anteriores o en el mismo bloque, se conserva la primera aparicion
+    vistos = set()
+    for bloque in bloques:
+        ids = bloque['id'].tolist()
+        previos = np.fromiter((i in vistos for i in ids), dtype=bool, count=len(ids))
+        nuevos = ~bloque['id'].duplicated(keep='first').to_numpy() & ~previos
+        vistos.update(bloque['id'].to_numpy()[nuevos].tolist())
+        yield bloque[nuevos]
+
+def _escribir(bloques, ruta, **kwargs):
+    # Escritura incremental en un archivo temporal, reemplazado al finalizar
+    temporal = ruta + '.tmp'
+    filas = 0
+    with open(temporal, 'w', encoding='utf-8', newline='') as archivo:
+        for i, bloque in enumerate(bloques):
+            bloque.to_csv(archivo, index=False, header=(i == 0), **kwargs)
+            filas += len(bloque)
+    os.replace(temporal, ruta)
+    return filas
+
+def _combinar(ruta_peliculas, ruta_creditos, tamano_bloque):
+    # Los creditos (ids unicos) se cargan completos y las peliculas se cruzan por bloques, conservando su orden.
+    # Se leen como texto para reescribir los valores tal cual fueron guardados.
+    creditos = pd.read_csv(ruta_creditos, dtype={'cast': str, 'director': str})
+    for bloque in pd.read_csv(ruta_peliculas, dtype=str, keep_default_na=False, chunksize=tamano_bloque):
+        bloque['id'] = bloque['id'].astype(int)
+        yield pd.merge(bloque, creditos, on='id', how='inner')
+
+def etl(ruta_peliculas = RUTA_PELICULAS_CRUDO, ruta_creditos = RUTA_CREDITOS_CRUDO, directorio = 'data', tamano_bloque = 5000, procesos = 1, combinado = False):
+    """
+    Generacion de cleanMovies.csv y cleanCredits.csv (y opcionalmente cleanMergedData.csv) a partir de los CSV crudos,
+    procesados por bloques.
+
+    Parametros
+    ----------
+    ruta_peliculas, ruta_creditos : str
+
+        Rutas de movies_dataset.csv y credits.csv.
+
+    directorio : str
+
+        Directorio de salida.
+
+    tamano_bloque : int
+
+        Filas por bloque, regula la memoria empleada.
+
+    procesos : int
+
+        Cantidad de procesos para limpiar los bloques en paralelo, 1 = en el proceso actual.
+
+    combinado : bool
+
+        Si se genera ademas cleanMergedData.csv (peliculas y creditos cruzados por id).
+
+    Retorno
+    -------
+    dict
+
+        Cantidad de filas escritas por archivo.
+
+    Ejemplo
+    --------
+    >>> etl('data/movies_dataset.csv', 'data/credits.csv', 'data', procesos = 4)
+    >>> {'cleanMovies.csv': 45346, 'cleanCredits.csv': 45432}
+    """
+    os.makedirs(directorio, exist_ok=True)
+    ruta_limpias = os.path.join(directorio, 'cleanMovies.csv')
+    ruta_creditos_limpios = os.path.join(directorio, 'cleanCredits.csv')
+    filas = {}
+
+    with tramo('etl_peliculas'):
+        bloques = _procesar(limpiar_peliculas, leer_bloques(ruta_peliculas, tamano_bloque, COLUMNAS_FLOAT), procesos)
+        filas['cleanMovies.csv'] = _escribir(_sin_duplicados(bloques), ruta_limpias, date_format='%Y-%m-%d')
+    with tramo('etl_creditos'):
+        bloques = _procesar(limpiar_creditos, leer_bloques(ruta_creditos, tamano_bloque), procesos)
+        filas['cleanCredits.csv'] = _escribir(_sin_duplicados(bloques), ruta_creditos_limpios)
+
+    if combinado:
+        with tramo('etl_combinado'):
+            filas['cleanMergedData.csv'] = _escribir(_combinar(ruta_limpias, ruta_creditos_limpios, tamano_bloque), os.path.join(directorio, 'cleanMergedData.csv'))
+    return filas
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ETL de los datasets crudos a los CSV limpios de la API')
+    parser.add_argument('--peliculas', default=RUTA_PELICULAS_CRUDO, help='CSV crudo de peliculas (movies_dataset.csv)')
+    parser.add_argument('--creditos', default=RUTA_CREDITOS_CRUDO, help='CSV crudo de creditos (credits.csv)')
+    parser.add_argument('--salida', default='data', help='Directorio de salida')
+    parser.add_argument('--tamano-bloque', type=int, default=5000, help='Filas por bloque')
+    parser.add_argument('--procesos', type=int, default=1, help='Procesos para limpiar bloques en paralelo')
+    parser.add_argument('--combinado', action='store_true', help='Generar tambien cleanMergedData.csv')
+    parser.add_argument('--columnar', action='store_true', help='Generar tambien el formato columnar de la API (ver datos.py)')
+    args = parser.parse_args()
+    filas = etl(args.peliculas, args.creditos, args.salida, args.tamano_bloque, args.procesos, args.combinado)
+    if args.columnar:
+        from datos import convertir_a_columnar, DIR_COLUMNAR
+        convertir_a_columnar(os.path.join(args.salida, 'cleanMovies.csv'), os.path.join(args.salida, 'cleanCredits.csv'),
+                             os.path.join(args.salida, os.path.basename(DIR_COLUMNAR)))
+    print(f"ETL completo en {args.salida}: {filas}")
@@ -0,0 +1,444 @@
+import pandas as pd
+import numpy as np
+
+#ESTRUCTURAS DE BUSQUEDA PRECALCULADAS AL INICIO DE LA API
+
+def normalizar(texto):
+    """
+    Normalizacion de nombres y titulos para su uso como clave de busqueda: sin espacios repetidos ni en los extremos y
+    en minusculas (casefold), de modo que 'tom hanks', 'Tom Hanks' y ' TOM  HANKS ' coincidan.
+
+    Parametros
+    ----------
+    texto : str
+
+    Retorno
+    -------
+    str
+    """
+    return ' '.join(str(texto).split()).casefold()
+
+def indice_invertido(claves, posiciones):
+    """
+    Generacion de un indice invertido clave --> posiciones de las filas en las que aparece.
+    Las posiciones de todas las claves se guardan contiguas en un unico arreglo (formato CSR), ordenadas de menor a mayor
+    y sin repetidos, de modo que la consulta de una clave es un acceso al diccionario y un corte del arreglo.
+
+    Parametros
+    ----------
+    claves : list o numpy.ndarray
+
+        Claves ya normalizadas (o codigos enteros), una por aparicion. Los nulos se descartan.
+
+    posiciones : list o numpy.ndarray
+
+        Posicion de la fila asociada a cada clave, misma longitud que claves.
+
+    Retorno
+    -------
+    dict
+
+        {'ids': {clave: id}, 'indptr': numpy.ndarray, 'posiciones': numpy.ndarray}
+        Las posiciones de la clave con id i son posiciones[indptr[i]:indptr[i+1]].
+
+    Ejemplo
+    --------
+    >>> indice = indice_invertido(['tom hanks', 'tim allen', 'tom hanks'], [0, 0, 3]) \t
+    >>> buscar(indice, 'Tom Hanks')
+    >>> array([0, 3], dtype=int32)
+    """
+    numericas = isinstance(claves, np.ndarray) and claves.dtype.kind in 'iu'
+    codigos, unicos = pd.factorize(claves if numericas else pd.Series(claves, dtype=object))
+    posiciones = np.asarray(posiciones, dtype=np.int64)
+    validos = codigos >= 0
+    codigos, posiciones = codigos[validos], posiciones[validos]
+
+    #Orden por clave y luego por posicion, descartando pares (clave, posicion) repetidos
+    orden = np.lexsort((posiciones, codigos))
+    codigos, posiciones = codigos[orden], posiciones[orden]
+    unicos_pares = np.ones(len(codigos), dtype=bool)
+    unicos_pares[1:] = (codigos[1:] != codigos[:-1]) | (posiciones[1:] != posiciones[:-1])
+    codigos, posiciones = codigos[unicos_pares], posiciones[unicos_pares]
+
+    indptr = np.zeros(len(unicos) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codigos, minlength=len(unicos)), out=indptr[1:])
+    return {'ids': dict(zip(unicos.tolist(), range(len(unicos)))), 'indptr': indptr, 'posiciones': posiciones.astype(np.int32)}
+
+def buscar(indice, clave):
+    """
+    Posiciones asociadas a la clave en el indice invertido, costo proporcional a la cantidad de posiciones devueltas.
+
+    Parametros
+    ----------
+    indice : dict
+
+        Indice generado con indice_invertido.
+
+    clave : str
+
+        Clave sin normalizar, se normaliza internamente.
+
+    Retorno
+    -------
+    numpy.ndarray
+
+        Posiciones ordenadas de menor a mayor, vacio si la clave no existe.
+    """
+    i = indice['ids'].get(normalizar(clave))
+    if i is None:
+        return indice['posiciones'][:0]
+    return indice['posiciones'][indice['indptr'][i]:indice['indptr'][i + 1]]
+
+def indice_personas(plana):
+    """
+    Indice invertido persona --> posiciones de las peliculas en las que participa, a partir de una columna de listas de
+    nombres en forma plana (ver datos.aplanar), por ejemplo el cast o los directores de cada pelicula.
+
+    Parametros
+    ----------
+    plana : dict
+
+        Columna plana {'offsets', 'codigos', 'valores'}, las posiciones del indice son sus filas.
+
+    Retorno
+    -------
+    dict
+
+        Indice generado con indice_invertido, ver buscar para su consulta.
+    """
+    #Solo se normalizan los nombres unicos, luego se expanden por codigo
+    nombres = np.array([normalizar(nombre) for nombre in plana['valores']], dtype=object)
+    posiciones = np.repeat(np.arange(len(plana['offsets']) - 1), np.diff(plana['offsets']))
+    return indice_invertido(nombres[plana['codigos']], posiciones)
+
+#Columnas de la tabla de agregados por persona, por las que se puede ordenar un ranking
+METRICAS_PERSONAS = ['cantidad_peliculas', 'retorno_total', 'retorno_promedio', 'presupuesto_total', 'ganancia_total']
+
+def agregados_personas(indice, plana, peliculas):
+    """
+    Tabla de agregados por persona (cantidad de peliculas, retorno total y promedio, presupuesto y ganancia totales),
+    calculada en una unica pasada: los pares (persona, pelicula) del indice invertido se expanden una vez y se agrupan.
+    Al partir del mismo indice que buscar, cada persona cuenta exactamente las peliculas que devuelve buscar.
+    Se precalcula ademas el orden de las personas por cada metrica, de modo que cualquier pagina de un ranking es un
+    corte de ese orden.
+
+    Parametros
+    ----------
+    indice : dict
+
+        Indice invertido persona --> posiciones de sus peliculas, generado con indice_personas.
+
+    plana : dict
+
+        Columna plana de la que se genero el indice, para recuperar el nombre original de cada persona.
+
+    peliculas : pd.DataFrame
+
+        DataFrame con las columnas ['return', 'budget', 'revenue'], las posiciones del indice son sus filas.
+
+    Retorno
+    -------
+    dict
+
+        {'tabla': pd.DataFrame, 'ordenes': {metrica: numpy.ndarray}}
+        La fila i de la tabla corresponde a la persona con id i del indice, con las columnas 'nombre' y METRICAS_PERSONAS.
+        ordenes[metrica] contiene los ids de mayor a menor valor de la metrica (empates por nombre).
+
+    Ejemplo
+    --------
+    >>> agregados = agregados_personas(indice_actores, personas['cast'], df) \t
+    >>> agregados['tabla'].iloc[agregados['ordenes']['retorno_total'][:2]]
+    >>>          nombre  cantidad_peliculas  retorno_total  retorno_promedio  presupuesto_total  ganancia_total
+    >>>  Actor1                          12        1530.12            127.51         1.2e+07            3.1e+08
+    """
+    claves = list(indice['ids'])
+    #Nombre original de cada clave normalizada (la primer aparicion en la columna plana)
+    originales = {normalizar(nombre): nombre for nombre in plana['valores'][::-1]}
+    pares = pd.DataFrame({'persona': np.repeat(np.arange(len(claves)), np.diff(indice['indptr'])),
+                          'retorno': peliculas['return'].to_numpy(dtype=np.float64)[indice['posiciones']],
+                          'presupuesto': peliculas['budget'].to_numpy(dtype=np.float64)[indice['posiciones']],
+                          'ganancia': peliculas['revenue'].to_numpy(dtype=np.float64)[indice['posiciones']]})
+    grupos = pares.groupby('persona', sort=True)
+    tabla = pd.DataFrame({'nombre': pd.Series([originales.get(clave, clave) for clave in claves], dtype=object),
+                          'cantidad_peliculas': grupos.size().reindex(range(len(claves)), fill_value=0).astype(np.int32),
+                          'retorno_total': grupos['retorno'].sum().reindex(range(len(claves)), fill_value=0.0),
+                          'retorno_promedio': grupos['retorno'].mean().reindex(range(len(claves))),
+                          'presupuesto_total': grupos['presupuesto'].sum().reindex(range(len(claves)), fill_value=0.0),
+                          'ganancia_total': grupos['ganancia'].sum().reindex(range(len(claves)), fill_value=0.0)})
+    desempate = np.argsort(tabla['nombre'].to_numpy(dtype=object), kind='stable')
+    ordenes = {}
+    for metrica in METRICAS_PERSONAS:
+        valores = tabla[metrica].to_numpy(dtype=np.float64)[desempate]
+        ordenes[metrica] = desempate[np.argsort(-np.nan_to_num(valores, nan=-np.inf), kind='stable')].astype(np.int32)
+    return {'tabla': tabla, 'ordenes': ordenes}
+
+def histogramas_fechas(fechas):
+    """
+    Conteo de estrenos por año y mes, y por año y dia de la semana, acumulados a lo largo de los años.
+    Se calcula una unica vez de manera vectorizada; luego la cantidad de estrenos de un mes o dia, para todos los años
+    o para un rango de años, es la diferencia de dos filas acumuladas (costo constante).
+
+    Parametros
+    ----------
+    fechas : pd.Series
+
+        Serie de fechas de estreno (datetime64), los nulos se descartan.
+
+    Retorno
+    -------
+    dict
+
+        {'anio_inicial': int, 'mes': numpy.ndarray (años + 1) x 12, 'dia': numpy.ndarray (años + 1) x 7}
+        La fila i de cada matriz contiene los estrenos acumulados de los años anteriores a anio_inicial + i.
+        Los dias de la semana se numeran de 0 (lunes) a 6 (domingo).
+    """
+    fechas = pd.to_datetime(fechas).dropna()
+    if fechas.empty:
+        return {'anio_inicial': 0, 'mes': np.zeros((1, 12), dtype=np.int64), 'dia': np.zeros((1, 7), dtype=np.int64)}
+
+    anios = fechas.dt.year.to_numpy()
+    anio_inicial = int(anios.min())
+    cantidad_anios = int(anios.max()) - anio_inicial + 1
+    fila = anios - anio_inicial
+
+    histogramas = {'anio_inicial': anio_inicial}
+    for nombre, columna, columnas in [('mes', fechas.dt.month.to_numpy() - 1, 12), ('dia', fechas.dt.dayofweek.to_numpy(), 7)]:
+        conteo = np.bincount(fila * columnas + columna, minlength=cantidad_anios * columnas).reshape(cantidad_anios, columnas)
+        acumulado = np.zeros((cantidad_anios + 1, columnas), dtype=np.int64)
+        np.cumsum(conteo, axis=0, out=acumulado[1:])
+        histogramas[nombre] = acumulado
+    return histogramas
+
+def contar_estrenos(histogramas, tipo, valor, anio_desde=None, anio_hasta=None):
+    """
+    Cantidad de estrenos de un mes o dia de la semana, opcionalmente restringida a un rango de años (inclusive).
+
+    Parametros
+    ----------
+    histogramas : dict
+
+        Histogramas generados con histogramas_fechas.
+
+    tipo : str
+
+        'mes' o 'dia'.
+
+    valor : int
+
+        Mes de 1 a 12, o dia de la semana de 0 (lunes) a 6 (domingo).
+
+    anio_desde, anio_hasta : int
+
+        Limites del rango de años, por defecto sin limite.
+
+    Retorno
+    -------
+    int
+
+    Ejemplo
+    --------
+    >>> contar_estrenos(histogramas, 'mes', 1, anio_desde = 1990, anio_hasta = 1999) \t
+    >>> 1234
+    """
+    acumulado = histogramas[tipo]
+    columna = valor - 1 if tipo == 'mes' else valor
+    cantidad_anios = acumulado.shape[0] - 1
+    desde = 0 if anio_desde is None else min(max(anio_desde - histogramas['anio_inicial'], 0), cantidad_anios)
+    hasta = cantidad_anios if anio_hasta is None else min(max(anio_hasta - histogramas['anio_inicial'] + 1, 0), cantidad_anios)
+    if hasta <= desde:
+        return 0
+    return int(acumulado[hasta, columna] - acumulado[desde, columna])
+
+def indice_titulos(titulos):
+    """
+    Indice invertido titulo normalizado --> posiciones de las peliculas con ese titulo.
+    Ante titulos repetidos las posiciones quedan ordenadas de menor a mayor, por lo que la primera es siempre la primer
+    aparicion en el DataFrame.
+
+    Parametros
+    ----------
+    titulos : pd.Series
+
+        Serie de titulos, las posiciones del indice son las de la serie. Los nulos se descartan.
+
+    Retorno
+    -------
+    dict
+
+        Indice generado con indice_invertido, ver buscar para su consulta.
+    """
+    claves = [normalizar(titulo) if pd.notnull(titulo) else None for titulo in titulos]
+    return indice_invertido(claves, np.arange(len(claves)))
+
+#AUTOCOMPLETADO TOLERANTE A ERRORES DE TIPEO
+#Rango de sufijos a partir del cual los mejores resultados de un prefijo se precalculan en lugar de ordenarse por consulta
+UMBRAL_PREFIJO = 512
+#Cantidad maxima de resultados de una consulta de autocompletado
+MAX_RESULTADOS = 50
+#Similitud minima (coeficiente de Dice de trigramas) de las coincidencias aproximadas
+SIMILITUD_MINIMA = 0.3
+
+def _trigramas(claves):
+    # Trigramas de caracteres de cada clave normalizada, con relleno para marcar el inicio y el fin, como enteros (tres
+    # puntos de codigo de 21 bits). Se calculan para todas las claves juntas sobre un unico arreglo de caracteres.
+    # Retorna los codigos y la posicion de la clave de cada uno, con repetidos.
+    textos = [f'  {clave} ' for clave in claves]
+    largos = np.fromiter(map(len, textos), dtype=np.int64, count=len(textos))
+    caracteres = np.frombuffer(''.join(textos).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    if len(caracteres) < 3:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+    codigos = (caracteres[:-2] << np.uint64(42)) | (caracteres[1:-1] << np.uint64(21)) | caracteres[2:]
+    #Solo los trigramas que no cruzan el fin de su clave
+    fines = np.repeat(np.cumsum(largos), largos)[:-2]
+    validos = np.arange(len(codigos)) + 3 <= fines
+    return codigos[validos], np.repeat(np.arange(len(textos)), largos)[:-2][validos]
+
+def _mejores(autocompletado, desde, hasta, limite):
+    # Claves distintas de los sufijos [desde, hasta) ordenadas por: coincidencia desde el inicio de la clave, peso e id
+    claves = autocompletado['claves_sufijo'][desde:hasta]
+    orden = np.lexsort((claves, -autocompletado['pesos'][claves], ~autocompletado['inicio'][desde:hasta]))
+    claves = claves[orden]
+    _, primeras = np.unique(claves, return_index=True)
+    return claves[np.sort(primeras)[:limite]]
+
+def indice_autocompletado(indice, nombres, pesos):
+    """
+    Estructuras de autocompletado sobre las claves de un indice invertido (titulos o personas), construidas una unica vez:
+
+    - Prefijos: arreglo ordenado con los sufijos de cada clave que empiezan en una palabra ('toy story 2', 'story 2',
+      '2'), equivalente a un trie aplanado. Las claves con un prefijo dado ocupan un rango contiguo que se ubica con dos
+      busquedas binarias; para los prefijos muy frecuentes (rango mayor a UMBRAL_PREFIJO) los mejores resultados se
+      precalculan.
+    - Trigramas: indice invertido trigrama de caracteres --> claves (ver indice_invertido), para las coincidencias
+      aproximadas ante errores de tipeo sin calcular distancias contra todo el catalogo.
+
+    Parametros
+    ----------
+    indice : dict
+
+        Indice generado con indice_invertido (por ejemplo indice_titulos o indice_personas).
+
+    nombres : list o numpy.ndarray
+
+        Nombre a mostrar de cada clave, en el orden de los ids del indice.
+
+    pesos : numpy.ndarray
+
+        Relevancia de cada clave para ordenar los resultados (por ejemplo la popularidad), en el orden de los ids.
+
+    Retorno
+    -------
+    dict
+
+        Ver autocompletar para su consulta.
+    """
+    claves = list(indice['ids'])
+    sufijos, claves_sufijo, inicio = [], [], []
+    for i, clave in enumerate(claves):
+        inicios = [0] + [j + 1 for j, caracter in enumerate(clave) if caracter == ' ']
+        sufijos += [clave[j:] for j in inicios]
+        claves_sufijo += [i] * len(inicios)
+        inicio += [True] + [False] * (len(inicios) - 1)
+    sufijos = np.array(sufijos, dtype=object)
+    orden = np.argsort(sufijos, kind='stable')
+    autocompletado = {'sufijos': sufijos[orden], 'claves_sufijo': np.array(claves_sufijo, dtype=np.int32)[orden],
+                      'inicio': np.array(inicio, dtype=bool)[orden], 'nombres': np.asarray(nombres, dtype=object),
+                      'pesos': np.nan_to_num(np.asarray(pesos, dtype=np.float64)), 'frecuentes': {}}
+
+    #Mejores resultados de los prefijos frecuentes, nivel por nivel hasta que ningun rango supere el umbral. En cada nivel
+    #solo se expanden los rangos grandes del nivel anterior y solo los sufijos de al menos largo caracteres, de modo que
+    #cada prefijo se calcula una unica vez sobre su rango completo y los grupos de sufijos identicos se agotan
+    sufijos = autocompletado['sufijos']
+    largos = np.fromiter(map(len, sufijos), dtype=np.int64, count=len(sufijos))
+    activos = np.arange(len(sufijos))
+    largo = 1
+    while len(activos) > UMBRAL_PREFIJO:
+        activos = activos[largos[activos] >= largo]
+        prefijos = np.array([sufijo[:largo] for sufijo in sufijos[activos]], dtype=object)
+        cortes = np.flatnonzero(np.r_[True, prefijos[1:] != prefijos[:-1], True])
+        grandes = np.flatnonzero(np.diff(cortes) > UMBRAL_PREFIJO)
+        #Los sufijos con un mismo prefijo son contiguos en el arreglo ordenado completo
+        for g in grandes:
+            autocompletado['frecuentes'][prefijos[cortes[g]]] = _mejores(autocompletado, activos[cortes[g]], activos[cortes[g + 1] - 1] + 1, MAX_RESULTADOS)
+        activos = np.concatenate([activos[cortes[g]:cortes[g + 1]] for g in grandes]) if len(grandes) > 0 else activos[:0]
+        largo += 1
+
+    autocompletado['trigramas'] = indice_invertido(*_trigramas(claves))
+    autocompletado['cantidad_trigramas'] = np.bincount(autocompletado['trigramas']['posiciones'], minlength=len(claves)).astype(np.int32)
+    return autocompletado
+
+def autocompletar(autocompletado, texto, limite = 10):
+    """
+    Candidatos para un texto parcial o con errores de tipeo: primero las claves con alguna palabra que empieza con el
+    texto (las que empiezan desde el inicio antes que el resto, luego por peso) y, si no alcanzan el limite, las claves
+    mas parecidas por trigramas (coeficiente de Dice mayor o igual a SIMILITUD_MINIMA).
+
+    Parametros
+    ----------
+    autocompletado : dict
+
+        Estructuras generadas con indice_autocompletado.
+
+    texto : str
+
+        Texto ingresado, sin normalizar.
+
+    limite : int
+
+        Cantidad maxima de resultados, hasta MAX_RESULTADOS.
+
+    Retorno
+    -------
+    list
+
+        [(id de clave, 'prefijo' o 'aproximado', puntaje), ...] ordenados de mejor a peor. El puntaje es 1 para las
+        coincidencias por prefijo y la similitud de trigramas para las aproximadas.
+
+    Ejemplo
+    --------
+    >>> autocompletar(autocompletado, 'toy sto', 2) \t
+    >>> [(0, 'prefijo', 1.0), (2917, 'prefijo', 1.0)]
+    >>> autocompletar(autocompletado, 'jumanjii', 1) \t
+    >>> [(1, 'aproximado', 0.83)]
+    """
+    clave = normalizar(texto)
+    limite = min(limite, MAX_RESULTADOS)
+    if not clave or limite <= 0:
+        return []
+
+    frecuentes = autocompletado['frecuentes'].get(clave)
+    if frecuentes is not None:
+        encontradas = frecuentes[:limite]
+    else:
+        sufijos = autocompletado['sufijos']
+        desde = np.searchsorted(sufijos, clave, side='left')
+        hasta = np.searchsorted(sufijos, clave + '\U0010ffff', side='left')
+        encontradas = _mejores(autocompletado, desde, hasta, limite)
+    resultados = [(int(i), 'prefijo', 1.0) for i in encontradas]
+    if len(resultados) >= limite:
+        return resultados
+
+    #Coincidencias aproximadas: cantidad de trigramas compartidos con cada clave, a partir de las listas de los trigramas
+    trigramas_consulta = set(_trigramas([clave])[0].tolist())
+    indice = autocompletado['trigramas']
+    ids = [indice['ids'][t] for t in trigramas_consulta if t in indice['ids']]
+    if not ids:
+        return resultados
+    listas = np.concatenate([indice['posiciones'][indice['indptr'][i]:indice['indptr'][i + 1]] for i in ids])
+    #Conteo por ordenamiento si las listas son cortas respecto de las claves, por histograma si no
+    if len(listas) * 4 < len(autocompletado['nombres']):
+        candidatas, comunes = np.unique(listas, return_counts=True)
+    else:
+        comunes = np.bincount(listas, minlength=len(autocompletado['nombres']))
+        candidatas = np.flatnonzero(comunes)
+        comunes = comunes[candidatas]
+    similitud = 2 * comunes / (len(trigramas_consulta) + autocompletado['cantidad_trigramas'][candidatas])
+    validas = (similitud >= SIMILITUD_MINIMA) & ~np.isin(candidatas, encontradas)
+    candidatas, similitud = candidatas[validas], similitud[validas]
+    #Solo se ordenan las candidatas con similitud de al menos la del ultimo lugar (seleccion parcial)
+    faltantes = limite - len(resultados)
+    if len(similitud) > faltantes:
+        validas = similitud >= np.partition(similitud, len(similitud) - faltantes)[len(similitud) - faltantes]
+        candidatas, similitud = candidatas[validas], similitud[validas]
+    orden = np.lexsort((candidatas, -autocompletado['pesos'][candidatas], -similitud))[:faltantes]
+    return resultados + [(int(i), 'aproximado', round(float(s), 4)) for i, s in zip(candidatas[orden], similitud[orden])]
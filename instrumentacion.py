@@ -0,0 +1,225 @@
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from collections import Counter
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# INSTRUMENTACION DE LA API: ETAPAS, LATENCIAS, TAMAÑOS Y PERFILADOR POR MUESTREO
+# - tramo('nombre'): duracion de una etapa (carga, merge, parseo de listas, ajuste TF-IDF, similitudes, ...).
+# - observar(metrica, etiqueta, segundos): histogramas de latencia, por ejemplo por endpoint.
+# - fijar(metrica, etiqueta, valor): valores puntuales, por ejemplo memoria de cada estructura o claves de cada indice.
+# - exportar(): todo lo anterior en formato de texto de Prometheus, expuesto por la API en /metrics.
+# - iniciar_perfilador / detener_perfilador / perfil: muestreo periodico de las pilas de todos los hilos, desactivado
+#   por defecto, para atribuir el tiempo de las consultas lentas a funciones concretas sin herramientas externas.
+
+#Limites superiores (segundos) de los intervalos de los histogramas
+LIMITES = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_bloqueo = threading.Lock()
+_etapas = {}
+_histogramas = {}
+_valores = {}
+_perfilador = {'hilo': None, 'activo': False, 'intervalo': 0.01, 'muestras': 0, 'pilas': Counter()}
+
+@contextmanager
+def tramo(nombre):
+    """
+    Medicion de la duracion de una etapa, se acumulan cantidad, suma y ultima duracion por nombre.
+
+    Ejemplo
+    --------
+    >>> with tramo('ajuste_tfidf'):
+    >>>     tfidf_matrix = tfidf_vectorizer.fit_transform(textos)
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        with _bloqueo:
+            etapa = _etapas.setdefault(nombre, [0, 0.0, 0.0])
+            etapa[0] += 1
+            etapa[1] += duracion
+            etapa[2] = duracion
+
+def observar(metrica, etiqueta, segundos):
+    """
+    Registro de una duracion en el histograma de la metrica para la etiqueta indicada (por ejemplo el endpoint).
+    """
+    with _bloqueo:
+        histograma = _histogramas.get((metrica, etiqueta))
+        if histograma is None:
+            histograma = _histogramas[(metrica, etiqueta)] = [np.zeros(len(LIMITES) + 1, dtype=np.int64), 0.0]
+        histograma[0][np.searchsorted(LIMITES, segundos)] += 1
+        histograma[1] += segundos
+
+def fijar(metrica, etiqueta, valor):
+    """
+    Valor puntual de una metrica para la etiqueta indicada, reemplaza el anterior.
+    """
+    with _bloqueo:
+        _valores[(metrica, etiqueta)] = float(valor)
+
+def memoria(objeto):
+    """
+    Memoria ocupada por una estructura de la API, en bytes.
+
+    Parametros
+    ----------
+    objeto : pd.DataFrame, scipy.sparse matriz, numpy.ndarray o dict
+
+        Los DataFrame incluyen el contenido de las columnas de objetos, las matrices dispersas sus tres arreglos y los
+        diccionarios (indices invertidos) la suma de sus valores y claves. Los arreglos mapeados en memoria se cuentan
+        por su tamaño aunque residan en el cache de paginas del sistema.
+
+    Retorno
+    -------
+    int
+    """
+    if isinstance(objeto, pd.DataFrame):
+        return int(objeto.memory_usage(index=True, deep=True).sum())
+    if sparse.issparse(objeto):
+        return int(objeto.data.nbytes + objeto.indices.nbytes + objeto.indptr.nbytes)
+    if isinstance(objeto, np.ndarray):
+        return int(objeto.nbytes)
+    if isinstance(objeto, dict):
+        return sys.getsizeof(objeto) + sum(memoria(clave) + memoria(valor) for clave, valor in objeto.items())
+    return sys.getsizeof(objeto)
+
+def _etiqueta(nombre, valor):
+    valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return f'{nombre}="{valor}"'
+
+def exportar(adicionales = None):
+    """
+    Metricas en formato de texto de Prometheus (version 0.0.4).
+
+    Parametros
+    ----------
+    adicionales : dict
+
+        {subsistema: dict de metricas}, por ejemplo {'pool': ejecutor.metricas(), 'cache': cache.metricas()}. Se exportan
+        los valores numericos como api_<subsistema>_<clave>.
+
+    Retorno
+    -------
+    str
+    """
+    with _bloqueo:
+        etapas = {nombre: list(valores) for nombre, valores in _etapas.items()}
+        histogramas = {clave: (conteos.copy(), suma) for clave, (conteos, suma) in _histogramas.items()}
+        valores = dict(_valores)
+
+    lineas = []
+    if etapas:
+        lineas += ['# HELP api_etapa_segundos Duracion de las etapas de carga y construccion',
+                   '# TYPE api_etapa_segundos summary']
+        for nombre, (cantidad, suma, _) in sorted(etapas.items()):
+            lineas.append(f'api_etapa_segundos_sum{{{_etiqueta("etapa", nombre)}}} {suma:.6f}')
+            lineas.append(f'api_etapa_segundos_count{{{_etiqueta("etapa", nombre)}}} {cantidad}')
+        lineas += ['# HELP api_etapa_ultima_segundos Duracion de la ultima ejecucion de cada etapa',
+                   '# TYPE api_etapa_ultima_segundos gauge']
+        lineas += [f'api_etapa_ultima_segundos{{{_etiqueta("etapa", nombre)}}} {ultima:.6f}' for nombre, (_, _, ultima) in sorted(etapas.items())]
+
+    for metrica in sorted({metrica for metrica, _ in histogramas}):
+        lineas += [f'# HELP api_{metrica}_segundos Histograma de duraciones de {metrica}', f'# TYPE api_{metrica}_segundos histogram']
+        for (nombre, etiqueta), (conteos, suma) in sorted(histogramas.items()):
+            if nombre != metrica:
+                continue
+            acumulados = np.cumsum(conteos)
+            for limite, acumulado in zip(LIMITES + ('+Inf',), acumulados):
+                lineas.append(f'api_{metrica}_segundos_bucket{{{_etiqueta("endpoint", etiqueta)},le="{limite}"}} {acumulado}')
+            lineas.append(f'api_{metrica}_segundos_sum{{{_etiqueta("endpoint", etiqueta)}}} {suma:.6f}')
+            lineas.append(f'api_{metrica}_segundos_count{{{_etiqueta("endpoint", etiqueta)}}} {acumulados[-1]}')
+
+    for metrica in sorted({metrica for metrica, _ in valores}):
+        lineas.append(f'# TYPE api_{metrica} gauge')
+        lineas += [f'api_{metrica}{{{_etiqueta("nombre", etiqueta)}}} {valor}' for (nombre, etiqueta), valor in sorted(valores.items()) if nombre == metrica]
+
+    for subsistema, metricas in (adicionales or {}).items():
+        for clave, valor in metricas.items():
+            if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                lineas += [f'# TYPE api_{subsistema}_{clave} gauge', f'api_{subsistema}_{clave} {valor}']
+
+    try:
+        import psutil
+        lineas += ['# TYPE api_proceso_memoria_residente_bytes gauge', f'api_proceso_memoria_residente_bytes {psutil.Process().memory_info().rss}']
+    except ImportError:
+        pass
+    return '\n'.join(lineas) + '\n'
+
+def medir_consultas(app):
+    """
+    Middleware ASGI: latencia total de cada consulta HTTP (cola, cache y calculo incluidos) en el histograma
+    'consulta', etiquetado con la ruta del endpoint.
+
+    Ejemplo
+    --------
+    >>> app.add_middleware(medir_consultas)
+    """
+    async def envoltura(scope, receive, send):
+        if scope['type'] != 'http':
+            return await app(scope, receive, send)
+        inicio = time.perf_counter()
+        try:
+            await app(scope, receive, send)
+        finally:
+            #La ruta (plantilla, no la URL concreta) la agrega el enrutador de FastAPI al resolver la consulta
+            ruta = getattr(scope.get('route'), 'path', 'sin_ruta')
+            observar('consulta', ruta, time.perf_counter() - inicio)
+    return envoltura
+
+def _muestrear():
+    propio = threading.get_ident()
+    while _perfilador['activo']:
+        for hilo, marco in sys._current_frames().items():
+            if hilo == propio:
+                continue
+            pila = []
+            while marco is not None and len(pila) < 64:
+                pila.append(f'{marco.f_code.co_filename.rsplit("/", 1)[-1]}:{marco.f_code.co_name}')
+                marco = marco.f_back
+            with _bloqueo:
+                _perfilador['pilas'][';'.join(reversed(pila))] += 1
+        with _bloqueo:
+            _perfilador['muestras'] += 1
+        time.sleep(_perfilador['intervalo'])
+
+def iniciar_perfilador(intervalo = 0.01):
+    """
+    Activacion del perfilador por muestreo: cada intervalo segundos se registra la pila de cada hilo del proceso.
+    Reinicia las muestras acumuladas.
+    """
+    detener_perfilador()
+    with _bloqueo:
+        _perfilador.update({'activo': True, 'intervalo': intervalo, 'muestras': 0, 'pilas': Counter()})
+    _perfilador['hilo'] = threading.Thread(target=_muestrear, name='perfilador', daemon=True)
+    _perfilador['hilo'].start()
+
+def detener_perfilador():
+    """
+    Desactivacion del perfilador, las muestras se conservan hasta la proxima activacion.
+    """
+    _perfilador['activo'] = False
+    if _perfilador['hilo'] is not None:
+        _perfilador['hilo'].join()
+        _perfilador['hilo'] = None
+
+def perfil(limite = 50):
+    """
+    Pilas mas frecuentes registradas por el perfilador.
+
+    Retorno
+    -------
+    dict
+
+        {'activo': bool, 'intervalo': float, 'muestras': int, 'pilas': [{'pila': 'archivo:funcion;...', 'muestras': int}, ...]}
+        Las pilas van de la funcion externa a la interna (formato plegado, compatible con flamegraph).
+    """
+    with _bloqueo:
+        pilas = _perfilador['pilas'].most_common(limite)
+        return {'activo': _perfilador['activo'], 'intervalo': _perfilador['intervalo'], 'muestras': _perfilador['muestras'],
+                'pilas': [{'pila': pila, 'muestras': muestras} for pila, muestras in pilas]}
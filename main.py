@@ -1,10 +1,28 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import numpy as np
 import pandas as pd
+from datos import cargar_peliculas, cargar_creditos, seleccionar_filas, compactar, aplanar, a_listas
 #Script propio de ML
-from ml_models import matriz_similitud, obtener_recomendaciones
+from ml_models import construir_modelo, cargar_modelo, coincide_titulos, obtener_recomendaciones_lote
+from ml_models import modelo_hibrido, recomendaciones_hibridas_lote, PESOS_HIBRIDO, buscar_descripcion
+from indices import indice_personas, indice_titulos, buscar, histogramas_fechas, contar_estrenos, normalizar
+from indices import agregados_personas, METRICAS_PERSONAS
+from indices import indice_autocompletado, autocompletar, MAX_RESULTADOS
 # Librerias necesarias para la portada y la API
-from fastapi import FastAPI, Form, Request
+from cache import cacheado, invalidar as invalidar_cache, metricas as metricas_cache
+from ejecutor import en_pool, iniciar as iniciar_pool, detener as detener_pool, metricas as metricas_pool
+from respuestas import Columnas, RespuestaJSON, RespuestaNDJSON, codificar_cursor, leer_cursor
+import instrumentacion
+from instrumentacion import tramo
+from fastapi import FastAPI, Form, Request, HTTPException, Query
 from enum import Enum
-from fastapi.responses import HTMLResponse
+from typing import Optional, List, Dict, Tuple, Callable, Awaitable
+from pydantic import BaseModel, Field
+from fastapi.responses import HTMLResponse, PlainTextResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 
 templates = Jinja2Templates(directory="templates")
@@ -13,6 +31,8 @@ templates = Jinja2Templates(directory="templates")
 app = FastAPI()
 app.title = "Movies API - ML MoviesRecommenderSystem"
 app.version = "1.0.0"
+#Latencia de cada consulta por endpoint, expuesta en /metrics
+app.add_middleware(instrumentacion.medir_consultas)
 
 #Necesario para los logos
 from fastapi.staticfiles import StaticFiles
@@ -32,47 +52,283 @@ async def mostrar_portada(request: Request):
     ]
     return templates.TemplateResponse("index.html", {"funciones": funciones, "request": request})
 
-dicFunc = {"PELICULAS POR MES": "cantidad_filmaciones_mes",
-            "PELICULAS POR DIA": "cantidad_filmaciones_dia",
-            "POPULARIDAD DEL TITULO": "score_titulo",
-            "VOTOS DEL TITULO":"votos_titulo",
-            "INFORMACION DE ACTOR":"get_actor",
-            "INFORMACION DE DIRECTOR":"get_director",
-            "SISTEMA DE RECOMENDACION":"get_recomendacion"}
+#Maxima cantidad de consultas por lote desde la portada
+MAX_CONSULTAS_LOTE = 50
+
+async def resolver_consulta(funcion: str, parametro: str):
+    # Despacho de una consulta de la portada a su endpoint mediante el registro dicFunc (definido al final del modulo)
+    if funcion not in dicFunc:
+        return {"error": "Función no válida"}
+    endpoint, tipo = dicFunc[funcion]
+    try:
+        return await endpoint(tipo(parametro.lower()))
+    except HTTPException:
+        raise
+    except Exception as e:
+        return {"Error": str(e), "Type": "Entrada incorrecta o desconocida, vea /docs para mas detalles"}
 
 @app.post("/consultar")
 async def consultar(request: Request, funcion: str = Form(...), parametro: str = Form(...)):
-    funcion = dicFunc[funcion]
-    if funcion in dicFunc.values():
-        try:
-            parametro = parametro.lower()
-            resultado = await eval(f"{funcion}('{parametro}')")
-            return resultado
-        except Exception as e:
-            return {"Error": str(e), "Type": "Entrada incorrecta o desconocida, vea /docs para mas detalles"}
-    else:
-        return {"error": "Función no válida"}
+    return await resolver_consulta(funcion, parametro)
+
+class Consulta(BaseModel):
+    funcion: str
+    parametro: str
+
+@app.post("/consultar/lote")
+async def consultar_lote(consultas: List[Consulta]):
+    """
+    Varias consultas de la portada (funcion, parametro) en una sola petición, evaluadas de manera concurrente.
+    Se devuelve un resultado por consulta, en el mismo orden; mas de MAX_CONSULTAS_LOTE consultas se rechazan con 422.
+    """
+    if len(consultas) > MAX_CONSULTAS_LOTE:
+        raise HTTPException(status_code=422, detail=f'Se admiten hasta {MAX_CONSULTAS_LOTE} consultas por lote')
+    resultados = await asyncio.gather(*[resolver_consulta(c.funcion, c.parametro) for c in consultas], return_exceptions=True)
+    #Los errores HTTP (saturacion, tiempo maximo) se informan por consulta sin afectar a las demas. Las respuestas ya
+    #codificadas de los endpoints (RespuestaJSON) se insertan tal cual
+    return RespuestaJSON({'resultados': [{"Error": r.detail, "status": r.status_code} if isinstance(r, HTTPException) else r for r in resultados]})
+
+#Cantidad de vecinos conservados por pelicula en el sistema de recomendacion
+K_VECINOS = 50
+#Modelo preconstruido con construir_modelo.py, si no existe o no corresponde a los datos se ajusta al iniciar
+MODELO_DIR = 'data/modelo'
+#Columnas de cleanMovies.csv empleadas por la API, el resto no se carga
+COLUMNAS_API = ['id', 'title', 'genres', 'release_date', 'release_year', 'popularity', 'vote_count', 'vote_average', 'budget', 'revenue', 'return']
+#Pesos del modo hibrido del sistema de recomendacion (similitud de texto, de metadata y prior de popularidad)
+PESOS_RECOMENDACION = {componente: float(os.environ.get(f'PESO_{componente.upper()}', peso)) for componente, peso in PESOS_HIBRIDO.items()}
+#Autocompletado de nombres de actores y directores en /pelicula/buscar, ademas de los titulos (mas memoria al iniciar)
+AUTOCOMPLETAR_PERSONAS = os.environ.get('AUTOCOMPLETAR_PERSONAS', '0') == '1'
+#Construccion del sistema de recomendacion en segundo plano: la API acepta consultas apenas se cargan las peliculas y
+#los endpoints de recomendacion responden 503 hasta que el modelo esta listo. Con RECOMENDADOR_DIFERIDO=0 el inicio
+#espera a que el modelo este cargado, como antes
+RECOMENDADOR_DIFERIDO = os.environ.get('RECOMENDADOR_DIFERIDO', '1') == '1'
+#Intervalo del perfilador por muestreo al iniciar (segundos), 0 = desactivado
+PERFILADOR_INTERVALO = float(os.environ.get('PERFILADOR_INTERVALO', 0))
+
+logger = logging.getLogger(__name__)
+
+#Estado de cada componente de la API ('pendiente', 'cargando', 'listo' o 'error'), informado en /estado/salud
+componentes = {'datos': {'estado': 'pendiente'}, 'recomendador': {'estado': 'pendiente'}}
+#Se activa cuando termina la carga del recomendador, con o sin error
+recomendador_terminado = threading.Event()
+modelo = None
 
 #INICIO DE LA API
 @app.on_event("startup")
 async def startup_event():
+    # Pool de hilos para el calculo de los endpoints, configurable con POOL_HILOS, POOL_COLA y POOL_TIMEOUT
+    iniciar_pool()
+    componentes['recomendador'] = {'estado': 'pendiente'}
+    recomendador_terminado.clear()
+    with tramo('startup'):
+        iniciar_componente('datos', cargar_datos)
+        if not RECOMENDADOR_DIFERIDO:
+            iniciar_componente('recomendador', cargar_recomendador)
+    registrar_tamanos()
+    # Las respuestas en cache corresponden a los datos recien cargados
+    invalidar_cache(version_cache())
+    if RECOMENDADOR_DIFERIDO:
+        threading.Thread(target=cargar_recomendador_en_segundo_plano, name='recomendador', daemon=True).start()
+    else:
+        recomendador_terminado.set()
+    # Perfilador por muestreo, desactivado salvo que se indique PERFILADOR_INTERVALO (segundos) o se active en /estado/perfilador
+    if PERFILADOR_INTERVALO > 0:
+        instrumentacion.iniciar_perfilador(PERFILADOR_INTERVALO)
+
+def iniciar_componente(nombre, carga):
+    # Ejecucion de la carga de un componente registrando su estado y duracion (/estado/salud y /metrics)
+    componentes[nombre] = {'estado': 'cargando'}
+    instrumentacion.fijar('componente_listo', nombre, 0)
+    inicio = time.perf_counter()
+    try:
+        carga()
+    except Exception as e:
+        componentes[nombre] = {'estado': 'error', 'error': f'{type(e).__name__}: {e}'}
+        raise
+    componentes[nombre] = {'estado': 'listo', 'segundos': round(time.perf_counter() - inicio, 3)}
+    instrumentacion.fijar('componente_listo', nombre, 1)
+
+def cargar_recomendador_en_segundo_plano():
+    try:
+        with tramo('recomendador_segundo_plano'):
+            iniciar_componente('recomendador', cargar_recomendador)
+    except Exception:
+        logger.exception('Error al cargar el sistema de recomendacion, sus endpoints no estaran disponibles')
+    finally:
+        recomendador_terminado.set()
+
+def version_cache():
+    # Version de los datos y del modelo vigentes, la cache se vacia cada vez que cambia
+    if modelo is None:
+        return f"{len(df)}-sin_modelo"
+    return f"{len(df)}-{modelo['metadata'].get('actualizado', modelo['metadata']['creado'])}"
+
+def requiere_recomendador():
+    # Los endpoints de recomendacion responden 503 mientras el modelo se construye (o si su carga fallo)
+    estado = componentes['recomendador']
+    if estado['estado'] == 'error':
+        raise HTTPException(status_code=503, detail=f"El sistema de recomendacion no esta disponible: {estado['error']}")
+    if estado['estado'] != 'listo':
+        raise HTTPException(status_code=503, detail='El sistema de recomendacion se esta iniciando, reintente en unos segundos', headers={'Retry-After': '5'})
+
+def cargar_datos():
     # CARGANDO LOS ARCHIVOS NECESARIOS PARA LOS ENDPOINTS
     global df
-    global df2
-    global df3
-    df = pd.read_csv('data/cleanMovies.csv', parse_dates = ['release_date'])
-    df2 = pd.read_csv('data/cleanCredits.csv')
-    df3 = pd.merge(df, df2, on='id', how='inner')
-    # Casteo de datos a tipo lista para posterior manipulacion
-    df3['cast'] = df3['cast'].apply(lambda x: eval(x) if pd.notnull(x) else list([]))
-    df3['director'] = df3['director'].apply(lambda x: eval(x) if pd.notnull(x) else list([]))
-
-    #ENTRADA REDUCIDA PARA EL SISTEMA DE ML
-    global entrada_ml
-    entrada_ml = df[0:5000][['title', 'genres', 'overview']]
-    entrada_ml.reset_index
-    global similitudes
-    similitudes = matriz_similitud(entrada_ml)
+    # Formato columnar generado con datos.py, o los CSV del ETL si este no existe. Solo las columnas que usa la API,
+    # con textos repetidos como categoricas y numericas en el tipo mas chico sin perdida (ver compactar)
+    df = compactar(cargar_peliculas(columnas = COLUMNAS_API))
+    # Generos de cada pelicula en forma plana (codigos enteros por fila, ver datos.aplanar) en lugar de listas de Python
+    global generos
+    generos = aplanar(df.pop('genres'))
+    df2, creditos = cargar_creditos()
+    # Indice titulo normalizado --> posiciones en df, compartido por los endpoints de titulo y el de recomendacion
+    global indice_titulo
+    # Estrenos por año y mes/dia de la semana, acumulados, para los endpoints 1 y 2
+    global estrenos
+    with tramo('indices_peliculas'):
+        indice_titulo = indice_titulos(df['title'])
+        estrenos = histogramas_fechas(df['release_date'])
+    # Fila de creditos de cada pelicula (-1 si no tiene), reemplaza al merge: el cast y los directores quedan alineados a
+    # las filas de df sin duplicar sus columnas
+    with tramo('merge'):
+        primeras = ~df2['id'].duplicated(keep='first').to_numpy()
+        filas_creditos = pd.Index(df2['id'].to_numpy()[primeras]).get_indexer(df['id'].to_numpy())
+        filas_creditos = np.where(filas_creditos >= 0, np.flatnonzero(primeras)[filas_creditos], -1)
+    # Personas como ids enteros: pelicula --> personas (offsets por fila de df + codigos, ver datos.aplanar) y sus indices
+    # invertidos persona --> posiciones en df
+    global personas
+    global indice_actores
+    global indice_directores
+    with tramo('indices_personas'):
+        personas = {columna: seleccionar_filas(creditos[columna], filas_creditos) for columna in ['cast', 'director']}
+        indice_actores = indice_personas(personas['cast'])
+        indice_directores = indice_personas(personas['director'])
+    del df2, creditos
+
+    # Agregados por persona (cantidad de peliculas, retorno, presupuesto y ganancia) y su orden por cada metrica, para
+    # get_actor, get_director y los rankings
+    global agregados
+    with tramo('agregados_personas'):
+        agregados = {'actor': agregados_personas(indice_actores, personas['cast'], df),
+                     'director': agregados_personas(indice_directores, personas['director'], df)}
+
+    # Autocompletado (prefijos + trigramas) sobre las claves de los indices: se muestra el titulo de la primer pelicula
+    # de cada clave ordenado por su mayor popularidad, y el nombre de cada persona ordenado por su cantidad de peliculas
+    global autocompletado
+    with tramo('autocompletado'):
+        inicios = indice_titulo['posiciones'][indice_titulo['indptr'][:-1]]
+        popularidad = np.nan_to_num(df['popularity'].to_numpy(dtype=np.float64))[indice_titulo['posiciones']]
+        autocompletado = {'titulo': indice_autocompletado(indice_titulo, df['title'].to_numpy(dtype=object)[inicios],
+                                                          np.maximum.reduceat(popularidad, indice_titulo['indptr'][:-1]) if len(popularidad) else [])}
+        if AUTOCOMPLETAR_PERSONAS:
+            for tipo, indice in [('actor', indice_actores), ('director', indice_directores)]:
+                tabla = agregados[tipo]['tabla']
+                autocompletado[tipo] = indice_autocompletado(indice, tabla['nombre'].to_numpy(), tabla['cantidad_peliculas'].to_numpy())
+
+def cargar_recomendador():
+    # Indice disperso con los K vecinos de cada pelicula, memoria lineal en la cantidad de peliculas. Las variables
+    # globales se reemplazan juntas al final, las consultas nunca ven un modelo a medio cargar
+    nuevo = None
+    with tramo('modelo'):
+        if os.path.exists(os.path.join(MODELO_DIR, 'metadata.json')):
+            nuevo = cargar_modelo(MODELO_DIR)
+            # El modelo guardado debe corresponder fila a fila con las peliculas cargadas y conservar K_VECINOS vecinos por
+            # pelicula (o todas las demas si hay menos), el maximo top_n que admiten los endpoints
+            if not coincide_titulos(nuevo, df['title']):
+                logger.warning(f"El modelo en {MODELO_DIR} no corresponde a los datos cargados, se reconstruye")
+                nuevo = None
+            elif nuevo['metadata']['k'] < min(K_VECINOS, len(df) - 1):
+                logger.warning(f"El modelo en {MODELO_DIR} conserva menos de {K_VECINOS} vecinos por pelicula, se reconstruye")
+                nuevo = None
+        if nuevo is None:
+            # ENTRADA PARA EL SISTEMA DE ML, CATALOGO COMPLETO. El overview solo se carga para ajustar el modelo y los
+            # textos combinados solo se usan para guardarlo
+            entrada_ml = pd.DataFrame({'title': df['title'], 'genres': a_listas(generos), 'overview': cargar_peliculas(columnas = ['overview'])['overview']})
+            nuevo = construir_modelo(entrada_ml, k = K_VECINOS)
+            nuevo['textos'] = None
+    # Features de metadata y prior de popularidad por pelicula para el modo hibrido de recomendacion
+    with tramo('modelo_hibrido'):
+        nuevo_hibrido = modelo_hibrido(generos, df)
+
+    global modelo, similitudes, hibrido
+    modelo, similitudes, hibrido = nuevo, nuevo['vecinos'], nuevo_hibrido
+    registrar_tamanos()
+    # Las respuestas en cache corresponden al modelo anterior
+    invalidar_cache(version_cache())
+
+def registrar_tamanos():
+    # Memoria de las estructuras en memoria y claves de los indices, se informan en /metrics
+    estructuras_modelo = [] if modelo is None else [('similitudes', similitudes), ('tfidf', modelo['tfidf']), ('terminos', modelo['terminos']),
+                                                    ('hibrido_features', hibrido['features']), ('hibrido_prior', hibrido['prior'])]
+    for nombre, estructura in estructuras_modelo + [('df', df), ('generos', generos),
+                               ('personas_cast', personas['cast']), ('personas_director', personas['director']),
+                               ('indice_titulo', indice_titulo), ('indice_actores', indice_actores),
+                               ('indice_directores', indice_directores), ('estrenos', estrenos),
+                               ('autocompletado', autocompletado),
+                               ('agregados_actores', agregados['actor']['tabla']), ('agregados_directores', agregados['director']['tabla'])]:
+        instrumentacion.fijar('memoria_bytes', nombre, instrumentacion.memoria(estructura))
+    for nombre, indice in [('titulo', indice_titulo), ('actores', indice_actores), ('directores', indice_directores)]:
+        instrumentacion.fijar('indice_claves', nombre, len(indice['ids']))
+    instrumentacion.fijar('peliculas', 'df', len(df))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    detener_pool()
+    instrumentacion.detener_perfilador()
+
+@app.get("/estado/salud", tags=['Estado'])
+async def estado_salud():
+    """
+    Estado de cada componente de la API ('pendiente', 'cargando', 'listo' o 'error', con la duracion de la carga o el
+    error). Responde 200 cuando los endpoints de datos están disponibles (aunque el sistema de recomendación siga
+    construyéndose en segundo plano) y 503 si no, para usar como chequeo de disponibilidad del despliegue.
+    """
+    listo = componentes['datos']['estado'] == 'listo'
+    return JSONResponse({'listo': listo, 'recomendador_listo': componentes['recomendador']['estado'] == 'listo', 'componentes': componentes},
+                        status_code=200 if listo else 503)
+
+@app.get("/estado/pool", tags=['Estado'])
+async def estado_pool():
+    """
+    Utilización del pool de hilos que ejecuta los endpoints: capacidad, consultas en ejecución y en espera, y contadores de
+    consultas completadas, rechazadas por saturación (503) y por tiempo máximo (504).
+    """
+    return metricas_pool()
+
+@app.get("/estado/cache", tags=['Estado'])
+async def estado_cache():
+    """
+    Estado de la cache de respuestas: tamaño, versión de datos/modelo vigente, aciertos, fallos, consultas compartidas
+    con un cálculo en curso, desalojos LRU y entradas vencidas. Configurable con CACHE_TAMANO y CACHE_TTL.
+    """
+    return metricas_cache()
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=['Estado'])
+async def metrics():
+    """
+    Métricas en formato de texto de Prometheus: duración de las etapas de carga y construcción del modelo, histogramas de
+    latencia por endpoint (consulta completa y cálculo en el pool), memoria de df, de las personas y del índice de similitudes,
+    claves de los índices, y estado del pool y de la cache.
+    """
+    return instrumentacion.exportar({'pool': metricas_pool(), 'cache': metricas_cache()})
+
+@app.get("/estado/perfilador", tags=['Estado'])
+async def estado_perfilador(limite: int = 50):
+    """
+    Pilas más frecuentes registradas por el perfilador por muestreo (formato plegado, de la función externa a la interna).
+    """
+    return instrumentacion.perfil(limite)
+
+@app.post("/estado/perfilador", tags=['Estado'])
+async def activar_perfilador(activo: bool, intervalo: float = Query(0.01, gt=0)):
+    """
+    Activación o desactivación del perfilador por muestreo. Al activarlo se reinician las muestras acumuladas.
+    """
+    if activo:
+        instrumentacion.iniciar_perfilador(intervalo)
+    else:
+        await asyncio.get_running_loop().run_in_executor(None, instrumentacion.detener_perfilador)
+    return instrumentacion.perfil(0)
 
 #Endpoint 1
 class Mes(str, Enum):
@@ -105,11 +361,14 @@ meses = {
 }
 
 @app.get("/peliculas/get_month/{mes}", tags=['Peliculas'])
-async def cantidad_filmaciones_mes( mes: Mes ):
+@cacheado
+@en_pool
+def cantidad_filmaciones_mes( mes: Mes, anio_desde: Optional[int] = None, anio_hasta: Optional[int] = None ):
     """
     Cantidad de filmaciones estrenadas el mes indicado.
 
-    Esta función recibe un mes en idioma español y retorna el número de peliculas estrenadas dicho mes sin importar cual es el año.
+    Esta función recibe un mes en idioma español y retorna el número de peliculas estrenadas dicho mes sin importar cual es el año,
+    o solo entre los años indicados (inclusive) si se especifican anio_desde y/o anio_hasta.
 
     Parametros
     ----------
@@ -117,6 +376,10 @@ async def cantidad_filmaciones_mes( mes: Mes ):
 
         mes en idioma español enero,febrero,marzo,...
 
+    anio_desde, anio_hasta : int, opcionales
+
+        rango de años de estreno a considerar
+
     Retorno
     -------
     JSON:
@@ -130,7 +393,7 @@ async def cantidad_filmaciones_mes( mes: Mes ):
         { "mes": "enero", "peliculas": 5909 }
     """
     mesNum = meses[mes]
-    salida = df[df['release_date'].dt.month == mesNum].release_date.count()
+    salida = contar_estrenos(estrenos, 'mes', mesNum, anio_desde, anio_hasta)
     return {"mes":mes, "peliculas": int(salida) }
 
 #Endpoint 2
@@ -144,21 +407,24 @@ class Dia(str, Enum):
     domingo = 'domingo'
 
 dias = {
-    'lunes': 'Monday',
-    'martes': 'Tuesday',
-    'miércoles': 'Wednesday',
-    'jueves': 'Thursday',
-    'viernes': 'Friday',
-    'sábado': 'Saturday',
-    'domingo': 'Sunday'
+    'lunes': 0,
+    'martes': 1,
+    'miércoles': 2,
+    'jueves': 3,
+    'viernes': 4,
+    'sábado': 5,
+    'domingo': 6
 }
 
 @app.get("/peliculas/get_day/{dia}", tags=['Peliculas'])
-async def cantidad_filmaciones_dia( dia: Dia ):
+@cacheado
+@en_pool
+def cantidad_filmaciones_dia( dia: Dia, anio_desde: Optional[int] = None, anio_hasta: Optional[int] = None ):
     """
     Cantidad de filmaciones estrenadas el dia indicado, incluyendo todos los meses.
 
-    Esta función recibe un dia en idioma español y retorna el número de peliculas estrenadas dicho día sin importar cual es el mes o año.
+    Esta función recibe un dia en idioma español y retorna el número de peliculas estrenadas dicho día sin importar cual es el mes o año,
+    o solo entre los años indicados (inclusive) si se especifican anio_desde y/o anio_hasta.
 
     Parametros
     ----------
@@ -166,6 +432,10 @@ async def cantidad_filmaciones_dia( dia: Dia ):
 
         dia en idioma español lunes, martes, miércoles, jueves, viernes, sábado, domingo
 
+    anio_desde, anio_hasta : int, opcionales
+
+        rango de años de estreno a considerar
+
     Retorno
     -------
     JSON
@@ -177,14 +447,15 @@ async def cantidad_filmaciones_dia( dia: Dia ):
     >>> cantidad_filmaciones_dia(lunes)
         { "dia": "lunes", "peliculas": 3500 }
     """
-    df['dia'] = df['release_date'].apply(lambda x: x.strftime('%A'))
-    salida = df[df['dia'] == dias[dia]].dia.count()
-    
+    salida = contar_estrenos(estrenos, 'dia', dias[dia], anio_desde, anio_hasta)
+
     return {"dia":dia, "peliculas": int(salida) }
 
 #Endpoint 3
 @app.get("/pelicula/get_popularidad/{titulo}", tags=['Pelicula'])
-async def score_titulo( titulo: str ):
+@cacheado(titulo=str.title)
+@en_pool
+def score_titulo( titulo: str ):
     """
     Score asociada a la pelicula con el titulo indicado.
 
@@ -212,11 +483,11 @@ async def score_titulo( titulo: str ):
 
     """
     titulo = titulo.title()
-    coincidencias = df[df['title'] == titulo] 
+    coincidencias = buscar(indice_titulo, titulo)
 
-    if not(coincidencias.empty):
-        salida_df = coincidencias[['title', 'release_year', 'popularity']].iloc[0]
-        salida_json =  {'titulo':titulo, 'año_lanzamiento': int( salida_df['release_year']), 'popularidad': round(salida_df['popularity'], 2) } 
+    if len(coincidencias) > 0:
+        salida_df = df.iloc[coincidencias[0]][['title', 'release_year', 'popularity']] #Me quedo con la primer aparicion
+        salida_json =  {'titulo':titulo, 'año_lanzamiento': int( salida_df['release_year']), 'popularidad': round(float(salida_df['popularity']), 2) } 
     else:
         salida_json = {'titulo': titulo, 'mensaje': 'Titulo no encontrado'}
 
@@ -224,7 +495,9 @@ async def score_titulo( titulo: str ):
 
 #Endpoint 4
 @app.get("/pelicula/get_votos/{titulo}", tags=['Pelicula'])
-async def votos_titulo( titulo: str ):
+@cacheado(titulo=str.title)
+@en_pool
+def votos_titulo( titulo: str ):
     """
     Cantiad de votos y valor promedio de las votaciones asociada a la pelicula con el titulo indicado, en caso de que tenga al menos 2000 valoraciones.
     Caso contrario, no se devuelve ningun valor.
@@ -253,12 +526,12 @@ async def votos_titulo( titulo: str ):
     """
     titulo = titulo.title()
 
-    coincidencias = df[df['title'] == titulo]
+    coincidencias = buscar(indice_titulo, titulo)
 
-    if not(coincidencias.empty):
-        salida_df = coincidencias[['title', 'release_year', 'vote_count', 'vote_average']].iloc[0] #Me quedo con la primer aparicion
+    if len(coincidencias) > 0:
+        salida_df = df.iloc[coincidencias[0]][['title', 'release_year', 'vote_count', 'vote_average']] #Me quedo con la primer aparicion
         if salida_df['vote_count'] >= 2000:
-            salida_json = {'titulo':titulo, 'año_lanzamiento': int( salida_df['release_year']), 'conteo_votos': int(salida_df['vote_count']), 'votos_promedio':round(salida_df['vote_average'], 2) } 
+            salida_json = {'titulo':titulo, 'año_lanzamiento': int( salida_df['release_year']), 'conteo_votos': int(salida_df['vote_count']), 'votos_promedio':round(float(salida_df['vote_average']), 2) } 
         else:
             salida_json = {'titulo': titulo, 'mensaje': 'No supera los 2000 votos minimos' }
     else:
@@ -266,9 +539,64 @@ async def votos_titulo( titulo: str ):
 
     return salida_json
 
+#Busqueda de titulos (y personas) mientras se escribe
+class TipoBusqueda(str, Enum):
+    titulo = "titulo"
+    actor = "actor"
+    director = "director"
+
+@app.get("/pelicula/buscar", tags=['Pelicula'])
+@cacheado
+@en_pool
+def buscar_titulo( q: str, limite: int = Query(10, ge=1, le=MAX_RESULTADOS), tipo: TipoBusqueda = TipoBusqueda.titulo ):
+    """
+    Autocompletado de titulos tolerante a errores de tipeo, para usar mientras se escribe antes de consultar los demas
+    endpoints con el titulo exacto.
+
+    Se devuelven primero los titulos con alguna palabra que empieza con el texto ingresado (sin distinguir mayusculas) y,
+    si no alcanzan el limite, los más parecidos por trigramas de caracteres. Con tipo 'actor' o 'director' se buscan
+    nombres de personas, si la API se inicio con AUTOCOMPLETAR_PERSONAS=1.
+
+    Parametros
+    ----------
+    q : str
+
+        Texto parcial ingresado.
+
+    limite : int
+
+        Cantidad maxima de resultados, por defecto 10 (máximo MAX_RESULTADOS).
+
+    tipo : str
+
+        'titulo' (por defecto), 'actor' o 'director'.
+
+    Retorno
+    -------
+    JSON
+
+        {'consulta': q, 'resultados': [{'nombre': str, 'coincidencia': 'prefijo' o 'aproximado', 'puntaje': float}, ...]}
+
+    Ejemplo
+    --------
+    >>> buscar_titulo('a bug') {caso de prefijo} \t
+    >>> {'consulta': 'a bug', 'resultados': [{'nombre': "A Bug'S Life", 'coincidencia': 'prefijo', 'puntaje': 1.0}, ...]}
+
+    >>> buscar_titulo('jumanjii') {caso de error de tipeo} \t
+    >>> {'consulta': 'jumanjii', 'resultados': [{'nombre': 'Jumanji', 'coincidencia': 'aproximado', 'puntaje': 0.83}, ...]}
+    """
+    if tipo.value not in autocompletado:
+        return {'consulta': q, 'mensaje': 'Busqueda de actores y directores desactivada, ver AUTOCOMPLETAR_PERSONAS'}
+    estructura = autocompletado[tipo.value]
+    resultados = [{'nombre': estructura['nombres'][i], 'coincidencia': coincidencia, 'puntaje': puntaje}
+                  for i, coincidencia, puntaje in autocompletar(estructura, q, limite)]
+    return {'consulta': q, 'resultados': resultados}
+
 #Endpoint 5
 @app.get("/actor/get_actor/{actor}", tags=['Actores'])
-async def get_actor( actor: str ):
+@cacheado(actor=str.title)
+@en_pool
+def get_actor( actor: str ):
     """
     Éxito del acotor indicado medido a través del retorno. Cantidad de películas que en las que ha participado y el promedio de retorno.
 
@@ -295,24 +623,28 @@ async def get_actor( actor: str ):
     >>> {'actor':'Pepe El grillo', 'mensaje': 'Actor no encontrado'}
     """ 
     actor = actor.title()
-    indices = []
-    for index, movie in df3.iterrows():
-        if actor in movie['cast']:
-            indices.append(index)
+    persona = indice_actores['ids'].get(normalizar(actor))
 
-    if len(indices) == 0:
+    if persona is None:
         salida_json = {'actor':actor, 'mensaje': 'Actor no encontrado'}
     else:
-        coincidencias = df3.iloc[indices]
-        retorno_promedio = coincidencias['return'].mean()
-        retorno_total = coincidencias['return'].sum() # Asi se pidio en las consultas el retorno total
+        #Agregados precalculados de sus peliculas (ver agregados_personas)
+        fila = agregados['actor']['tabla'].iloc[persona]
+        retorno_total = float(fila['retorno_total']) # Asi se pidio en las consultas el retorno total
         #retorno_total = coincidencias['revenue'].sum() / coincidencias['budget'].sum()
-        salida_json = {'actor':actor, 'cantidad_peliculas': len(indices), 'retorno_promedio': round(retorno_promedio, 2), 'retorno_total':round(retorno_total, 2)}
+        salida_json = {'actor':actor, 'cantidad_peliculas': int(fila['cantidad_peliculas']), 'retorno_promedio': round(float(fila['retorno_promedio']), 2), 'retorno_total':round(retorno_total, 2)}
     return salida_json 
 
+#Formato de las respuestas con listas de resultados
+class Formato(str, Enum):
+    json = "json"
+    ndjson = "ndjson"
+
 #Endpoint 6
 @app.get("/director/get_director/{director}", tags=['Directores'])
-async def get_director(director: str):
+@cacheado(director=str.title)
+@en_pool
+def get_director(director: str, cursor: Optional[str] = None, limite: Optional[int] = None, formato: Formato = Formato.json):
     """
     Éxito del director indicado medido a través del retorno. Peliculas dirigidas con fecha, costo y ganancia individual.
 
@@ -324,12 +656,25 @@ async def get_director(director: str):
 
         nombre completo del director
 
+    cursor : str
+
+        Cursor de la pagina siguiente, devuelto en 'siguiente' por la consulta anterior. Por defecto desde la primera pelicula.
+
+    limite : int
+
+        Peliculas por pagina, por defecto todas.
+
+    formato : str
+
+        'json' (por defecto) o 'ndjson': una pelicula por linea, transmitidas por partes, sin el retorno del director
+        (el cursor de la pagina siguiente se informa en el encabezado X-Cursor-Siguiente).
 
     Retorno
     ----------
     JSON
 
         { 'director':'director', 'retorno': round(retorno, 2),  'peliculas':  [{pelicula1}, {pelicula2} ....]}.
+        Con cursor o limite se agregan 'total' (peliculas del director) y 'siguiente' (cursor, None en la ultima pagina).
 
     Ejemplo
     --------
@@ -338,36 +683,156 @@ async def get_director(director: str):
         "peliculas": [ { "titulo": "Toy Story", "año_lanzamiento": "1995-10-30", "presupuesto": 30000000, "ganancia": 373554033 },
         { "titulo": "A Bug'S Life", "año_lanzamiento": "1998-11-25", "presupuesto": 120000000, "ganancia": 363258859 }, ...]
 
+    >>> get_director('John Lasseter', limite=1) {caso de exito, paginado} \t
+    >>> { "director": "John Lasseter", "retorno": 4.03, "peliculas": [ { "titulo": "Toy Story", ... } ], "total": 5, "siguiente": "MA" }
+
     >>> get_director('Pepe el grillo') {caso de inexistencia} \t
     >>> { 'director':'Pepe el grillo', 'mensaje': 'Director no encontrado'}
     """
+    if limite is not None and limite < 1:
+        raise HTTPException(status_code=400, detail='El limite debe ser mayor a 0')
     director = director.title()
-    indices = []
-    for index, movie in df3.iterrows():
-        if director in movie['director']:
-            indices.append(index)
+    indices = buscar(indice_directores, director)
 
     if len(indices) > 0:
-        peliculas = df3.iloc[indices][['title', 'release_date', 'budget', 'revenue', 'return']]
-        retorno_total = peliculas['return'].sum() # --> Así se pidió en las consultas
+        #Retorno precalculado en la tabla de agregados (ver agregados_personas)
+        retorno_total = float(agregados['director']['tabla']['retorno_total'].values[indice_directores['ids'][normalizar(director)]]) # --> Así se pidió en las consultas
         #retorno_total = peliculas['revenue'].sum() / peliculas['budget'].sum() 
-        titulos = peliculas['title'].to_list()
-        fechas_estreno = peliculas['release_date'].dt.date.to_list()
-        presupuesto = peliculas['budget'].to_list()
-        ganancia = peliculas['revenue'].to_list()
-        
+
+        #Paginacion por cursor: las posiciones de las peliculas estan ordenadas, el cursor es la ultima posicion entregada
+        posicion = leer_cursor(cursor)
+        restantes = indices if posicion is None else indices[np.searchsorted(indices, posicion, side='right'):]
+        pagina = restantes if limite is None else restantes[:limite]
+        siguiente = codificar_cursor(pagina[-1]) if len(pagina) < len(restantes) else None
+
         #SALIDA EN VERSION LISTAS
         #salida = { 'director':director, 'return': round(retorno_total, 2),  'titles': titulos, 'release_dates': fechas_estreno, 'budgets': presupuesto, 'revenues':ganancia}
-        pelis_json = [{'titulo': e1, 'año_lanzamiento': e2, 'presupuesto': e3, 'ganancia': e4} for e1, e2, e3,e4 in zip(titulos, fechas_estreno, presupuesto, ganancia)]
-        
-        salida = { 'director':director, 'retorno': round(retorno_total, 2),  'peliculas': pelis_json}
+        #Se codifican directamente las columnas, sin armar un dict por pelicula
+        peliculas = Columnas({'titulo': df['title'].values[pagina], 'año_lanzamiento': df['release_date'].values[pagina],
+                              'presupuesto': df['budget'].values[pagina], 'ganancia': df['revenue'].values[pagina]})
+        if formato == Formato.ndjson:
+            return RespuestaNDJSON(peliculas, headers={'X-Cursor-Siguiente': siguiente} if siguiente else None)
+
+        salida = { 'director':director, 'retorno': round(retorno_total, 2),  'peliculas': peliculas}
+        if cursor is not None or limite is not None:
+            salida.update({'total': len(indices), 'siguiente': siguiente})
     else:
         salida = { 'director':director, 'mensaje': 'Director no encotrado'}
-    return salida
+    return RespuestaJSON(salida)
+
+#Rankings de actores y directores
+#Maxima cantidad de personas por pagina
+MAX_RANKING = 100
+
+class MetricaRanking(str, Enum):
+    cantidad_peliculas = "cantidad_peliculas"
+    retorno_total = "retorno_total"
+    retorno_promedio = "retorno_promedio"
+    presupuesto_total = "presupuesto_total"
+    ganancia_total = "ganancia_total"
+
+def ranking(tipo, metrica, desde, limite, min_peliculas, cursor, formato):
+    # Pagina del ranking: corte del orden precalculado de la metrica, filtrado por cantidad minima de peliculas. El cursor
+    # (posicion de inicio de la pagina siguiente) reemplaza a desde; en formato ndjson sin limite se transmite completo
+    if formato == Formato.json:
+        limite = 10 if limite is None else limite
+        if limite > MAX_RANKING:
+            raise HTTPException(status_code=422, detail=f'Se admiten hasta {MAX_RANKING} personas por pagina, para mas emplee formato=ndjson')
+    posicion = leer_cursor(cursor)
+    desde = desde if posicion is None else posicion
+    tabla = agregados[tipo]['tabla']
+    orden = agregados[tipo]['ordenes'][metrica.value]
+    if min_peliculas > 1:
+        orden = orden[tabla['cantidad_peliculas'].values[orden] >= min_peliculas]
+    ids = orden[desde:] if limite is None else orden[desde:desde + limite]
+    siguiente = codificar_cursor(desde + len(ids)) if desde + len(ids) < len(orden) else None
+    #Se codifican directamente las columnas de la tabla de agregados, sin armar un dict por persona
+    resultados = Columnas({'posicion': np.arange(desde + 1, desde + len(ids) + 1), 'nombre': tabla['nombre'].values[ids],
+                           'cantidad_peliculas': tabla['cantidad_peliculas'].values[ids],
+                           **{columna: np.round(tabla[columna].values[ids], 2) for columna in METRICAS_PERSONAS[1:]}})
+    if formato == Formato.ndjson:
+        return RespuestaNDJSON(resultados, headers={'X-Cursor-Siguiente': siguiente} if siguiente else None)
+    return RespuestaJSON({'metrica': metrica.value, 'desde': desde, 'limite': limite, 'total': len(orden), 'siguiente': siguiente, 'resultados': resultados})
+
+@app.get("/actor/ranking", tags=['Actores'])
+@cacheado
+@en_pool
+def ranking_actores( metrica: MetricaRanking = MetricaRanking.retorno_total, desde: int = Query(0, ge=0),
+                     limite: Optional[int] = Query(None, ge=1), min_peliculas: int = Query(1, ge=1),
+                     cursor: Optional[str] = None, formato: Formato = Formato.json ):
+    """
+    Ranking de actores por la metrica indicada, de mayor a menor, paginado.
+
+    Parametros
+    ----------
+    metrica : str
+
+        'cantidad_peliculas', 'retorno_total' (por defecto), 'retorno_promedio', 'presupuesto_total' o 'ganancia_total'.
+
+    desde : int
+
+        Cantidad de actores a saltear (inicio de la pagina), por defecto 0.
+
+    limite : int
+
+        Actores por pagina, por defecto 10 (máximo MAX_RANKING). En formato ndjson, por defecto todos.
+
+    min_peliculas : int
+
+        Solo actores con al menos esta cantidad de peliculas, por defecto 1 (util para el retorno promedio).
+
+    cursor : str
+
+        Cursor de la pagina siguiente, devuelto en 'siguiente' por la consulta anterior. Si se indica, reemplaza a desde.
+
+    formato : str
+
+        'json' (por defecto) o 'ndjson': un actor por linea, transmitidos por partes (el cursor de la pagina siguiente
+        se informa en el encabezado X-Cursor-Siguiente).
+
+    Retorno
+    -------
+    JSON
+
+        {'metrica': metrica, 'desde': desde, 'limite': limite, 'total': actores que cumplen min_peliculas, 'siguiente': cursor o None,
+        'resultados': [{'posicion': 1, 'nombre': 'Actor', 'cantidad_peliculas': 71, 'retorno_total': 3.96, 'retorno_promedio': 2.52,
+        'presupuesto_total': ..., 'ganancia_total': ...}, ...]}
+
+    Ejemplo
+    --------
+    >>> ranking_actores('cantidad_peliculas', desde=0, limite=2) \t
+    >>> {'metrica': 'cantidad_peliculas', 'desde': 0, 'limite': 2, 'total': 1500, 'siguiente': 'Mg', 'resultados': [{'posicion': 1, 'nombre': 'Actor1', ...}, ...]}
+    """
+    return ranking('actor', metrica, desde, limite, min_peliculas, cursor, formato)
+
+@app.get("/director/ranking", tags=['Directores'])
+@cacheado
+@en_pool
+def ranking_directores( metrica: MetricaRanking = MetricaRanking.retorno_total, desde: int = Query(0, ge=0),
+                        limite: Optional[int] = Query(None, ge=1), min_peliculas: int = Query(1, ge=1),
+                        cursor: Optional[str] = None, formato: Formato = Formato.json ):
+    """
+    Ranking de directores por la metrica indicada, de mayor a menor, paginado. Mismos parametros y retorno que
+    ranking_actores.
+    """
+    return ranking('director', metrica, desde, limite, min_peliculas, cursor, formato)
 
 #Sistema de recomendacion
+class ModoRecomendacion(str, Enum):
+    texto = "texto"
+    hibrido = "hibrido"
+
+def recomendar(indices, top_n, modo):
+    # Titulos y puntajes recomendados para las posiciones indicadas: vecinos de texto, o esos mismos vecinos como
+    # candidatos reordenados con metadata y popularidad (modo hibrido)
+    if modo == ModoRecomendacion.hibrido:
+        return recomendaciones_hibridas_lote(indices, similitudes, df, hibrido, top_n, pesos = PESOS_RECOMENDACION)
+    return obtener_recomendaciones_lote(indices, similitudes, df, top_n)
+
 @app.get("/recomendacion/get_recomendacion/{titulo}", tags=['Sistema de Recomendacion'])
-async def get_recomendacion(titulo: str):
+@cacheado(titulo=str.title)
+@en_pool
+def get_recomendacion(titulo: str, modo: ModoRecomendacion = ModoRecomendacion.texto):
     """ 
     Recomendación de las 5 peliculas más similares al titulo ingresado.
     Se recibe el titulo de una pelicula en idioma ingles y se devuelve una lista ded nombres de las 5 peliculas más similares recomendada por el sistema.
@@ -378,6 +843,12 @@ async def get_recomendacion(titulo: str):
 
         Titulo en ingles de la pelicula.
 
+    modo : str
+
+        'texto' (por defecto): peliculas más similares por titulo, generos y sinopsis (TF-IDF).
+        'hibrido': los vecinos de texto se reordenan con la similitud de generos, año y popularidad (features de knn)
+        y un prior de popularidad y votos, con los pesos PESO_TEXTO, PESO_METADATA y PESO_POPULARIDAD.
+
     Retorno
     -------
     JSON
@@ -389,19 +860,145 @@ async def get_recomendacion(titulo: str):
     >>> get_recomendacion('Jumanji') {caso de exito} \t
     >>> {"titulo":"Jumanji","titulos_recomendados":["Existenz","Dungeons & Dragons","Any Given Sunday","Manhunter","A Monkey'S Tale"]}
 
+    >>> get_recomendacion('Jumanji', modo='hibrido') {caso de exito, modo hibrido} \t
+    >>> {"titulo":"Jumanji","titulos_recomendados":["pelicula1","pelicula2","pelicula3","pelicula4","pelicula5"]}
+
     >>> get_director('Pepe el grillo') {caso de inexistencia} \t
     >>> {'title': 'Pepe El Grillo',  'mensaje': 'Titulo no encontrado'}
     
     """
     
+    requiere_recomendador()
     titulo = titulo.title()
-    coincidencias = entrada_ml[entrada_ml['title'] == titulo]
-    if coincidencias.empty:
+    coincidencias = buscar(indice_titulo, titulo)
+    if len(coincidencias) == 0:
         salida = {'title': titulo,  'mensaje': 'Titulo no encontrado'}
     else:
-        indice = coincidencias.index[0]
+        indice = coincidencias[0]
 
-        recomendadas = obtener_recomendaciones(df = entrada_ml, matriz_sim = similitudes, indice_pelicula = indice,top_n = 5).tolist()
+        recomendadas = recomendar([indice], 5, modo)[0][0].tolist()
 
         salida = {'titulo': titulo, 'titulos_recomendados': recomendadas}
-    return salida
\ No newline at end of file
+    return salida
+
+#Sistema de recomendacion a partir de una descripcion libre
+@app.get("/recomendacion/get_recomendacion_descripcion", tags=['Sistema de Recomendacion'])
+@cacheado
+@en_pool
+def get_recomendacion_descripcion(descripcion: str, top_n: int = Query(5, ge=1, le=K_VECINOS)):
+    """
+    Recomendación de las peliculas más similares a una descripción libre, sin necesidad de un titulo existente.
+    El texto se compara contra el titulo, los generos y la sinopsis de todas las peliculas con el mismo modelo TF-IDF del
+    sistema de recomendación, recorriendo solo las peliculas que contienen alguna de sus palabras.
+
+    Parametros
+    ----------
+    descripcion : str
+
+        Texto libre en idioma ingles.
+
+    top_n : int
+
+        Cantidad de recomendaciones, por defecto 5 (máximo K_VECINOS).
+
+    Retorno
+    -------
+    JSON
+
+        { 'descripcion': descripcion, 'titulos_recomendados': [...], 'puntajes': [...] }
+
+    Ejemplo
+    --------
+    >>> get_recomendacion_descripcion('toys that come to life', top_n=2) {caso de exito} \t
+    >>> {"descripcion": "toys that come to life", "titulos_recomendados": ["Toy Story", "Toy Story 2"], "puntajes": [0.31, 0.27]}
+
+    >>> get_recomendacion_descripcion('the and of') {caso sin terminos del vocabulario} \t
+    >>> {"descripcion": "the and of", "mensaje": "Ninguna palabra de la descripcion forma parte del vocabulario del modelo"}
+    """
+    requiere_recomendador()
+    posiciones, puntajes = buscar_descripcion(modelo, descripcion, top_n)
+    if len(posiciones) == 0:
+        return {'descripcion': descripcion, 'mensaje': 'Ninguna palabra de la descripcion forma parte del vocabulario del modelo'}
+    return {'descripcion': descripcion, 'titulos_recomendados': df['title'].to_numpy(dtype=object)[posiciones].tolist(),
+            'puntajes': np.round(puntajes.astype(float), 4).tolist()}
+
+#Sistema de recomendacion por lotes
+#Maxima cantidad de titulos por consulta
+MAX_TITULOS_LOTE = 1000
+
+class ConsultaLote(BaseModel):
+    titulos: List[str]
+    top_n: int = Field(5, ge=1, le=K_VECINOS)
+    modo: ModoRecomendacion = ModoRecomendacion.texto
+
+@app.post("/recomendacion/get_recomendaciones", tags=['Sistema de Recomendacion'])
+@en_pool
+def get_recomendaciones_lote(consulta: ConsultaLote, formato: Formato = Formato.json):
+    """
+    Recomendación de las top_n peliculas más similares para cada uno de los titulos ingresados, en una sola consulta.
+    Todos los titulos se resuelven juntos y las recomendaciones se calculan en una única pasada vectorizada sobre el indice de vecinos.
+
+    Parametros
+    ----------
+    titulos : list
+
+        Titulos en ingles de las peliculas, hasta MAX_TITULOS_LOTE por consulta.
+
+    top_n : int
+
+        Cantidad de recomendaciones por titulo, por defecto 5 (máximo K_VECINOS).
+
+    modo : str
+
+        'texto' (por defecto) o 'hibrido', ver get_recomendacion. En modo hibrido los puntajes son los del reordenamiento.
+
+    formato : str
+
+        Parametro de la URL: 'json' (por defecto) o 'ndjson', un resultado por linea transmitidos por partes a medida
+        que se codifican.
+
+    Retorno
+    -------
+    JSON
+
+        { 'resultados': [ {'titulo': 'titulo1', 'titulos_recomendados': [...], 'puntajes': [...]}, {'titulo': 'titulo2', 'mensaje': 'Titulo no encontrado'}, ... ] }
+        Un resultado por titulo ingresado, en el mismo orden.
+
+    Errores
+    -------
+    HTTPException 422 si se ingresan mas de MAX_TITULOS_LOTE titulos.
+
+    Ejemplo
+    --------
+    >>> get_recomendaciones_lote({"titulos": ["Jumanji", "Pepe el grillo"], "top_n": 2}) \t
+    >>> {"resultados": [{"titulo": "Jumanji", "titulos_recomendados": ["Existenz", "Dungeons & Dragons"], "puntajes": [0.31, 0.27]},
+        {"titulo": "Pepe El Grillo", "mensaje": "Titulo no encontrado"}]}
+    """
+    if len(consulta.titulos) > MAX_TITULOS_LOTE:
+        raise HTTPException(status_code=422, detail=f'Se admiten hasta {MAX_TITULOS_LOTE} titulos por consulta')
+    requiere_recomendador()
+
+    titulos = [titulo.title() for titulo in consulta.titulos]
+    indices = [buscar(indice_titulo, titulo) for titulo in titulos]
+    encontrados = [i for i, coincidencias in enumerate(indices) if len(coincidencias) > 0]
+
+    recomendadas, puntajes = recomendar([indices[i][0] for i in encontrados], consulta.top_n, consulta.modo)
+
+    resultados = [{'titulo': titulo, 'mensaje': 'Titulo no encontrado'} for titulo in titulos]
+    for fila, i in enumerate(encontrados):
+        resultados[i] = {'titulo': titulos[i], 'titulos_recomendados': recomendadas[fila].tolist(), 'puntajes': np.round(puntajes[fila].astype(float), 4).tolist()}
+    if formato == Formato.ndjson:
+        return RespuestaNDJSON(resultados)
+    return RespuestaJSON({'resultados': resultados})
+
+
+#REGISTRO DE FUNCIONES DE LA PORTADA
+#Etiqueta --> (endpoint, tipo del parametro)
+dicFunc: Dict[str, Tuple[Callable[..., Awaitable[dict]], type]] = {
+    "PELICULAS POR MES": (cantidad_filmaciones_mes, Mes),
+    "PELICULAS POR DIA": (cantidad_filmaciones_dia, Dia),
+    "POPULARIDAD DEL TITULO": (score_titulo, str),
+    "VOTOS DEL TITULO": (votos_titulo, str),
+    "INFORMACION DE ACTOR": (get_actor, str),
+    "INFORMACION DE DIRECTOR": (get_director, str),
+    "SISTEMA DE RECOMENDACION": (get_recomendacion, str)}
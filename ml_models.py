@@ -1,11 +1,16 @@
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import os
+import json
+import time
+from datetime import datetime
+from scipy import sparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import re
+from instrumentacion import tramo
 
-from sklearn.preprocessing import MultiLabelBinarizer, StandardScaler
-from sklearn.neighbors import NearestNeighbors
+#sklearn se importa dentro de las funciones que lo usan (ajuste y carga de modelos): importar este modulo, por ejemplo
+#al iniciar la API, no demora la disponibilidad de los endpoints que no usan el modelo
 
 def matriz_similitud(df):
     """
@@ -34,20 +39,292 @@ def matriz_similitud(df):
 
     """
 
-    #Se genera la columa con el texto de entrada
-    df['texto_combinado'] = df['genres'].apply(lambda x: ' '.join(x)) + ' ' + df['title']   + ' ' + df['overview']
-    #Elimino los signos de puntuacion
-    df['texto_combinado'] = df['texto_combinado'].apply( lambda x: re.sub(r'[^\w\s]', '', x) if pd.notnull(x) else '' )
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    #Se genera el texto de entrada sin signos de puntuacion, sin modificar el DataFrame ingresado
+    textos = texto_combinado(df)
 
     # Crear una matriz TF-IDF a partir de los datos empleando las stop words en idioma ingles
     tfidf_vectorizer = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = tfidf_vectorizer.fit_transform(df['texto_combinado'])
+    tfidf_matrix = tfidf_vectorizer.fit_transform(textos)
 
     #Se genera la matriz de similitud del coseno a partir de la matriz anterior
     cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
 
     return cosine_sim
 
+#Signos de puntuacion, se eliminan del texto de entrada del modelo. El caracter nulo separa los textos de las
+#distintas peliculas para limpiar todo el corpus en una unica pasada de la expresion regular
+_PUNTUACION = re.compile(r'[^\w\s\x00]')
+
+def texto_combinado(df):
+    """
+    Texto de entrada del modelo TF-IDF para cada pelicula: generos, titulo y overview sin signos de puntuacion.
+    No modifica el DataFrame ingresado. Los campos nulos se omiten sin descartar el resto del texto de la pelicula.
+
+    Parametros
+    ----------
+    df : pd.DataFrame()
+
+        DataFrame con las columnas ['title', 'genres', 'overview']. genres puede ser una lista de str por fila o su
+        representacion en texto (como en los CSV del ETL).
+
+    Retorno
+    -------
+    pd.Series
+
+        Serie de str con el texto combinado de cada pelicula, alineada al indice de df.
+
+    Ejemplo
+    --------
+    >>> texto_combinado(pd.DataFrame({'title': ['Toy Story'], 'genres': [['Animation', 'Comedy']], 'overview': [None]})) \t
+    >>> 0    Animation Comedy Toy Story
+    """
+    generos = df['genres']
+    es_texto = np.fromiter((isinstance(x, str) for x in generos), dtype=bool, count=len(generos))
+    generos = generos.where(es_texto, generos.mask(es_texto).str.join(' ')) if len(generos) > 0 else generos
+    texto = generos.fillna('') + ' ' + df['title'].fillna('') + ' ' + df['overview'].fillna('')
+    limpio = _PUNTUACION.sub('', '\x00'.join(texto.str.replace('\x00', '', regex=False).tolist())).split('\x00')
+    return pd.Series(limpio if len(texto) > 0 else [], index=df.index, dtype=object)
+
+def indice_vecinos(df, k = 50, tamano_bloque = 256, procesos = 1, progreso = None):
+    """
+    Generacion del indice de los k vecinos más similares (similitud del coseno) de cada pelicula del DataFrame ingresado.
+    A diferencia de matriz_similitud no se genera la matriz densa N x N: la similitud se calcula por bloques de filas
+    sobre la matriz TF-IDF y de cada bloque solo se conservan los k mayores puntajes de cada fila, por lo que la memoria
+    crece linealmente con la cantidad de peliculas (N * k).
+
+    Parametros
+    ----------
+    df : pd.DataFrame()
+
+        DataFrame con la informacion empleada para la generacion del indice, misma estructura que en matriz_similitud.
+        df[['titles', 'genres', 'overview']] --> titles --> str overview --> str genres --> ['genero1', 'genero2',... ]
+
+    k : int
+
+        Cantidad de vecinos a conservar por pelicula, por defecto 50. Es el maximo top_n que se puede pedir luego.
+
+    tamano_bloque : int
+
+        Cantidad de filas procesadas por bloque, acota la memoria temporal a tamano_bloque x N valores float32.
+
+    procesos, progreso :
+
+        Calculo de los bloques en paralelo e informe de avance, ver vecinos_tfidf.
+
+    Retorno
+    -------
+    scipy.sparse.csr_matrix
+
+        Matriz N x N con k valores por fila: los puntajes de similitud de los vecinos de cada pelicula, ordenados de
+        mayor a menor dentro de cada fila. La propia pelicula queda excluida de sus vecinos.
+
+    Ejemplo
+    --------
+    >>> vecinos = indice_vecinos(movies, k = 50) \t
+    >>> obtener_recomendaciones(indice, vecinos, movies, top_n = 5)
+    """
+    _, tfidf_matrix = matriz_tfidf(df)
+    return vecinos_tfidf(tfidf_matrix, k, tamano_bloque, procesos, progreso)
+
+def matriz_tfidf(df, textos = None):
+    """
+    Ajuste del vectorizador TF-IDF (stop words en idioma ingles) sobre el texto combinado de cada pelicula.
+
+    Parametros
+    ----------
+    df : pd.DataFrame()
+
+        DataFrame con las columnas ['title', 'genres', 'overview'], ver texto_combinado.
+
+    textos : pd.Series o numpy.ndarray
+
+        Textos combinados ya calculados (por ejemplo los guardados con el modelo), si no se indican se calculan a partir de df.
+
+    Retorno
+    -------
+    tuple(TfidfVectorizer, scipy.sparse.csr_matrix)
+
+        Vectorizador ajustado y matriz TF-IDF (float32) con una fila por pelicula, normalizada con norma l2.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    if textos is None:
+        with tramo('texto_combinado'):
+            textos = texto_combinado(df)
+    with tramo('ajuste_tfidf'):
+        tfidf_vectorizer = TfidfVectorizer(stop_words='english')
+        tfidf_matrix = tfidf_vectorizer.fit_transform(textos).astype(np.float32)
+    return tfidf_vectorizer, tfidf_matrix
+
+def indice_terminos(tfidf_matrix):
+    """
+    Indice invertido termino --> peliculas de la matriz TF-IDF: la misma matriz transpuesta en formato CSR, la fila de
+    cada termino contiene las peliculas en las que aparece (ordenadas) y su peso TF-IDF.
+
+    Parametros
+    ----------
+    tfidf_matrix : scipy.sparse.csr_matrix
+
+        Matriz TF-IDF (peliculas x terminos), ver matriz_tfidf.
+
+    Retorno
+    -------
+    scipy.sparse.csr_matrix
+
+        Matriz (terminos x peliculas), las peliculas del termino t son indices[indptr[t]:indptr[t+1]].
+    """
+    return sparse.csr_matrix(tfidf_matrix.tocsc().T)
+
+def buscar_descripcion(modelo, texto, top_n = 5):
+    """
+    Peliculas más similares (similitud del coseno TF-IDF) a un texto libre, por ejemplo una descripcion de lo que se
+    quiere ver. El texto se vectoriza con el vocabulario y el idf del modelo y los puntajes se acumulan recorriendo solo
+    las listas del indice de terminos de sus palabras: el costo es proporcional a las apariciones de esos terminos, no
+    al tamaño del catalogo.
+
+    Parametros
+    ----------
+    modelo : dict
+
+        Modelo generado con construir_modelo o cargar_modelo.
+
+    texto : str
+
+        Texto libre en idioma ingles.
+
+    top_n : int
+
+        Numero de peliculas a obtener, por defecto 5.
+
+    Retorno
+    -------
+    tuple(numpy.ndarray, numpy.ndarray)
+
+        Posiciones de las peliculas y sus puntajes, de mayor a menor puntaje (empates por posicion). Vacios si ningun
+        termino del texto forma parte del vocabulario.
+
+    Ejemplo
+    --------
+    >>> buscar_descripcion(modelo, 'toys that come to life when nobody is watching', top_n = 2) \t
+    >>> (array([0, 2997]), array([0.31, 0.22]))
+    """
+    #Vector TF-IDF de la consulta (conteos x idf, norma l2), igual a vectorizador.transform sin armar una matriz dispersa
+    vectorizador = modelo['vectorizador']
+    palabras = vectorizador.build_analyzer()(_PUNTUACION.sub('', str(texto).replace('\x00', '')))
+    ids, cuentas = np.unique(np.array([vectorizador.vocabulary_[p] for p in palabras if p in vectorizador.vocabulary_], dtype=np.int64), return_counts=True)
+    pesos = cuentas * np.asarray(vectorizador.idf_)[ids]
+    pesos = pesos / np.sqrt((pesos ** 2).sum()) if len(ids) > 0 else pesos
+
+    terminos = modelo['terminos']
+    inicios = terminos.indptr[ids]
+    largos = terminos.indptr[ids + 1] - inicios
+    if largos.sum() == 0 or top_n <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+    #Apariciones de los terminos de la consulta, contiguas en el indice por termino
+    posiciones = np.arange(largos.sum()) + np.repeat(inicios - (np.cumsum(largos) - largos), largos)
+    aportes = terminos.data[posiciones] * np.repeat(pesos.astype(np.float32), largos)
+    peliculas, inversa = np.unique(terminos.indices[posiciones], return_inverse=True)
+    puntajes = np.bincount(inversa, weights=aportes).astype(np.float32)
+    top, top_puntajes = _top_k(puntajes[None, :], min(top_n, len(peliculas)), peliculas[None, :])
+    return top[0].astype(np.int64), top_puntajes[0]
+
+def vecinos_tfidf(tfidf_matrix, k = 50, tamano_bloque = 256, procesos = 1, progreso = None):
+    """
+    Indice de los k vecinos más similares de cada fila de una matriz TF-IDF, calculado por bloques de filas.
+    Ver indice_vecinos para el detalle del resultado.
+
+    Parametros
+    ----------
+    tfidf_matrix : scipy.sparse.csr_matrix
+
+        Matriz TF-IDF con filas normalizadas (norma l2), el producto escalar es la similitud del coseno.
+
+    k : int
+
+        Cantidad de vecinos a conservar por fila.
+
+    tamano_bloque : int
+
+        Cantidad de filas procesadas por bloque.
+
+    procesos : int
+
+        Cantidad de procesos que calculan bloques en paralelo, por defecto 1 (en el proceso actual). Cada proceso
+        recibe una copia de la matriz TF-IDF al iniciar y devuelve solo los k vecinos de las filas de cada bloque.
+
+    progreso : callable
+
+        Funcion progreso(filas_procesadas, filas_totales), llamada al completar cada bloque.
+
+    Retorno
+    -------
+    scipy.sparse.csr_matrix
+    """
+    n = tfidf_matrix.shape[0]
+    k = max(min(k, n - 1), 0)
+    if k == 0:
+        return sparse.csr_matrix((n, n), dtype=np.float32)
+    indices = np.empty((n, k), dtype=np.int32)
+    puntajes = np.empty((n, k), dtype=np.float32)
+    bloques = [(inicio, min(inicio + tamano_bloque, n)) for inicio in range(0, n, tamano_bloque)]
+    procesadas = 0
+    with tramo('similitudes'):
+        if procesos <= 1:
+            tfidf_t = tfidf_matrix.T.tocsc()
+            resultados = (_vecinos_bloque(tfidf_matrix, tfidf_t, inicio, fin, k) for inicio, fin in bloques)
+            for (inicio, fin), resultado in zip(bloques, resultados):
+                indices[inicio:fin], puntajes[inicio:fin] = resultado
+                procesadas += fin - inicio
+                if progreso is not None:
+                    progreso(procesadas, n)
+        else:
+            with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso_vecinos, initargs=(tfidf_matrix, k)) as pool:
+                futuros = {pool.submit(_vecinos_bloque_proceso, inicio, fin): (inicio, fin) for inicio, fin in bloques}
+                for futuro in as_completed(futuros):
+                    inicio, fin = futuros[futuro]
+                    indices[inicio:fin], puntajes[inicio:fin] = futuro.result()
+                    procesadas += fin - inicio
+                    if progreso is not None:
+                        progreso(procesadas, n)
+
+    return _matriz_vecinos(indices, puntajes)
+
+def _vecinos_bloque(tfidf_matrix, tfidf_t, inicio, fin, k):
+    # Similitudes de las filas inicio:fin contra todo el corpus, solo se devuelven los k mayores de cada fila
+    bloque = (tfidf_matrix[inicio:fin] @ tfidf_t).toarray()
+    #Se excluye a la propia pelicula por su indice, no por su posicion en el orden
+    bloque[np.arange(fin - inicio), np.arange(inicio, fin)] = -1
+    return _top_k(bloque, k)
+
+#Matriz TF-IDF de cada proceso del pool de vecinos_tfidf, se recibe una unica vez al iniciar el proceso
+_proceso_vecinos = {}
+
+def _iniciar_proceso_vecinos(tfidf_matrix, k):
+    _proceso_vecinos.update({'tfidf': tfidf_matrix, 'tfidf_t': tfidf_matrix.T.tocsc(), 'k': k})
+
+def _vecinos_bloque_proceso(inicio, fin):
+    return _vecinos_bloque(_proceso_vecinos['tfidf'], _proceso_vecinos['tfidf_t'], inicio, fin, _proceso_vecinos['k'])
+
+def _top_k(puntajes, k, columnas = None):
+    # Seleccion parcial de los k mayores de cada fila y luego orden solo de esos k (empates por indice ascendente).
+    # columnas indica el indice de pelicula de cada columna, por defecto la posicion de la columna.
+    top = np.argpartition(-puntajes, k - 1, axis=1)[:, :k]
+    ids = top if columnas is None else np.take_along_axis(columnas, top, axis=1)
+    orden = np.argsort(ids, axis=1)
+    ids, top = np.take_along_axis(ids, orden, axis=1), np.take_along_axis(top, orden, axis=1)
+    top_scores = np.take_along_axis(puntajes, top, axis=1)
+    orden = np.argsort(-top_scores, axis=1, kind='stable')
+    return np.take_along_axis(ids, orden, axis=1), np.take_along_axis(top_scores, orden, axis=1)
+
+def _matriz_vecinos(indices, puntajes):
+    # Indice de vecinos en formato CSR a partir de las matrices (N x k) de vecinos y puntajes
+    n, k = indices.shape
+    indptr = np.arange(0, n * k + 1, k, dtype=np.int32 if n * k < np.iinfo(np.int32).max else np.int64) if k > 0 else np.zeros(n + 1, dtype=np.int32)
+    return sparse.csr_matrix((puntajes.astype(np.float32).ravel(), indices.astype(indptr.dtype).ravel(), indptr), shape=(n, n))
+
 def obtener_recomendaciones(indice_pelicula, matriz_sim, df, top_n=5):
     """
     Peliculas recomendadas en función de la de entrada, se ingresa el indice asociado al DataFrame de entrada, mismo con el que se genero la matriz_similitud
@@ -58,9 +335,10 @@ def obtener_recomendaciones(indice_pelicula, matriz_sim, df, top_n=5):
 
         Indice de la pelicula a buscar recomendaciones
 
-    matriz_sim: numpy.ndarray 
+    matriz_sim: numpy.ndarray o scipy.sparse.csr_matrix
 
-        Matriz de similitud del coseno asociada al df, calculada previamente
+        Matriz de similitud del coseno asociada al df, calculada previamente con matriz_similitud,
+        o indice de vecinos generado con indice_vecinos (en ese caso top_n no puede superar su k)
 
     df : pd.DataFrame()
 
@@ -83,17 +361,403 @@ def obtener_recomendaciones(indice_pelicula, matriz_sim, df, top_n=5):
 
     """
 
-    #Dada la correspondencia de los indices del df con la matriz me quedo con los puntajes de similitud en torno a esa pelicula
-    sim_scores = list(enumerate(matriz_sim[indice_pelicula]))
-    #Ordeno de mayor a menor los scores
-    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-    #Selecciono lo más similares en funcion de top_n, evadiendo el primero que corresponde a la misma pelicula
-    top_indices = [i[0] for i in sim_scores[1:top_n+1]]
+    titulos, _ = obtener_recomendaciones_lote([indice_pelicula], matriz_sim, df, top_n)
+    return titulos[0]
+
+def obtener_recomendaciones_lote(indices_peliculas, matriz_sim, df, top_n=5, tamano_bloque=256):
+    """
+    Peliculas recomendadas y sus puntajes de similitud para un conjunto de peliculas de entrada en una sola llamada.
+    La seleccion de los top_n es vectorizada (seleccion parcial con argpartition sobre las filas de la matriz) y la
+    pelicula consultada se excluye por su indice, no por ocupar el primer lugar del orden.
+
+    Parametros
+    ----------
+    indices_peliculas: list o numpy.ndarray
+
+        Indices (posiciones) de las peliculas a buscar recomendaciones
+
+    matriz_sim: numpy.ndarray o scipy.sparse.csr_matrix
+
+        Matriz de similitud del coseno (matriz_similitud) o indice de vecinos (indice_vecinos) asociado al df
+
+    df : pd.DataFrame()
+
+        DataFrame empleado para la generacion de la matriz de similitud o del indice de vecinos.
+
+    top_n : int
+
+        Numero de recomendaciones a obtener por pelicula, por defecto 5.
+
+    tamano_bloque : int
+
+        Cantidad de filas densas procesadas a la vez, acota la memoria temporal cuando matriz_sim es densa.
+
+    Retorno
+    -------
+    tuple(list, list)
+
+        Titulos y puntajes de cada pelicula consultada (un numpy.ndarray por pelicula), ordenados de mayor a menor
+        similitud. Cada pelicula tiene top_n recomendaciones, o menos si su fila del indice de vecinos tiene menos
+        vecinos guardados (por ejemplo tras agregar_peliculas).
+
+    Ejemplo
+    --------
+    >>> obtener_recomendaciones_lote([0, 1], vecinos, movies, top_n=2) \t
+    >>> ([array(['titulo1', 'titulo2']), array(['titulo3', 'titulo4'])], [array([0.41, 0.33]), array([0.52, 0.30])])
+
+    """
+    top_indices, puntajes, largos = _vecinos_lote(indices_peliculas, matriz_sim, top_n, tamano_bloque)
 
     #Me quedo con los titulos y la similitud
-    top_movies = df['title'].iloc[top_indices].values
-    # scores = sim_scores[1:top_n+1]
-    return top_movies #, top_indices, scores
+    titulos = df['title'].to_numpy(dtype=object)[top_indices]
+    return _por_fila(titulos, largos), _por_fila(puntajes, largos)
+
+def _por_fila(matriz, largos):
+    # Filas de la matriz recortadas a su largo valido
+    return [fila[:largo] for fila, largo in zip(matriz, largos.tolist())]
+
+def _vecinos_lote(indices_peliculas, matriz_sim, top_n, tamano_bloque = 256):
+    # Posiciones y puntajes de los top_n vecinos de cada pelicula consultada, ordenados de mayor a menor similitud, y
+    # cantidad valida de cada fila: con el indice de vecinos cada pelicula tiene a lo sumo los vecinos guardados en su
+    # fila, las posiciones restantes se completan con la propia pelicula y puntaje -inf
+    indices_peliculas = np.asarray(indices_peliculas, dtype=np.int64).ravel()
+    n = matriz_sim.shape[0]
+
+    if sparse.issparse(matriz_sim):
+        #Los vecinos de cada fila ya estan ordenados de mayor a menor y sin la propia pelicula
+        inicios = matriz_sim.indptr[indices_peliculas]
+        largos = np.minimum(matriz_sim.indptr[indices_peliculas + 1] - inicios, top_n)
+        top_n = int(largos.max()) if len(indices_peliculas) > 0 else 0
+        validos = np.arange(top_n) < largos[:, None]
+        posiciones = np.where(validos, inicios[:, None] + np.arange(top_n), 0)
+        top_indices = np.where(validos, matriz_sim.indices[posiciones], indices_peliculas[:, None])
+        puntajes = np.where(validos, matriz_sim.data[posiciones], -np.inf)
+    else:
+        top_n = max(min(top_n, n - 1), 0)
+        largos = np.full(len(indices_peliculas), top_n)
+        top_indices = np.empty((len(indices_peliculas), top_n), dtype=np.int64)
+        puntajes = np.empty((len(indices_peliculas), top_n), dtype=np.float64)
+        for inicio in range(0, len(indices_peliculas), tamano_bloque):
+            lote = indices_peliculas[inicio:inicio + tamano_bloque]
+            filas = np.arange(len(lote))
+            #Copia de las filas consultadas, excluyendo a la propia pelicula por su indice
+            bloque = np.array(matriz_sim[lote], dtype=np.float64)
+            bloque[filas, lote] = -np.inf
+            if top_n == 0:
+                continue
+            #Seleccion parcial de los top_n mayores y luego orden solo de esos top_n
+            top = np.argpartition(-bloque, top_n - 1, axis=1)[:, :top_n]
+            top.sort(axis=1)
+            top_scores = bloque[filas[:, None], top]
+            orden = np.argsort(-top_scores, axis=1, kind='stable')
+            top_indices[inicio:inicio + len(lote)] = np.take_along_axis(top, orden, axis=1)
+            puntajes[inicio:inicio + len(lote)] = np.take_along_axis(top_scores, orden, axis=1)
+    return top_indices, puntajes, largos
+
+#PERSISTENCIA DEL MODELO
+#Version del formato en disco, se incrementa ante cualquier cambio incompatible en los archivos guardados
+VERSION_MODELO = 1
+
+def construir_modelo(df, k = 50, tamano_bloque = 256, procesos = 1, progreso = None, textos = None):
+    """
+    Ajuste completo del sistema de recomendacion: vectorizador TF-IDF, matriz TF-IDF, indice de terminos, indice de
+    vecinos, titulos y textos combinados (corpus normalizado, se reutiliza en actualizaciones y reajustes posteriores).
+
+    Parametros
+    ----------
+    df : pd.DataFrame()
+
+        DataFrame con las columnas ['title', 'genres', 'overview'], ver indice_vecinos.
+
+    k, tamano_bloque, procesos, progreso :
+
+        Ver indice_vecinos.
+
+    textos :
+
+        Ver matriz_tfidf.
+
+    Retorno
+    -------
+    dict
+
+        {'vectorizador': TfidfVectorizer, 'tfidf': csr_matrix, 'terminos': csr_matrix, 'vecinos': csr_matrix,
+        'titulos': numpy.ndarray, 'textos': numpy.ndarray, 'metadata': dict}
+    """
+    if textos is None:
+        with tramo('texto_combinado'):
+            textos = texto_combinado(df)
+    textos = np.asarray(textos, dtype=object)
+    vectorizador, tfidf_matrix = matriz_tfidf(df, textos)
+    vecinos = vecinos_tfidf(tfidf_matrix, k, tamano_bloque, procesos, progreso)
+    metadata = {'version': VERSION_MODELO, 'k': int(vecinos.indptr[1] - vecinos.indptr[0]) if vecinos.shape[0] > 0 else 0, 'k_solicitado': k,
+                'n_peliculas': int(tfidf_matrix.shape[0]), 'n_terminos': int(tfidf_matrix.shape[1]),
+                'creado': datetime.now().isoformat(timespec='seconds')}
+    return {'vectorizador': vectorizador, 'tfidf': tfidf_matrix, 'terminos': indice_terminos(tfidf_matrix), 'vecinos': vecinos,
+            'titulos': df['title'].to_numpy(dtype=object), 'textos': textos, 'metadata': metadata}
+
+def guardar_modelo(modelo, directorio):
+    """
+    Guardado del modelo en disco en un directorio versionado: arreglos de NumPy (.npy) para las matrices dispersas
+    (TF-IDF, indice de terminos y vecinos) y el idf, JSON para el vocabulario, los titulos, los textos combinados (si el modelo los tiene) y la metadata. La metadata
+    se escribe al final, su presencia indica que el guardado se completo.
+
+    Parametros
+    ----------
+    modelo : dict
+
+        Modelo generado con construir_modelo.
+
+    directorio : str
+
+        Directorio de salida, se crea si no existe.
+
+    Ejemplo
+    --------
+    >>> guardar_modelo(construir_modelo(movies), 'data/modelo')
+    """
+    os.makedirs(directorio, exist_ok=True)
+    ruta_metadata = os.path.join(directorio, 'metadata.json')
+    if os.path.exists(ruta_metadata):
+        os.remove(ruta_metadata)
+
+    # Cada archivo se escribe aparte y se reemplaza de forma atomica: los procesos que tienen mapeada la version anterior
+    # la siguen leyendo sin errores hasta que vuelvan a cargar el modelo
+    def guardar(nombre, escribir, modo = 'wb'):
+        ruta = os.path.join(directorio, nombre)
+        with open(ruta + '.tmp', modo, **({} if 'b' in modo else {'encoding': 'utf-8'})) as archivo:
+            escribir(archivo)
+        os.replace(ruta + '.tmp', ruta)
+
+    for nombre in ['tfidf', 'terminos', 'vecinos']:
+        matriz = modelo[nombre]
+        for parte in ['data', 'indices', 'indptr']:
+            guardar(f'{nombre}_{parte}.npy', lambda archivo: np.save(archivo, getattr(matriz, parte)))
+    guardar('idf.npy', lambda archivo: np.save(archivo, modelo['vectorizador'].idf_))
+    guardar('vocabulario.json', lambda archivo: json.dump(modelo['vectorizador'].get_feature_names_out().tolist(), archivo, ensure_ascii=False), 'w')
+    guardar('titulos.json', lambda archivo: json.dump([titulo if pd.notnull(titulo) else None for titulo in modelo['titulos']], archivo, ensure_ascii=False), 'w')
+    if modelo.get('textos') is not None:
+        guardar('textos.json', lambda archivo: json.dump(modelo['textos'].tolist(), archivo, ensure_ascii=False), 'w')
+    guardar('metadata.json', lambda archivo: json.dump(modelo['metadata'], archivo), 'w')
+
+def cargar_modelo(directorio, mmap = True, textos = False):
+    """
+    Carga del modelo guardado con guardar_modelo. Con mmap = True los arreglos se mapean en memoria en modo solo lectura,
+    la carga es casi instantanea y los distintos procesos (workers) que cargan el mismo directorio comparten las mismas
+    paginas fisicas.
+
+    Parametros
+    ----------
+    directorio : str
+
+        Directorio generado con guardar_modelo.
+
+    mmap : bool
+
+        Mapear los arreglos en memoria en lugar de leerlos completos, por defecto True.
+
+    textos : bool
+
+        Cargar los textos combinados guardados con el modelo, necesarios solo para actualizarlo. Por defecto False.
+
+    Retorno
+    -------
+    dict
+
+        Misma estructura que construir_modelo, con 'textos' None si no se cargaron o el modelo no los tiene.
+
+    Ejemplo
+    --------
+    >>> modelo = cargar_modelo('data/modelo') \t
+    >>> obtener_recomendaciones(indice, modelo['vecinos'], movies)
+    """
+    with open(os.path.join(directorio, 'metadata.json'), encoding='utf-8') as archivo:
+        metadata = json.load(archivo)
+    if metadata.get('version') != VERSION_MODELO:
+        raise ValueError(f"Version de modelo {metadata.get('version')} incompatible, se esperaba {VERSION_MODELO}. Reconstruir con construir_modelo.py")
+
+    modo = 'r' if mmap else None
+    def matriz(nombre, forma):
+        partes = [np.load(os.path.join(directorio, f'{nombre}_{parte}.npy'), mmap_mode=modo) for parte in ['data', 'indices', 'indptr']]
+        return sparse.csr_matrix(tuple(partes), shape=forma, copy=False)
+
+    n, n_terminos = metadata['n_peliculas'], metadata['n_terminos']
+    with open(os.path.join(directorio, 'vocabulario.json'), encoding='utf-8') as archivo:
+        vocabulario = json.load(archivo)
+    with open(os.path.join(directorio, 'titulos.json'), encoding='utf-8') as archivo:
+        titulos = np.array(json.load(archivo), dtype=object)
+
+    corpus = None
+    if textos and os.path.exists(os.path.join(directorio, 'textos.json')):
+        with open(os.path.join(directorio, 'textos.json'), encoding='utf-8') as archivo:
+            corpus = np.array(json.load(archivo), dtype=object)
+
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    vectorizador = TfidfVectorizer(stop_words='english', vocabulary=vocabulario)
+    vectorizador.idf_ = np.load(os.path.join(directorio, 'idf.npy'))
+    tfidf_matrix = matriz('tfidf', (n, n_terminos))
+    # Los modelos guardados antes de incorporar el indice de terminos lo calculan al cargarse
+    terminos = matriz('terminos', (n_terminos, n)) if os.path.exists(os.path.join(directorio, 'terminos_data.npy')) else indice_terminos(tfidf_matrix)
+    return {'vectorizador': vectorizador, 'tfidf': tfidf_matrix, 'terminos': terminos, 'vecinos': matriz('vecinos', (n, n)),
+            'titulos': titulos, 'textos': corpus, 'metadata': metadata}
+
+#ACTUALIZACION INCREMENTAL DEL MODELO
+def coincide_titulos(modelo, titulos):
+    """
+    Verificacion de que el modelo corresponde fila a fila con los titulos indicados (mismos titulos, mismo orden).
+    """
+    return pd.Series(modelo['titulos'], dtype=object).fillna('').equals(pd.Series(np.asarray(titulos, dtype=object)).fillna(''))
+
+def deriva_vocabulario(vectorizador, textos):
+    """
+    Cantidad de terminos (sin stop words) de los textos y cuantos de ellos no forman parte del vocabulario del
+    vectorizador ajustado. Mide cuanto del texto de las peliculas nuevas el modelo no puede representar.
+
+    Parametros
+    ----------
+    vectorizador : TfidfVectorizer
+
+        Vectorizador ajustado.
+
+    textos : pd.Series
+
+        Textos combinados de las peliculas nuevas, ver texto_combinado.
+
+    Retorno
+    -------
+    tuple(int, int)
+
+        (terminos totales, terminos fuera del vocabulario)
+    """
+    analizador = vectorizador.build_analyzer()
+    vocabulario = vectorizador.vocabulary_
+    totales, fuera = 0, 0
+    for texto in textos:
+        terminos = analizador(texto)
+        totales += len(terminos)
+        fuera += sum(1 for termino in terminos if termino not in vocabulario)
+    return totales, fuera
+
+def agregar_peliculas(modelo, df_nuevas, tamano_bloque = 256):
+    """
+    Agregado de peliculas a un modelo ya construido sin recalcular todo el indice de vecinos:
+    el texto de las nuevas se transforma con el vocabulario ajustado, se calculan solo sus filas y columnas de
+    similitud, y se actualizan las listas de vecinos de las peliculas existentes en las que alguna nueva entra al top k.
+    El idf y el vocabulario no se reajustan, ver actualizar_modelo para el reajuste completo.
+
+    Parametros
+    ----------
+    modelo : dict
+
+        Modelo generado con construir_modelo o cargar_modelo, no se modifica.
+
+    df_nuevas : pd.DataFrame()
+
+        Peliculas a agregar, con las columnas ['title', 'genres', 'overview']. Se ubican a continuacion de las existentes.
+
+    tamano_bloque : int
+
+        Cantidad de peliculas nuevas procesadas a la vez.
+
+    Retorno
+    -------
+    dict
+
+        Nuevo modelo con las peliculas agregadas.
+
+    Ejemplo
+    --------
+    >>> modelo = agregar_peliculas(cargar_modelo('data/modelo'), nuevas) \t
+    >>> guardar_modelo(modelo, 'data/modelo')
+    """
+    vecinos = modelo['vecinos']
+    n, m = vecinos.shape[0], len(df_nuevas)
+    k = modelo['metadata']['k']
+    textos = texto_combinado(df_nuevas)
+    nuevas = modelo['vectorizador'].transform(textos).astype(np.float32)
+    tfidf_matrix = sparse.vstack([modelo['tfidf'], nuevas], format='csr')
+    tfidf_t = tfidf_matrix.T.tocsc()
+
+    indices = np.empty((n + m, k), dtype=np.int64)
+    puntajes = np.empty((n + m, k), dtype=np.float32)
+    indices[:n] = vecinos.indices.reshape(n, k)
+    puntajes[:n] = vecinos.data.reshape(n, k)
+
+    for inicio in range(0, m, tamano_bloque):
+        fin = min(inicio + tamano_bloque, m)
+        columnas = np.arange(n + inicio, n + fin)
+
+        #Filas de las nuevas contra todo el catalogo (incluidas las demas nuevas)
+        bloque = (nuevas[inicio:fin] @ tfidf_t).toarray()
+        bloque[np.arange(fin - inicio), columnas] = -1
+        indices[n + inicio:n + fin], puntajes[n + inicio:n + fin] = _top_k(bloque, k)
+
+        #Columnas de las nuevas para las peliculas existentes: solo se actualizan las filas en las que alguna supera al k-esimo vecino
+        similitud = (modelo['tfidf'] @ nuevas[inicio:fin].T).toarray()
+        filas = np.flatnonzero(similitud.max(axis=1) > puntajes[:n, -1]) if fin > inicio else np.array([], dtype=np.int64)
+        if len(filas) > 0:
+            candidatos = np.concatenate([indices[filas], np.broadcast_to(columnas, (len(filas), len(columnas)))], axis=1)
+            indices[filas], puntajes[filas] = _top_k(np.concatenate([puntajes[filas], similitud[filas]], axis=1), k, candidatos)
+
+    totales, fuera = deriva_vocabulario(modelo['vectorizador'], textos)
+    metadata = dict(modelo['metadata'])
+    metadata.update({'n_peliculas': n + m, 'agregadas_desde_ajuste': metadata.get('agregadas_desde_ajuste', 0) + m,
+                     'terminos_desde_ajuste': metadata.get('terminos_desde_ajuste', 0) + totales,
+                     'terminos_fuera_vocabulario': metadata.get('terminos_fuera_vocabulario', 0) + fuera,
+                     'actualizado': datetime.now().isoformat(timespec='seconds')})
+    corpus = np.concatenate([modelo['textos'], textos.to_numpy(dtype=object)]) if modelo.get('textos') is not None else None
+    return {'vectorizador': modelo['vectorizador'], 'tfidf': tfidf_matrix, 'terminos': indice_terminos(tfidf_matrix), 'vecinos': _matriz_vecinos(indices, puntajes),
+            'titulos': np.concatenate([modelo['titulos'], df_nuevas['title'].to_numpy(dtype=object)]), 'textos': corpus, 'metadata': metadata}
+
+def actualizar_modelo(modelo, df, umbral_deriva = 0.05, tamano_bloque = 256, procesos = 1, progreso = None):
+    """
+    Actualizacion del modelo al catalogo indicado. Si el catalogo es el del modelo con peliculas nuevas al final, estas
+    se agregan de manera incremental (agregar_peliculas). Se realiza un reajuste completo (construir_modelo) si el
+    catalogo cambio de otra forma (filas modificadas, eliminadas o reordenadas), o si la proporcion de terminos fuera
+    del vocabulario acumulada desde el ultimo ajuste supera umbral_deriva.
+
+    Parametros
+    ----------
+    modelo : dict
+
+        Modelo generado con construir_modelo o cargar_modelo, no se modifica.
+
+    df : pd.DataFrame()
+
+        Catalogo completo con las columnas ['title', 'genres', 'overview'].
+
+    umbral_deriva : float
+
+        Proporcion maxima de terminos fuera del vocabulario antes de reajustar, por defecto 0.05.
+
+    tamano_bloque : int
+
+        Ver agregar_peliculas e indice_vecinos.
+
+    procesos, progreso :
+
+        Empleados en el reajuste completo, ver vecinos_tfidf.
+
+    Retorno
+    -------
+    tuple(dict, str)
+
+        Modelo actualizado y la accion realizada: 'sin_cambios', 'incremental' o 'reajuste'.
+    """
+    n = len(modelo['titulos'])
+    k = modelo['metadata'].get('k_solicitado', modelo['metadata']['k'])
+    #Con menos de k + 1 peliculas el indice tiene menos vecinos por fila que los solicitados, se reconstruye
+    if len(df) < n or modelo['metadata']['k'] < k or not coincide_titulos(modelo, df['title'].iloc[:n]):
+        return construir_modelo(df, k = k, tamano_bloque = tamano_bloque, procesos = procesos, progreso = progreso), 'reajuste'
+    if len(df) == n:
+        return modelo, 'sin_cambios'
+
+    actualizado = agregar_peliculas(modelo, df.iloc[n:], tamano_bloque)
+    metadata = actualizado['metadata']
+    if metadata['terminos_fuera_vocabulario'] > umbral_deriva * max(metadata['terminos_desde_ajuste'], 1):
+        #Los textos guardados con el modelo evitan recalcular el corpus completo
+        return construir_modelo(df, k = k, tamano_bloque = tamano_bloque, procesos = procesos, progreso = progreso, textos = actualizado['textos']), 'reajuste'
+    return actualizado, 'incremental'
 
 def modelos_knn(df, k = 5):
     """
@@ -130,6 +794,9 @@ def modelos_knn(df, k = 5):
     >>>  (model, scaler, mlb_genres, mlb_prod) Ver en retorno
 
     """
+    from sklearn.preprocessing import MultiLabelBinarizer, StandardScaler
+    from sklearn.neighbors import NearestNeighbors
+
     # Variables de entrada
     X_genres = df['genres']
     X_year_popularity = df[['release_year', 'popularity']]
@@ -194,7 +861,7 @@ def recomendaciones_knn(df, indice, knn, scaler, mlb_genres):
     """
     
     # Ejemplo de consulta de una película y recomendación
-    peli = df[df.index == indice]
+    peli = df.loc[[indice]]
     query_movie_genres = peli['genres']
     query_movie_year_popularity = peli[['release_year', 'popularity']]
     query_movie_year_popularity_scaled = scaler.transform(query_movie_year_popularity)
@@ -211,6 +878,372 @@ def recomendaciones_knn(df, indice, knn, scaler, mlb_genres):
     recommended_titles = df['title'].iloc[indices[0][1:6]].values
     return recommended_titles
 
+def matriz_knn(df, scaler, mlb_genres):
+    """
+    Features del modelo knn (one hot encoding de genres + release_year y popularity escalados) para todas las peliculas
+    del DataFrame, con los modelos de transformacion ya ajustados por modelos_knn. Se calcula una unica vez y luego se
+    consulta por posicion, sin volver a codificar la pelicula en cada consulta.
+
+    Parametros
+    ----------
+    df : pd.DataFrame()
+
+        DataFrame con las columnas ['genres', 'release_year', 'popularity'], ver modelos_knn.
+
+    scaler, mlb_genres :
+
+        Modelos de transformacion devueltos por modelos_knn.
+
+    Retorno
+    -------
+    numpy.ndarray
+
+        Matriz float32 de forma (len(df), cantidad de generos + 2).
+    """
+    X_genres_encoded = mlb_genres.transform(df['genres'])
+    X_year_popularity_scaled = scaler.transform(df[['release_year', 'popularity']].fillna(0))
+    return np.concatenate([X_genres_encoded, X_year_popularity_scaled], axis=1).astype(np.float32)
+
+#RECOMENDACION HIBRIDA
+#Los candidatos de cada pelicula son sus vecinos en el indice de texto (K por pelicula) y solo esos se reordenan con la
+#similitud de metadata (mismas features que knn) y un prior de popularidad y votos, sin recorrer todo el catalogo.
+#Pesos por defecto de cada componente del puntaje
+PESOS_HIBRIDO = {'texto': 0.6, 'metadata': 0.3, 'popularidad': 0.1}
+
+def _escalar(valores):
+    # Escalado min-max a [0, 1], constante 0 si todos los valores son iguales
+    if len(valores) == 0 or valores.max() <= valores.min():
+        return np.zeros_like(valores)
+    return (valores - valores.min()) / (valores.max() - valores.min())
+
+def _estandarizar(valores):
+    # Estandarizacion como StandardScaler, los faltantes quedan en el promedio (0)
+    desvio = np.nanstd(valores) if np.isfinite(valores).any() else 0.0
+    valores = (valores - np.nanmean(valores)) / desvio if desvio > 0 else np.zeros_like(valores)
+    return np.nan_to_num(valores)
+
+def modelo_hibrido(generos, df, votos_minimos = None):
+    """
+    Features por pelicula para el reordenamiento hibrido de recomendaciones_hibridas_lote, se calculan una unica vez.
+
+    Parametros
+    ----------
+    generos : dict
+
+        Generos de cada pelicula en forma plana (ver datos.aplanar), alineados a las filas de df.
+
+    df : pd.DataFrame()
+
+        DataFrame con las columnas ['release_year', 'popularity', 'vote_count', 'vote_average'].
+
+    votos_minimos : float
+
+        Votos a partir de los cuales el promedio propio de una pelicula pesa mas que el promedio general en el rating
+        bayesiano, por defecto el percentil 90 de vote_count.
+
+    Retorno
+    -------
+    dict
+
+        {'features': numpy.ndarray float32 (peliculas x (generos + 2)), 'prior': numpy.ndarray float32 (peliculas)}
+        features: one hot encoding de genres + release_year y popularity estandarizados, el espacio de matriz_knn.
+        prior: promedio del rating bayesiano y de log(1 + popularity), ambos escalados a [0, 1].
+
+    Ejemplo
+    --------
+    >>> modelo_hibrido(generos, df) \t
+    >>> {'features': array([[1., 0., ..., -0.4, 2.1], ...]), 'prior': array([0.71, 0.35, ...])}
+    """
+    n = len(df)
+    one_hot = np.zeros((n, len(generos['valores'])), dtype=np.float32)
+    one_hot[np.repeat(np.arange(n), np.diff(generos['offsets'])), generos['codigos']] = 1
+    anios = _estandarizar(df['release_year'].to_numpy(dtype=np.float64))
+    popularidad = df['popularity'].to_numpy(dtype=np.float64)
+    features = np.column_stack([one_hot, anios, _estandarizar(popularidad)]).astype(np.float32)
+
+    # Rating bayesiano: las peliculas con pocos votos se acercan al promedio general
+    votos = np.nan_to_num(df['vote_count'].to_numpy(dtype=np.float64))
+    promedio = df['vote_average'].to_numpy(dtype=np.float64)
+    promedio_general = np.nanmean(promedio[votos > 0]) if (votos > 0).any() else 0.0
+    promedio = np.where(np.isnan(promedio), promedio_general, promedio)
+    m = np.percentile(votos, 90) if votos_minimos is None and n > 0 else (votos_minimos or 0.0)
+    total = votos + m
+    rating = np.divide(votos * promedio + m * promedio_general, total, out=np.full(n, promedio_general), where=total > 0)
+    prior = (_escalar(rating) + _escalar(np.log1p(np.nan_to_num(np.maximum(popularidad, 0))))) / 2
+    return {'features': features, 'prior': prior.astype(np.float32)}
+
+def recomendaciones_hibridas_lote(indices_peliculas, matriz_sim, df, hibrido, top_n = 5, n_candidatos = None, pesos = None, tamano_bloque = 256):
+    """
+    Recomendaciones hibridas para un conjunto de peliculas: los n_candidatos vecinos de texto de cada una se reordenan con
+
+        puntaje = pesos['texto'] * similitud de texto + pesos['metadata'] * 1 / (1 + distancia de features)
+                  + pesos['popularidad'] * prior
+
+    Solo se calculan las features de los candidatos, el costo no depende del tamaño del catalogo.
+
+    Parametros
+    ----------
+    indices_peliculas: list o numpy.ndarray
+
+        Indices (posiciones) de las peliculas a buscar recomendaciones
+
+    matriz_sim: numpy.ndarray o scipy.sparse.csr_matrix
+
+        Indice de vecinos (indice_vecinos) o matriz de similitud del coseno (matriz_similitud) asociado al df
+
+    df : pd.DataFrame()
+
+        DataFrame empleado para la generacion de la matriz de similitud o del indice de vecinos.
+
+    hibrido : dict
+
+        Features y prior de cada pelicula, generado con modelo_hibrido.
+
+    top_n : int
+
+        Numero de recomendaciones a obtener por pelicula, por defecto 5.
+
+    n_candidatos : int
+
+        Vecinos de texto reordenados por pelicula, por defecto todos los del indice (su k) o, con la matriz densa,
+        todo el catalogo.
+
+    pesos : dict
+
+        Pesos de 'texto', 'metadata' y 'popularidad', los no indicados toman el valor de PESOS_HIBRIDO.
+
+    Retorno
+    -------
+    tuple(list, list)
+
+        Titulos y puntajes hibridos de cada pelicula consultada (un numpy.ndarray por pelicula), ordenados de mayor a
+        menor puntaje. Cada pelicula tiene top_n recomendaciones, o menos si tiene menos candidatos, ver
+        obtener_recomendaciones_lote.
+
+    Ejemplo
+    --------
+    >>> recomendaciones_hibridas_lote([0, 1], vecinos, movies, hibrido, top_n=2, pesos={'popularidad': 0}) \t
+    >>> ([array(['titulo2', 'titulo1']), array(['titulo3', 'titulo4'])], [array([0.52, 0.47]), array([0.61, 0.44])])
+    """
+    pesos = {**PESOS_HIBRIDO, **(pesos or {})}
+    indices_peliculas = np.asarray(indices_peliculas, dtype=np.int64).ravel()
+    n_candidatos = matriz_sim.shape[0] if n_candidatos is None else max(n_candidatos, top_n)
+    candidatos, texto, largos = _vecinos_lote(indices_peliculas, matriz_sim, n_candidatos, tamano_bloque)
+
+    features = hibrido['features']
+    distancias = np.sqrt(((features[candidatos] - features[indices_peliculas][:, None, :]) ** 2).sum(axis=2))
+    puntajes = (pesos['texto'] * texto + pesos['metadata'] / (1 + distancias)
+                + pesos['popularidad'] * hibrido['prior'][candidatos])
+
+    #Orden estable: ante empates se conserva el orden de similitud de texto. Las posiciones de relleno de
+    #_vecinos_lote (puntaje de texto -inf) quedan al final y se descartan
+    orden = np.argsort(-puntajes, axis=1, kind='stable')[:, :top_n]
+    titulos = df['title'].to_numpy(dtype=object)[np.take_along_axis(candidatos, orden, axis=1)]
+    largos = np.minimum(largos, top_n)
+    return _por_fila(titulos, largos), _por_fila(np.take_along_axis(puntajes, orden, axis=1), largos)
+
+def _distancias(consultas, puntos, normas_puntos):
+    # Distancia euclidea al cuadrado, ||q||^2 - 2 q.p + ||p||^2, acotada en 0 por errores de redondeo
+    d = (consultas ** 2).sum(axis=1)[:, None] - 2 * consultas @ puntos.T + normas_puntos[None, :]
+    return np.maximum(d, 0)
+
+def construir_ivf(X, n_listas = None, iteraciones = 10, tamano_bloque = 4096, semilla = 0):
+    """
+    Motor aproximado de vecinos más cercanos (ANN) tipo IVF, en NumPy: se particiona el espacio de features con k-means
+    en n_listas celdas y cada pelicula queda en la lista de su centroide más cercano. En la consulta solo se recorren
+    las peliculas de las n_sondeos celdas más cercanas, en lugar de todo el catalogo.
+
+    Parametros
+    ----------
+    X : numpy.ndarray
+
+        Features de las peliculas, por ejemplo generadas con matriz_knn.
+
+    n_listas : int
+
+        Cantidad de celdas, por defecto 4 * raiz(N).
+
+    iteraciones : int
+
+        Iteraciones de k-means.
+
+    tamano_bloque : int
+
+        Filas procesadas a la vez en el calculo de distancias a los centroides.
+
+    semilla : int
+
+        Semilla de la inicializacion de los centroides, el motor es determinista para una misma semilla.
+
+    Retorno
+    -------
+    dict
+
+        {'X': features, 'normas': ||X||^2, 'centroides': numpy.ndarray, 'offsets': numpy.ndarray, 'miembros': numpy.ndarray}
+        Las posiciones de las peliculas de la celda c son miembros[offsets[c]:offsets[c+1]].
+
+    Ejemplo
+    --------
+    >>> ivf = construir_ivf(matriz_knn(df, scaler, mlb_genres)) \t
+    >>> buscar_vecinos(ivf, X[[indice]], k = 5, excluir = [indice], n_sondeos = 8)
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    n = X.shape[0]
+    n_listas = max(1, min(n, n_listas if n_listas is not None else int(4 * np.sqrt(n))))
+    rng = np.random.default_rng(semilla)
+    centroides = X[rng.choice(n, n_listas, replace=False)].copy()
+
+    asignacion = np.zeros(n, dtype=np.int64)
+    for _ in range(iteraciones + 1):
+        normas_c = (centroides ** 2).sum(axis=1)
+        for inicio in range(0, n, tamano_bloque):
+            asignacion[inicio:inicio + tamano_bloque] = _distancias(X[inicio:inicio + tamano_bloque], centroides, normas_c).argmin(axis=1)
+        if _ == iteraciones:
+            break
+        #Nuevos centroides: media de sus miembros, las celdas vacias conservan el centroide anterior
+        conteo = np.bincount(asignacion, minlength=n_listas)
+        sumas = np.zeros_like(centroides)
+        np.add.at(sumas, asignacion, X)
+        no_vacias = conteo > 0
+        centroides[no_vacias] = sumas[no_vacias] / conteo[no_vacias, None]
+
+    miembros = np.argsort(asignacion, kind='stable')
+    offsets = np.zeros(n_listas + 1, dtype=np.int64)
+    np.cumsum(np.bincount(asignacion, minlength=n_listas), out=offsets[1:])
+    return {'X': X, 'normas': (X ** 2).sum(axis=1), 'centroides': centroides, 'offsets': offsets, 'miembros': miembros}
+
+def buscar_vecinos(motor, consultas, k = 5, excluir = None, n_sondeos = 8):
+    """
+    Busqueda por lotes de los k vecinos más cercanos, con el motor exacto (sklearn NearestNeighbors de modelos_knn) o el
+    aproximado (construir_ivf). En el motor IVF n_sondeos regula el compromiso recall/latencia: más celdas recorridas
+    implica más recall y más tiempo por consulta.
+
+    Parametros
+    ----------
+    motor : sklearn.neighbors.NearestNeighbors o dict
+
+        Modelo exacto ajustado con las mismas features, o motor generado con construir_ivf.
+
+    consultas : numpy.ndarray
+
+        Features de las consultas, una fila por consulta.
+
+    k : int
+
+        Cantidad de vecinos por consulta.
+
+    excluir : list
+
+        Posicion a excluir de los resultados de cada consulta (la propia pelicula), o None.
+
+    n_sondeos : int
+
+        Celdas recorridas por consulta en el motor IVF.
+
+    Retorno
+    -------
+    tuple(numpy.ndarray, numpy.ndarray)
+
+        Distancias euclideas y posiciones de los vecinos, de forma (len(consultas), k), de menor a mayor distancia.
+        Si no hay k candidatos se completa con distancia inf y posicion -1.
+    """
+    consultas = np.atleast_2d(np.asarray(consultas, dtype=np.float32))
+    excluir = np.full(len(consultas), -1) if excluir is None else np.asarray(excluir)
+    distancias = np.full((len(consultas), k), np.inf)
+    posiciones = np.full((len(consultas), k), -1, dtype=np.int64)
+
+    if not isinstance(motor, dict):
+        #Motor exacto, se pide un vecino extra por si la propia pelicula esta entre los resultados
+        d, p = motor.kneighbors(consultas, n_neighbors=min(k + 1, motor.n_samples_fit_))
+        for i in range(len(consultas)):
+            validos = p[i] != excluir[i]
+            m = min(k, validos.sum())
+            distancias[i, :m], posiciones[i, :m] = d[i][validos][:m], p[i][validos][:m]
+        return distancias, posiciones
+
+    n_sondeos = min(n_sondeos, len(motor['centroides']))
+    celdas = np.argpartition(_distancias(consultas, motor['centroides'], (motor['centroides'] ** 2).sum(axis=1)), n_sondeos - 1, axis=1)[:, :n_sondeos]
+
+    #Se agrupan las consultas por celda: cada celda se recorre una sola vez para todas las consultas que la sondean
+    pares_consulta = np.repeat(np.arange(len(consultas)), n_sondeos)
+    pares_celda = celdas.ravel()
+    orden = np.argsort(pares_celda, kind='stable')
+    pares_consulta, pares_celda = pares_consulta[orden], pares_celda[orden]
+    cortes = np.flatnonzero(np.diff(pares_celda)) + 1
+    for grupo, celda in zip(np.split(pares_consulta, cortes), pares_celda[np.r_[0, cortes]] if len(pares_celda) else []):
+        miembros = motor['miembros'][motor['offsets'][celda]:motor['offsets'][celda + 1]]
+        if len(miembros) == 0:
+            continue
+        d = _distancias(consultas[grupo], motor['X'][miembros], motor['normas'][miembros])
+        d[miembros[None, :] == excluir[grupo, None]] = np.inf
+        #Union con los mejores vecinos encontrados hasta ahora y seleccion parcial de los k menores
+        d = np.concatenate([distancias[grupo], d], axis=1)
+        p = np.concatenate([posiciones[grupo], np.broadcast_to(miembros, (len(grupo), len(miembros)))], axis=1)
+        top = np.argpartition(d, k - 1, axis=1)[:, :k]
+        distancias[grupo] = np.take_along_axis(d, top, axis=1)
+        posiciones[grupo] = np.take_along_axis(p, top, axis=1)
+
+    orden = np.argsort(distancias, axis=1, kind='stable')
+    distancias = np.sqrt(np.take_along_axis(distancias, orden, axis=1))
+    posiciones = np.take_along_axis(posiciones, orden, axis=1)
+    posiciones[np.isinf(distancias)] = -1
+    return distancias, posiciones
+
+def reporte_recall(motor_ivf, motor_exacto, indices, k = 5, sondeos = (1, 2, 4, 8, 16, 32)):
+    """
+    Comparacion del motor IVF contra el motor exacto para distintos n_sondeos: recall@k y milisegundos por consulta.
+    Dado que muchas peliculas comparten exactamente las mismas features, un resultado aproximado se considera correcto
+    si su distancia no supera la del k-esimo vecino exacto (empates equivalentes).
+
+    Parametros
+    ----------
+    motor_ivf : dict
+
+        Motor generado con construir_ivf.
+
+    motor_exacto : sklearn.neighbors.NearestNeighbors
+
+        Modelo exacto ajustado con las mismas features (modelos_knn).
+
+    indices : list
+
+        Posiciones de las peliculas usadas como consulta (se excluyen a si mismas).
+
+    k : int
+
+        Cantidad de vecinos evaluados.
+
+    sondeos : tuple
+
+        Valores de n_sondeos a evaluar.
+
+    Retorno
+    -------
+    pd.DataFrame
+
+        Una fila por n_sondeos con las columnas ['n_sondeos', 'recall', 'ms_consulta', 'ms_consulta_exacto'].
+
+    Ejemplo
+    --------
+    >>> reporte_recall(ivf, model, np.arange(0, len(df), 50), k = 5) \t
+    >>>    n_sondeos  recall  ms_consulta  ms_consulta_exacto
+           0          1    0.91        0.050               1.200 ...
+    """
+    indices = np.asarray(indices)
+    consultas = motor_ivf['X'][indices]
+    inicio = time.perf_counter()
+    d_exacto, _ = buscar_vecinos(motor_exacto, consultas, k, excluir=indices)
+    ms_exacto = (time.perf_counter() - inicio) * 1000 / len(indices)
+    umbral = d_exacto[:, -1:] + 1e-5
+
+    filas = []
+    for n_sondeos in sondeos:
+        inicio = time.perf_counter()
+        d_ivf, _ = buscar_vecinos(motor_ivf, consultas, k, excluir=indices, n_sondeos=n_sondeos)
+        ms = (time.perf_counter() - inicio) * 1000 / len(indices)
+        filas.append({'n_sondeos': n_sondeos, 'recall': float((d_ivf <= umbral).mean()), 'ms_consulta': ms, 'ms_consulta_exacto': ms_exacto})
+    return pd.DataFrame(filas)
+
 if __name__ == '__main__':
     df = pd.read_csv('data/cleanMovies.csv')
     df['genres'] = df.genres.apply( lambda x: eval(x))
@@ -226,4 +1259,16 @@ if __name__ == '__main__':
     model, scaler, mlb_genres = modelos_knn(df[0:2000], k = 5)
     titulos = recomendaciones_knn(df[0:2000], indice, model, scaler, mlb_genres)
     print(titulos)
+# USO PARA KNN APROXIMADO (IVF) SOBRE TODO EL CATALOGO
+    model, scaler, mlb_genres = modelos_knn(df, k = 5)
+    X = matriz_knn(df, scaler, mlb_genres)
+    ivf = construir_ivf(X)
+    _, vecinos = buscar_vecinos(ivf, X[[indice]], k = 5, excluir = [indice], n_sondeos = 8)
+    print(df['title'].values[vecinos[0]])
+    print(reporte_recall(ivf, model, np.arange(0, len(df), max(1, len(df) // 500)), k = 5))
+# USO PARA RECOMENDACION HIBRIDA (CANDIDATOS DE TEXTO REORDENADOS CON METADATA Y POPULARIDAD)
+    from datos import aplanar
+    modelo = construir_modelo(df[0:2000], k = 50)
+    hibrido = modelo_hibrido(aplanar(df['genres'][0:2000]), df[0:2000])
+    print(recomendaciones_hibridas_lote([indice], modelo['vecinos'], df[0:2000], hibrido, top_n = 5)[0][0])
     #print(type(model),type(scaler), type(mlb_genres), type(mlb_prod) )
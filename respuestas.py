@@ -0,0 +1,218 @@
+import os
+import json
+import enum
+import base64
+import datetime
+from json.encoder import encode_basestring
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from starlette.responses import Response, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+
+# SERIALIZACION DE LAS RESPUESTAS CON LISTAS DE RESULTADOS
+# Las listas de resultados (peliculas de un director, rankings) se codifican en JSON directamente desde los arreglos de
+# columnas: cada columna se convierte a texto de una sola vez y las filas se arman con una plantilla, sin construir un
+# dict por fila ni pasar por el codificador generico de FastAPI (jsonable_encoder).
+# - Columnas({'clave': arreglo, ...}): lista de objetos JSON, se ubica en cualquier posicion del contenido.
+# - RespuestaJSON(contenido): mismo formato que la respuesta por defecto de FastAPI (UTF-8, sin espacios). Guarda el
+#   cuerpo ya codificado, por lo que la cache de respuestas evita volver a serializar.
+# - RespuestaNDJSON(filas): una fila JSON por linea, transmitida por bloques de NDJSON_FILAS_BLOQUE filas. Se puede
+#   enviar mas de una vez (cada envio recorre las filas desde el principio), por lo que tambien admite cache.
+# - codificar_cursor / leer_cursor: cursores opacos para la paginacion.
+# orjson es opcional: si esta instalado se emplea para convertir las columnas numericas, si no el modulo json.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NDJSON_FILAS_BLOQUE = int(os.environ.get('NDJSON_FILAS_BLOQUE', 1000))
+
+def _valor(valor):
+    # Valor suelto, con las mismas conversiones que jsonable_encoder (fechas ISO, enums por valor, escalares de NumPy)
+    if isinstance(valor, str):
+        return encode_basestring(valor)
+    if isinstance(valor, enum.Enum):
+        return _valor(valor.value)
+    if isinstance(valor, np.generic):
+        return _valor(valor.item())
+    if isinstance(valor, (datetime.date, pd.Timestamp)):
+        return 'null' if pd.isnull(valor) else f'"{valor.isoformat()}"'
+    if isinstance(valor, float) and not np.isfinite(valor):
+        return 'null'
+    return json.dumps(valor, ensure_ascii=False, separators=(',', ':'))
+
+def _fragmentos(valores):
+    """
+    Texto JSON de cada valor de una columna.
+
+    Parametros
+    ----------
+    valores : numpy.ndarray o pd.Series
+
+        Numeros (NaN e infinitos como null), fechas datetime64 (como 'AAAA-MM-DD'), textos u objetos.
+
+    Retorno
+    -------
+    list
+    """
+    valores = valores.to_numpy() if isinstance(valores, pd.Series) else np.asarray(valores)
+    if len(valores) == 0:
+        return []
+    if valores.dtype.kind == 'M':
+        fechas = np.datetime_as_string(valores, unit='D').tolist()
+        return ['null' if nulo else f'"{fecha}"' for fecha, nulo in zip(fechas, np.isnat(valores).tolist())]
+    if valores.dtype.kind in 'iub':
+        texto = orjson.dumps(np.ascontiguousarray(valores), option=orjson.OPT_SERIALIZE_NUMPY).decode() if orjson is not None else json.dumps(valores.tolist(), separators=(',', ':'))
+        return texto[1:-1].split(',')
+    if valores.dtype.kind == 'f':
+        if orjson is not None:
+            return orjson.dumps(np.ascontiguousarray(valores), option=orjson.OPT_SERIALIZE_NUMPY).decode()[1:-1].split(',')
+        lista = valores.tolist()
+        for i in np.flatnonzero(~np.isfinite(valores)).tolist():
+            lista[i] = None
+        return json.dumps(lista, separators=(',', ':'))[1:-1].split(',')
+    return [encode_basestring(valor) if isinstance(valor, str) else _valor(valor) for valor in valores.tolist()]
+
+class Columnas:
+    """
+    Lista de objetos JSON a partir de columnas de igual largo, en el orden de las claves.
+
+    Ejemplo
+    --------
+    >>> Columnas({'titulo': df['title'].values[posiciones], 'presupuesto': df['budget'].values[posiciones]}).json() \t
+    >>> '[{"titulo":"Toy Story","presupuesto":30000000.0},...]'
+    """
+    def __init__(self, columnas):
+        self.columnas = columnas
+        self.largo = len(next(iter(columnas.values()))) if columnas else 0
+        #'%' es el unico caracter especial de la plantilla
+        self.plantilla = '{' + ','.join(encode_basestring(clave).replace('%', '%%') + ':%s' for clave in columnas) + '}'
+        self._json = None
+
+    def __len__(self):
+        return self.largo
+
+    def filas(self, desde = 0, hasta = None):
+        # Texto JSON de cada fila entre desde y hasta
+        partes = [_fragmentos(valores[desde:hasta]) for valores in self.columnas.values()]
+        plantilla = self.plantilla
+        return [plantilla % fila for fila in zip(*partes)]
+
+    def json(self):
+        if self._json is None:
+            self._json = '[' + ','.join(self.filas()) + ']'
+        return self._json
+
+def _codificar(objeto, partes):
+    if isinstance(objeto, Columnas):
+        partes.append(objeto.json())
+    elif isinstance(objeto, RespuestaJSON):
+        partes.append(objeto.body.decode('utf-8'))
+    elif isinstance(objeto, dict):
+        partes.append('{')
+        for i, (clave, valor) in enumerate(objeto.items()):
+            partes.append(f'{"," if i else ""}{encode_basestring(str(clave))}:')
+            _codificar(valor, partes)
+        partes.append('}')
+    elif isinstance(objeto, (list, tuple)):
+        #Las listas de valores simples se codifican en una sola llamada
+        if not any(isinstance(elemento, (dict, list, tuple, Columnas, Response)) for elemento in objeto):
+            partes.append(json.dumps(objeto, ensure_ascii=False, separators=(',', ':'), default=lambda valor: json.loads(_valor(valor))))
+            return
+        partes.append('[')
+        for i, elemento in enumerate(objeto):
+            if i:
+                partes.append(',')
+            _codificar(elemento, partes)
+        partes.append(']')
+    else:
+        partes.append(_valor(objeto))
+
+def codificar(contenido):
+    """
+    Texto JSON del contenido, con dict, listas, valores simples y Columnas (o respuestas RespuestaJSON ya codificadas)
+    en cualquier nivel.
+
+    Retorno
+    -------
+    str
+    """
+    partes = []
+    _codificar(contenido, partes)
+    return ''.join(partes)
+
+class RespuestaJSON(Response):
+    """
+    Respuesta JSON codificada con codificar, admite Columnas dentro del contenido.
+
+    Ejemplo
+    --------
+    >>> return RespuestaJSON({'director': director, 'peliculas': Columnas({'titulo': titulos, ...})})
+    """
+    media_type = 'application/json'
+
+    def render(self, contenido):
+        return codificar(contenido).encode('utf-8')
+
+class RespuestaNDJSON(StreamingResponse):
+    """
+    Respuesta NDJSON (application/x-ndjson) transmitida por bloques: una fila por linea.
+
+    Parametros
+    ----------
+    filas : Columnas o list
+
+        Filas de la respuesta, las listas pueden contener cualquier contenido admitido por codificar.
+    """
+    media_type = 'application/x-ndjson'
+
+    def __init__(self, filas, status_code = 200, headers = None, filas_por_bloque = None):
+        self.filas = filas
+        self.filas_por_bloque = filas_por_bloque or NDJSON_FILAS_BLOQUE
+        super().__init__(self._bloques(), status_code, headers, self.media_type)
+
+    def _bloques(self):
+        for desde in range(0, len(self.filas), self.filas_por_bloque):
+            hasta = desde + self.filas_por_bloque
+            if isinstance(self.filas, Columnas):
+                lineas = self.filas.filas(desde, hasta)
+            else:
+                lineas = [codificar(fila) for fila in self.filas[desde:hasta]]
+            yield ('\n'.join(lineas) + '\n').encode('utf-8')
+
+    async def stream_response(self, send):
+        # Se crea un recorrido nuevo en cada envio, la misma respuesta puede enviarse desde la cache varias veces
+        await send({'type': 'http.response.start', 'status': self.status_code, 'headers': self.raw_headers})
+        async for bloque in iterate_in_threadpool(self._bloques()):
+            await send({'type': 'http.response.body', 'body': bloque, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+def codificar_cursor(posicion):
+    """
+    Cursor opaco para la siguiente pagina a partir de una posicion entera.
+
+    Retorno
+    -------
+    str
+    """
+    return base64.urlsafe_b64encode(str(int(posicion)).encode('ascii')).decode('ascii').rstrip('=')
+
+def leer_cursor(cursor):
+    """
+    Posicion codificada en un cursor generado con codificar_cursor, None si no se indica cursor.
+
+    Errores
+    -------
+    HTTPException 400 si el cursor no es valido.
+    """
+    if cursor is None:
+        return None
+    try:
+        posicion = int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii'))
+    except ValueError:
+        posicion = -1
+    if posicion < 0:
+        raise HTTPException(status_code=400, detail='Cursor invalido')
+    return posicion
@@ -0,0 +1,85 @@
+import os
+from ast import literal_eval
+import numpy as np
+import pandas as pd
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+GENEROS = ['Action', 'Adventure', 'Animation', 'Comedy', 'Drama', 'Family', 'Fantasy', 'Horror', 'Romance', 'Science Fiction']
+PALABRAS = ['toy', 'cowboy', 'space', 'ranger', 'jungle', 'game', 'board', 'ant', 'colony', 'circus', 'island', 'pirate',
+            'treasure', 'ship', 'storm', 'robot', 'city', 'night', 'detective', 'murder', 'love', 'letter', 'war',
+            'soldier', 'dragon', 'king', 'castle', 'ghost', 'house', 'family', 'summer', 'road', 'trip', 'band', 'music',
+            'school', 'teacher', 'dog', 'horse', 'river']
+
+def generar_datos(directorio, filas = 300, semilla = 0):
+    # Datos sinteticos con el esquema de salida del ETL (cleanMovies.csv y cleanCredits.csv). Las primeras filas son
+    # peliculas conocidas para las consultas de los tests, 'Toy Story' se repite en la fila 150
+    rng = np.random.default_rng(semilla)
+    os.makedirs(directorio, exist_ok=True)
+    actores = [f'{a} {b}'.title() for a, b in zip(rng.choice(PALABRAS, 80), rng.choice(PALABRAS, 80))] + ['Tom Hanks', 'Tim Allen']
+    directores = [f'{a} {b}son'.title() for a, b in zip(rng.choice(PALABRAS, 30), rng.choice(PALABRAS, 30))]
+
+    titulos = [f'{a} {b}'.title() for a, b in zip(rng.choice(PALABRAS, filas), rng.choice(PALABRAS, filas))]
+    titulos[:3] = ['Toy Story', 'Jumanji', "A Bug'S Life"]
+    titulos[150] = 'Toy Story'
+    overview = [' '.join(rng.choice(PALABRAS, rng.integers(5, 15))) for _ in range(filas)]
+    overview[0] = 'toy cowboy space ranger toy'
+    overview[20] = np.nan
+    fechas = pd.Timestamp('1950-01-01') + pd.to_timedelta(rng.integers(0, 25000, filas), unit='D')
+    budget = np.where(rng.random(filas) < 0.5, 0, rng.integers(1, 200, filas) * 1e6)
+    revenue = np.where(budget > 0, np.round(budget * rng.gamma(2, 1, filas)), 0)
+
+    peliculas = pd.DataFrame({
+        'budget': budget, 'genres': [str(list(rng.choice(GENEROS, rng.integers(0, 4), replace=False))) for _ in range(filas)],
+        'id': np.arange(filas) + 1, 'overview': overview, 'popularity': np.round(rng.gamma(1, 3, filas), 3),
+        'production_companies': '[]', 'production_countries': '[]', 'release_date': fechas.strftime('%Y-%m-%d'),
+        'revenue': revenue, 'runtime': rng.integers(60, 180, filas).astype(float), 'spoken_languages': "['en']",
+        'status': 'Released', 'title': titulos, 'vote_average': np.round(rng.random(filas) * 10, 1),
+        'vote_count': rng.integers(0, 5000, filas).astype(float), 'release_year': fechas.year,
+        'return': np.where(budget > 0, revenue / np.where(budget > 0, budget, 1), 0)})
+
+    cast = [list(rng.choice(actores, rng.integers(0, 6), replace=False)) for _ in range(filas)]
+    director = [list(rng.choice(directores, rng.integers(1, 3), replace=False)) for _ in range(filas)]
+    cast[:3] = [['Tom Hanks', 'Tim Allen'], ['Robin Williams'], ['Kevin Spacey']]
+    director[:3] = [['John Lasseter'], ['Joe Johnston'], ['John Lasseter']]
+    creditos = pd.DataFrame({'cast': [str(lista) for lista in cast], 'id': peliculas['id'], 'director': [str(lista) for lista in director]})
+
+    peliculas.to_csv(os.path.join(directorio, 'cleanMovies.csv'), index=False)
+    creditos.to_csv(os.path.join(directorio, 'cleanCredits.csv'), index=False)
+
+@pytest.fixture(scope='session')
+def directorio_datos(tmp_path_factory):
+    # Directorio de trabajo de la API: data/ con los CSV sinteticos y los templates y estaticos del repositorio
+    directorio = tmp_path_factory.mktemp('api')
+    generar_datos(str(directorio / 'data'))
+    for carpeta in ['templates', 'static']:
+        os.symlink(os.path.join(RAIZ, carpeta), directorio / carpeta)
+    return directorio
+
+@pytest.fixture(scope='session')
+def peliculas(directorio_datos):
+    df = pd.read_csv(directorio_datos / 'data' / 'cleanMovies.csv', parse_dates=['release_date'])
+    df['genres'] = df['genres'].apply(literal_eval)
+    return df
+
+@pytest.fixture(scope='session')
+def creditos(directorio_datos):
+    df2 = pd.read_csv(directorio_datos / 'data' / 'cleanCredits.csv')
+    for columna in ['cast', 'director']:
+        df2[columna] = df2[columna].apply(literal_eval)
+    return df2
+
+@pytest.fixture(scope='session')
+def api(directorio_datos):
+    # Cliente de la API iniciada sobre los datos sinteticos, con el sistema de recomendacion ya cargado
+    from fastapi.testclient import TestClient
+    anterior = os.getcwd()
+    os.chdir(directorio_datos)
+    try:
+        import main
+        with TestClient(main.app) as cliente:
+            main.recomendador_terminado.wait()
+            yield cliente
+    finally:
+        os.chdir(anterior)
@@ -0,0 +1,80 @@
+import json
+import shutil
+from ml_models import construir_modelo, guardar_modelo
+
+def test_recomendaciones_por_lote(api):
+    respuesta = api.post('/recomendacion/get_recomendaciones', json={'titulos': ['toy story', 'Jumanji', 'Pepe el grillo'], 'top_n': 3})
+    resultados = respuesta.json()['resultados']
+    assert [r['titulo'] for r in resultados] == ['Toy Story', 'Jumanji', 'Pepe El Grillo']
+    assert resultados[2]['mensaje'] == 'Titulo no encontrado'
+    assert [len(r['titulos_recomendados']) for r in resultados[:2]] == [3, 3]
+    assert resultados[1]['puntajes'] == sorted(resultados[1]['puntajes'], reverse=True)
+    # Mismas recomendaciones que la consulta individual
+    individual = api.get('/recomendacion/get_recomendacion/jumanji').json()
+    cinco = api.post('/recomendacion/get_recomendaciones', json={'titulos': ['Jumanji']}).json()['resultados'][0]
+    assert cinco['titulos_recomendados'] == individual['titulos_recomendados']
+
+    lineas = api.post('/recomendacion/get_recomendaciones?formato=ndjson', json={'titulos': ['toy story', 'Jumanji', 'Pepe el grillo'], 'top_n': 3})
+    assert lineas.headers['content-type'] == 'application/x-ndjson'
+    assert [json.loads(linea) for linea in lineas.text.splitlines()] == resultados
+
+def test_recomendaciones_por_lote_limites(api):
+    import main
+    respuesta = api.post('/recomendacion/get_recomendaciones', json={'titulos': ['Jumanji'] * (main.MAX_TITULOS_LOTE + 1)})
+    assert respuesta.status_code == 422
+    assert api.post('/recomendacion/get_recomendaciones', json={'titulos': ['Jumanji'], 'top_n': main.K_VECINOS + 1}).status_code == 422
+    maximo = api.post('/recomendacion/get_recomendaciones', json={'titulos': ['Jumanji'], 'top_n': main.K_VECINOS}).json()
+    assert len(maximo['resultados'][0]['titulos_recomendados']) == main.K_VECINOS
+
+def test_modelo_guardado_con_menos_vecinos_se_reconstruye(api, peliculas):
+    # Un modelo construido con k menor a K_VECINOS no admite el top_n maximo de los endpoints
+    import main
+    guardar_modelo(construir_modelo(peliculas, k = 5), main.MODELO_DIR)
+    try:
+        main.cargar_recomendador()
+    finally:
+        shutil.rmtree(main.MODELO_DIR)
+    assert main.modelo['metadata']['k'] == main.K_VECINOS
+    maximo = api.post('/recomendacion/get_recomendaciones', json={'titulos': ['Jumanji'], 'top_n': main.K_VECINOS}).json()
+    assert len(maximo['resultados'][0]['titulos_recomendados']) == main.K_VECINOS
+
+def test_consultar_desde_la_portada(api):
+    respuesta = api.post('/consultar', data={'funcion': 'POPULARIDAD DEL TITULO', 'parametro': "a bug's life"}).json()
+    assert respuesta['titulo'] == "A Bug'S Life" and 'popularidad' in respuesta
+    assert api.post('/consultar', data={'funcion': 'NO EXISTE', 'parametro': 'x'}).json() == {'error': 'Función no válida'}
+
+    consultas = [{'funcion': 'INFORMACION DE DIRECTOR', 'parametro': 'john lasseter'}, {'funcion': 'NO EXISTE', 'parametro': 'x'},
+                 {'funcion': 'PELICULAS POR MES', 'parametro': 'Enero'}]
+    resultados = api.post('/consultar/lote', json=consultas).json()['resultados']
+    assert resultados[0] == api.get('/director/get_director/John Lasseter').json()
+    assert resultados[1] == {'error': 'Función no válida'}
+    assert resultados[2] == api.get('/peliculas/get_month/enero').json()
+
+def test_consultar_lote_limite(api):
+    import main
+    consultas = [{'funcion': 'PELICULAS POR MES', 'parametro': 'enero'}] * (main.MAX_CONSULTAS_LOTE + 1)
+    assert api.post('/consultar/lote', json=consultas).status_code == 422
+
+def test_paginacion_por_cursor(api):
+    completo = api.get('/director/get_director/John Lasseter').json()
+    peliculas, cursor = [], None
+    while True:
+        pagina = api.get('/director/get_director/john lasseter', params={'limite': 1, **({'cursor': cursor} if cursor else {})}).json()
+        peliculas += pagina['peliculas']
+        cursor = pagina['siguiente']
+        if cursor is None:
+            break
+    assert peliculas == completo['peliculas'] and len(peliculas) == 2
+    lineas = api.get('/director/get_director/John Lasseter', params={'formato': 'ndjson'})
+    assert [json.loads(linea) for linea in lineas.text.splitlines()] == completo['peliculas']
+    assert api.get('/director/get_director/John Lasseter', params={'cursor': '!!'}).status_code == 400
+
+    completo = api.get('/actor/ranking', params={'limite': 100}).json()['resultados']
+    resultados, cursor = [], None
+    while True:
+        pagina = api.get('/actor/ranking', params={'limite': 30, **({'cursor': cursor} if cursor else {})}).json()
+        resultados += pagina['resultados']
+        cursor = pagina['siguiente']
+        if cursor is None:
+            break
+    assert resultados == completo
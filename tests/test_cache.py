@@ -0,0 +1,52 @@
+import asyncio
+import cache
+
+def test_clave_con_la_forma_del_endpoint():
+    # El endpoint usa el titulo en forma str.title: las variantes de mayusculas comparten la entrada y la respuesta
+    calculos = []
+
+    @cache.cacheado(titulo=str.title)
+    async def repetir(titulo: str, formato: str = 'json'):
+        calculos.append(titulo)
+        return {'titulo': titulo.title(), 'formato': formato}
+
+    async def consultar():
+        cache.invalidar('prueba')
+        return [await repetir(titulo, formato) for titulo, formato in [('toy story', 'json'), ('TOY STORY', 'json'), ('Toy Story', 'JSON')]]
+
+    assert asyncio.run(consultar()) == [{'titulo': 'Toy Story', 'formato': 'json'}] * 2 + [{'titulo': 'Toy Story', 'formato': 'JSON'}]
+    assert len(calculos) == 2
+
+def test_clave_con_valores_recibidos():
+    # Sin forma declarada el parametro forma la clave tal como se recibe
+    @cache.cacheado
+    async def repetir(texto: str):
+        return {'texto': texto}
+
+    async def consultar():
+        cache.invalidar('prueba')
+        return [await repetir(texto) for texto in ['Tom Hanks', 'tom hanks', 'Tom Hanks']]
+
+    assert [r['texto'] for r in asyncio.run(consultar())] == ['Tom Hanks', 'tom hanks', 'Tom Hanks']
+
+def test_cancelacion_de_la_consulta_que_calcula():
+    # Si se cancela la consulta que calcula, las que esperaban ese calculo lo vuelven a intentar en lugar de cancelarse
+    calculos = []
+
+    @cache.cacheado
+    async def lenta(valor: int):
+        calculos.append(valor)
+        await asyncio.sleep(0.05)
+        return valor * 2
+
+    async def consultar():
+        cache.invalidar('prueba')
+        primera = asyncio.ensure_future(lenta(1))
+        await asyncio.sleep(0)
+        segunda = asyncio.ensure_future(lenta(1))
+        await asyncio.sleep(0.01)
+        primera.cancel()
+        return await segunda, primera.cancelled()
+
+    assert asyncio.run(consultar()) == (2, True)
+    assert calculos == [1, 1]
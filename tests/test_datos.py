@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+from datos import convertir_a_columnar, cargar_peliculas, cargar_creditos, aplanar, a_listas, seleccionar_filas, compactar
+
+def test_convertir_a_columnar_y_cargar(directorio_datos, tmp_path):
+    ruta_peliculas, ruta_creditos = str(directorio_datos / 'data' / 'cleanMovies.csv'), str(directorio_datos / 'data' / 'cleanCredits.csv')
+    convertir_a_columnar(ruta_peliculas, ruta_creditos, str(tmp_path / 'columnar'))
+    # Sin formato columnar se carga el CSV, con las mismas columnas y valores
+    pd.testing.assert_frame_equal(cargar_peliculas(str(tmp_path / 'columnar')), cargar_peliculas(str(tmp_path / 'sin_columnar'), ruta_peliculas), check_like=True)
+    columnas = ['title', 'genres', 'release_date']
+    pd.testing.assert_frame_equal(cargar_peliculas(str(tmp_path / 'columnar'), columnas = columnas),
+                                  cargar_peliculas(str(tmp_path / 'sin_columnar'), ruta_peliculas, columnas = columnas))
+    df2, planas = cargar_creditos(str(tmp_path / 'columnar'))
+    df2_csv, planas_csv = cargar_creditos(str(tmp_path / 'sin_columnar'), ruta_creditos)
+    pd.testing.assert_frame_equal(df2, df2_csv)
+    for columna in ['cast', 'director']:
+        assert a_listas(planas[columna]) == a_listas(planas_csv[columna])
+
+def test_aplanar_sin_perdida(creditos):
+    plana = aplanar(creditos['cast'])
+    assert a_listas(plana) == creditos['cast'].tolist()
+    filas = np.array([5, -1, 0, 299, 5])
+    assert a_listas(seleccionar_filas(plana, filas)) == [creditos['cast'].iloc[i] if i >= 0 else [] for i in filas]
+
+def test_compactar_sin_perdida(peliculas):
+    original = peliculas.drop(columns=['genres'])
+    compacto = compactar(original)
+    pd.testing.assert_frame_equal(compacto.astype(original.dtypes.to_dict()), original, check_exact=True)
+    assert compacto.memory_usage(deep=True).sum() < original.memory_usage(deep=True).sum()
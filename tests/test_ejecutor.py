@@ -0,0 +1,47 @@
+import time
+import asyncio
+import pytest
+from fastapi import HTTPException
+import ejecutor
+
+@pytest.fixture
+def pool():
+    yield ejecutor
+    ejecutor.detener()
+
+def _ejecutar(*funciones):
+    # Ejecucion concurrente de las funciones en el pool, un resultado o excepcion por funcion
+    async def consultas():
+        return await asyncio.gather(*[ejecutor.ejecutar(funcion) for funcion in funciones], return_exceptions=True)
+    return asyncio.run(consultas())
+
+def test_saturacion_responde_503(pool):
+    pool.iniciar(hilos = 1, cola = 1, timeout = 5)
+    antes = pool.metricas()
+    resultados = _ejecutar(lambda: time.sleep(0.2) or 'primera', lambda: 'en cola', lambda: 'rechazada')
+    assert resultados[:2] == ['primera', 'en cola']
+    assert isinstance(resultados[2], HTTPException) and resultados[2].status_code == 503
+    assert pool.metricas()['rechazadas'] == antes['rechazadas'] + 1
+
+def test_tiempo_maximo_responde_504(pool):
+    pool.iniciar(hilos = 1, cola = 0, timeout = 0.1)
+    antes = pool.metricas()
+    resultado, = _ejecutar(lambda: time.sleep(0.3))
+    assert isinstance(resultado, HTTPException) and resultado.status_code == 504
+    assert pool.metricas()['timeouts'] == antes['timeouts'] + 1
+    # El lugar se libera cuando termina el calculo
+    time.sleep(0.3)
+    assert _ejecutar(lambda: 'libre') == ['libre']
+
+def test_errores_del_cliente_no_cuentan_como_errores(pool):
+    pool.iniciar(hilos = 1, cola = 0, timeout = 5)
+    def invalida():
+        raise HTTPException(status_code=400, detail='Entrada invalida')
+    def falla():
+        raise ValueError('falla')
+    antes = pool.metricas()
+    for funcion in [invalida, falla]:
+        _ejecutar(funcion)
+    despues = pool.metricas()
+    assert despues['completadas'] == antes['completadas'] + 1
+    assert despues['errores'] == antes['errores'] + 1
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+from datos import aplanar
+from indices import normalizar, indice_invertido, buscar, indice_personas, indice_titulos, histogramas_fechas, contar_estrenos
+from indices import agregados_personas, METRICAS_PERSONAS
+from indices import indice_autocompletado, autocompletar, _mejores, UMBRAL_PREFIJO, MAX_RESULTADOS
+
+def test_indice_personas_coincide_con_filtro(creditos):
+    indice = indice_personas(aplanar(creditos['cast']))
+    for nombre in ['Tom Hanks', ' tom  HANKS ', creditos['cast'].iloc[40][0], 'Pepe El Grillo']:
+        esperadas = np.flatnonzero(creditos['cast'].apply(lambda lista: normalizar(nombre) in [normalizar(n) for n in lista]))
+        assert np.array_equal(buscar(indice, nombre), esperadas)
+
+def test_contar_estrenos_coincide_con_filtro(peliculas):
+    histogramas = histogramas_fechas(peliculas['release_date'])
+    fechas = peliculas['release_date']
+    for mes in range(1, 13):
+        assert contar_estrenos(histogramas, 'mes', mes) == (fechas.dt.month == mes).sum()
+        assert contar_estrenos(histogramas, 'mes', mes, 1980, 1999) == ((fechas.dt.month == mes) & fechas.dt.year.between(1980, 1999)).sum()
+    for dia in range(7):
+        assert contar_estrenos(histogramas, 'dia', dia, anio_desde = 2000) == ((fechas.dt.dayofweek == dia) & (fechas.dt.year >= 2000)).sum()
+    assert contar_estrenos(histogramas, 'mes', 1, anio_desde = 2100) == 0
+
+def test_indice_titulos(peliculas):
+    indice = indice_titulos(peliculas['title'])
+    for titulo in ['Toy Story', 'toy  story ', "A BUG'S LIFE", peliculas['title'].iloc[42], 'Pepe El Grillo']:
+        esperadas = np.flatnonzero(peliculas['title'].map(normalizar) == normalizar(titulo))
+        assert np.array_equal(buscar(indice, titulo), esperadas)
+    assert buscar(indice, 'Toy Story').tolist() == [0, 150]
+
+def _autocompletado(nombres):
+    indice = indice_invertido([n.casefold() for n in nombres], range(len(nombres)))
+    return indice_autocompletado(indice, nombres, np.arange(len(nombres), dtype=np.float64))
+
+def test_prefijos_frecuentes_con_sufijos_identicos():
+    # Mas de UMBRAL_PREFIJO claves comparten el sufijo 'smith': la construccion debe terminar
+    nombres = [f'Actor{i} Smith' for i in range(UMBRAL_PREFIJO + 88)]
+    autocompletado = _autocompletado(nombres)
+    assert 'smith' in autocompletado['frecuentes']
+    assert len(autocompletar(autocompletado, 'smi', 5)) == 5
+
+def test_prefijos_frecuentes_sobre_el_rango_completo():
+    # El grupo de sufijos iguales a 'smith' no debe reemplazar el resultado calculado sobre todas las claves con ese
+    # prefijo, incluidas las de mayor peso con sufijos mas largos ('smithson')
+    nombres = [f'Actor{i} Smith' for i in range(UMBRAL_PREFIJO + 88)] + [f'Smithson{i}' for i in range(20)]
+    autocompletado = _autocompletado(nombres)
+    sufijos = autocompletado['sufijos'].astype(str)
+    for prefijo, mejores in autocompletado['frecuentes'].items():
+        desde = np.searchsorted(sufijos, prefijo, side='left')
+        hasta = np.searchsorted(sufijos, prefijo + '\U0010ffff', side='left')
+        assert np.array_equal(mejores, _mejores(autocompletado, desde, hasta, MAX_RESULTADOS))
+    assert autocompletado['nombres'][autocompletado['frecuentes']['smith'][0]].startswith('Smithson')
+
+def test_agregados_personas_coincide_con_groupby(peliculas, creditos):
+    plana = aplanar(creditos['director'])
+    indice = indice_personas(plana)
+    agregados = agregados_personas(indice, plana, peliculas)
+    pares = peliculas[['return', 'budget', 'revenue']].assign(persona=creditos['director'].map(lambda lista: sorted({normalizar(n) for n in lista})))
+    esperado = pares.explode('persona').dropna(subset=['persona']).groupby('persona').agg(
+        cantidad_peliculas=('return', 'size'), retorno_total=('return', 'sum'), retorno_promedio=('return', 'mean'),
+        presupuesto_total=('budget', 'sum'), ganancia_total=('revenue', 'sum'))
+    tabla = agregados['tabla'].set_index(pd.Index(list(indice['ids']))).loc[esperado.index]
+    for metrica in METRICAS_PERSONAS:
+        np.testing.assert_allclose(tabla[metrica].to_numpy(dtype=np.float64), esperado[metrica].to_numpy(dtype=np.float64))
+        valores = agregados['tabla'][metrica].to_numpy(dtype=np.float64)[agregados['ordenes'][metrica]]
+        assert (np.diff(valores) <= 0).all()
@@ -0,0 +1,103 @@
+import numpy as np
+from scipy import sparse
+from datos import aplanar
+from ml_models import matriz_similitud, indice_vecinos, vecinos_tfidf, texto_combinado
+from ml_models import obtener_recomendaciones, obtener_recomendaciones_lote
+from ml_models import construir_modelo, guardar_modelo, cargar_modelo, agregar_peliculas, actualizar_modelo
+from ml_models import modelos_knn, matriz_knn, construir_ivf, buscar_vecinos, reporte_recall
+from ml_models import modelo_hibrido, recomendaciones_hibridas_lote, PESOS_HIBRIDO, buscar_descripcion
+
+def test_indice_vecinos_coincide_con_similitud_densa(peliculas):
+    vecinos = indice_vecinos(peliculas.copy(), k = 10)
+    densa = np.array(matriz_similitud(peliculas.copy()), dtype=np.float64)
+    np.fill_diagonal(densa, -np.inf)
+    for i in range(len(peliculas)):
+        fila = slice(vecinos.indptr[i], vecinos.indptr[i + 1])
+        assert i not in vecinos.indices[fila]
+        np.testing.assert_allclose(vecinos.data[fila], np.sort(densa[i])[::-1][:10], atol=1e-5)
+        np.testing.assert_allclose(densa[i, vecinos.indices[fila]], vecinos.data[fila], atol=1e-5)
+
+def test_recomendaciones_lote_con_matriz_densa_y_dispersa(peliculas):
+    densa = matriz_similitud(peliculas.copy())
+    vecinos = indice_vecinos(peliculas.copy(), k = 10)
+    consultas = [0, 1, 2, 57, len(peliculas) - 1]
+    for matriz in [densa, vecinos]:
+        titulos, puntajes = obtener_recomendaciones_lote(consultas, matriz, peliculas, top_n = 5)
+        for i, titulos_fila, puntajes_fila in zip(consultas, titulos, puntajes):
+            np.testing.assert_allclose(puntajes_fila, np.sort(np.delete(densa[i], i))[::-1][:5], atol=1e-5)
+            assert list(obtener_recomendaciones(i, matriz, peliculas, 5)) == list(titulos_fila)
+
+def test_guardar_y_cargar_modelo(peliculas, tmp_path):
+    modelo = construir_modelo(peliculas, k = 10)
+    guardar_modelo(modelo, str(tmp_path))
+    cargado = cargar_modelo(str(tmp_path))
+    for nombre in ['tfidf', 'vecinos']:
+        for parte in ['data', 'indices', 'indptr']:
+            assert np.array_equal(getattr(cargado[nombre], parte), getattr(modelo[nombre], parte))
+    assert cargado['metadata'] == modelo['metadata']
+    assert list(cargado['titulos']) == list(modelo['titulos'])
+    textos = ['toy cowboy', 'pirate ship in a storm']
+    np.testing.assert_allclose(cargado['vectorizador'].transform(textos).toarray(), modelo['vectorizador'].transform(textos).toarray())
+
+def test_recomendaciones_lote_con_filas_de_distinto_largo(peliculas):
+    # La fila 0 guarda 3 vecinos y la fila 1 uno solo: cada fila se recorta a su propio largo
+    n = len(peliculas)
+    vecinos = sparse.csr_matrix((np.array([0.9, 0.5, 0.2, 0.7], dtype=np.float32), np.array([4, 5, 6, 7]), np.array([0, 3, 4] + [4] * (n - 2))), shape=(n, n))
+    titulos, puntajes = obtener_recomendaciones_lote([0, 1, 2], vecinos, peliculas, top_n = 2)
+    assert [len(fila) for fila in titulos] == [2, 1, 0]
+    assert list(titulos[0]) == peliculas['title'].iloc[[4, 5]].tolist()
+    np.testing.assert_allclose(puntajes[1], [0.7])
+
+def test_ivf_recall_completo_con_todas_las_celdas(peliculas):
+    knn, scaler, mlb_genres = modelos_knn(peliculas, k = 5)
+    X = matriz_knn(peliculas, scaler, mlb_genres)
+    ivf = construir_ivf(X, n_listas = 8)
+    consultas = np.arange(0, len(peliculas), 7)
+    reporte = reporte_recall(ivf, knn, consultas, k = 5, sondeos = (8,))
+    assert reporte['recall'].iloc[0] == 1.0
+    _, posiciones = buscar_vecinos(ivf, X[consultas], k = 5, excluir = consultas, n_sondeos = 8)
+    assert not (posiciones == consultas[:, None]).any()
+
+def test_agregar_peliculas_coincide_con_reconstruccion(peliculas):
+    base = construir_modelo(peliculas.iloc[:250], k = 10)
+    actualizado = agregar_peliculas(base, peliculas.iloc[250:])
+    # Indice completo con el mismo vocabulario e idf del modelo base
+    tfidf = base['vectorizador'].transform(texto_combinado(peliculas)).astype(np.float32)
+    completo = vecinos_tfidf(tfidf, k = 10)
+    np.testing.assert_allclose(actualizado['vecinos'].data, completo.data, atol=1e-5)
+    #Los vecinos de similitud 0 son empates sin orden definido
+    positivos = completo.data > 0
+    assert np.array_equal(actualizado['vecinos'].indices[positivos], completo.indices[positivos])
+    assert list(actualizado['titulos']) == peliculas['title'].tolist()
+
+    assert actualizar_modelo(base, peliculas.iloc[:250])[1] == 'sin_cambios'
+    assert actualizar_modelo(base, peliculas, umbral_deriva = 1)[1] == 'incremental'
+    assert actualizar_modelo(base, peliculas.iloc[1:])[1] == 'reajuste'
+
+def test_recomendaciones_hibridas_ordenadas_por_puntaje(peliculas):
+    vecinos = indice_vecinos(peliculas.copy(), k = 20)
+    hibrido = modelo_hibrido(aplanar(peliculas['genres']), peliculas)
+    consultas = np.arange(0, len(peliculas), 13)
+    titulos, puntajes = recomendaciones_hibridas_lote(consultas, vecinos, peliculas, hibrido, top_n = 5)
+    for i, titulos_fila, puntajes_fila in zip(consultas, titulos, puntajes):
+        fila = slice(vecinos.indptr[i], vecinos.indptr[i + 1])
+        candidatos = vecinos.indices[fila]
+        distancias = np.sqrt(((hibrido['features'][candidatos] - hibrido['features'][i]) ** 2).sum(axis=1))
+        esperados = (PESOS_HIBRIDO['texto'] * vecinos.data[fila] + PESOS_HIBRIDO['metadata'] / (1 + distancias)
+                     + PESOS_HIBRIDO['popularidad'] * hibrido['prior'][candidatos])
+        np.testing.assert_allclose(puntajes_fila, np.sort(esperados)[::-1][:5], rtol=1e-5)
+        assert len(titulos_fila) == 5
+
+    # Solo con la similitud de texto el orden es el del indice de vecinos
+    solo_texto, _ = recomendaciones_hibridas_lote(consultas, vecinos, peliculas, hibrido, top_n = 5, pesos = {'texto': 1, 'metadata': 0, 'popularidad': 0})
+    referencia, _ = obtener_recomendaciones_lote(consultas, vecinos, peliculas, 5)
+    assert [list(fila) for fila in solo_texto] == [list(fila) for fila in referencia]
+
+def test_buscar_descripcion_coincide_con_fuerza_bruta(peliculas):
+    modelo = construir_modelo(peliculas, k = 10)
+    texto = 'a pirate ship lost in the storm near the island'
+    posiciones, puntajes = buscar_descripcion(modelo, texto, top_n = 10)
+    similitud = (modelo['tfidf'] @ modelo['vectorizador'].transform([texto]).T).toarray().ravel()
+    np.testing.assert_allclose(puntajes, np.sort(similitud)[::-1][:10], atol=1e-5)
+    np.testing.assert_allclose(similitud[posiciones], puntajes, atol=1e-5)
+    assert len(buscar_descripcion(modelo, 'the and of')[0]) == 0
@@ -0,0 +1,29 @@
+import json
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from respuestas import Columnas, codificar, codificar_cursor, leer_cursor
+
+def test_columnas_igual_a_json_dumps():
+    columnas = {'titulo': np.array(['Toy Story', 'Ñandú "100%"', None], dtype=object), 'anio': np.array([1995, -1, 0]),
+                'presupuesto': np.array([30000000.0, np.nan, 0.25]), 'activo': np.array([True, False, True]),
+                'fecha': np.array(['1995-10-30', 'NaT', '2001-01-01'], dtype='datetime64[ns]')}
+    filas = [{'titulo': 'Toy Story', 'anio': 1995, 'presupuesto': 30000000.0, 'activo': True, 'fecha': '1995-10-30'},
+             {'titulo': 'Ñandú "100%"', 'anio': -1, 'presupuesto': None, 'activo': False, 'fecha': None},
+             {'titulo': None, 'anio': 0, 'presupuesto': 0.25, 'activo': True, 'fecha': '2001-01-01'}]
+    esperado = json.dumps({'director': 'John Lasseter', 'peliculas': filas}, ensure_ascii=False, separators=(',', ':'))
+    assert codificar({'director': 'John Lasseter', 'peliculas': Columnas(columnas)}) == esperado
+    assert Columnas(columnas).filas(1, 2) == [json.dumps(filas[1], ensure_ascii=False, separators=(',', ':'))]
+
+def test_cursor_ida_y_vuelta():
+    for posicion in [0, 1, 62, 63, 12345, 10 ** 12]:
+        cursor = codificar_cursor(posicion)
+        assert not set(cursor) & set('+/=')
+        assert leer_cursor(cursor) == posicion
+    assert leer_cursor(None) is None
+
+@pytest.mark.parametrize('cursor', ['!!', 'abc', 'LTE', ''])
+def test_cursor_invalido(cursor):
+    with pytest.raises(HTTPException) as error:
+        leer_cursor(cursor)
+    assert error.value.status_code == 400